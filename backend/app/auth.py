@@ -1,116 +1,206 @@
-import os
-from dotenv import load_dotenv
-import requests
-import bcrypt
-from datetime import datetime, timezone, timedelta
-from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException
-from jose import jwt, JWTError
-from sqlmodel import Session, select
-
-from app.models import User
-from app.database import get_session
-
-load_dotenv
-
-# Security config for JWT
-SECRET_KEY = os.getenv('JWT_SECRET_KEY')
-ALGORITHM = 'HS256'
-ACCESS_TOKEN_EXPIRY_MINUTES = 30000
-
-# Method to extract token
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl = 'token')
-
-# Verify password
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    # Convert strings to bytes
-    pwd_bytes = plain_password.encode('utf-8')
-    hash_pwd_bytes = hashed_password.encode('utf-8')
-    
-    return bcrypt.checkpw(pwd_bytes, hash_pwd_bytes)
-
-# Hash password
-def get_password_hash(password: str) -> str:
-    # Convert string pwd to bytes
-    pwd_bytes = password.encode('utf-8')
-    
-    # Generate a salt and hash the password
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(pwd_bytes, salt)
-
-    # Convert bytes to string
-    return hashed_password.decode('utf-8')
-
-# Create JWT access token -> header.payload.signature
-def create_access_token(data: dict):
-    # Header is created automatically and signature is created by applying the algorithm with header payload and secret key 
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRY_MINUTES)
-    
-    to_encode.update({'exp': expire}) # Payload
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
-# Get current user to let the endpoints know who is making the request
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={'WWW-Authenticate':'Bearer'}
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('sub')
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    # Find user in database
-    user = session.exec(select(User).where(User.username == username)).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-
-async def send_otp_email(email: str, otp: str, subject: str = 'Your Verification Code'):
-    url = "https://api.brevo.com/v3/smtp/email"
-
-    api_key = os.getenv('BREVO_API_KEY')
-    sender_email = os.getenv('MAIL_USERNAME')
-
-    headers = {
-        'accept': 'application/json',
-        'api-key': api_key,
-        'content-type': 'application/json'
-    }
-
-    html = f"""
-    <div style="font-family: Arial, sans-serif; padding: 20px">
-    <h2>Universal Scrobbler Security</h2>
-    <p>Your One-Time Password (OTP) is :</p>
-    <h1 style="color: #697565; letter-spacing: 5px;">{otp}</h1>
-    <p>This code expires in 10 minutes</p>
-    <p>If you did not request this, please ignore this email.</p>
-    </div>
-    """
-
-    payload = {
-        'sender': {'email': sender_email, 'name': 'Universal Scrobbler'},
-        'to': [{'email': email}],
-        'subject': subject,
-        'htmlContent': html
-    }
-
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code == 201:
-            print(f'Email sent successfully to {email}')
-        else:
-            print(f"Brevo error: {response.text}")
-
-    except Exception as e:
-        print(f"Email exception: {e}")
-
-
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+import bcrypt
+from datetime import datetime, timezone, timedelta
+from typing import NamedTuple
+from cachetools import TTLCache
+from fastapi.security import OAuth2PasswordBearer
+from fastapi import Depends, HTTPException
+from jose import jwt, JWTError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models import User
+from app.database import get_session, get_async_session
+
+load_dotenv
+
+# Security config for JWT
+SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+ALGORITHM = 'HS256'
+ACCESS_TOKEN_EXPIRY_MINUTES = 30000
+
+# Method to extract token
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl = 'token')
+
+# Users looked up by token subject are kept briefly => most requests skip the user query
+# Dropped explicitly whenever a user row changes (preferences, verification, password reset, deletion)
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '5000'))
+AUTH_CACHE_TTL_SECONDS = int(os.getenv('AUTH_CACHE_TTL_SECONDS', '60'))
+
+_user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS) # {username: user columns}
+_user_cache_lock = threading.Lock()
+
+
+# What most endpoints need to know about the caller, without an ORM object
+class Principal(NamedTuple):
+    id: int
+    username: str
+    rec_period: int
+
+# bcrypt is slow on purpose => it runs in its own processes, so a login burst can't starve the request threads
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(os.cpu_count() or 2)))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', str(BCRYPT_WORKERS * 8))) # Queued + running, more => 503
+
+_password_pool = None
+_password_pool_lock = threading.Lock()
+_password_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+
+def _get_password_pool():
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None:
+            # spawn => no forking of a process that already runs threads
+            _password_pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _password_pool
+
+
+def shutdown_password_pool():
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is not None:
+            _password_pool.shutdown(wait=False, cancel_futures=True)
+            _password_pool = None
+
+
+# Run fn in the password pool, or tell the client to come back when it is full
+async def _run_in_password_pool(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail='Server busy, please try again', headers={'Retry-After': '1'})
+
+    try:
+        future = _get_password_pool().submit(fn, *args)
+    except Exception:
+        _password_slots.release()
+        raise
+
+    future.add_done_callback(lambda _: _password_slots.release())
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        shutdown_password_pool() # A worker died => start a fresh pool on the next call
+        raise HTTPException(status_code=503, detail='Server busy, please try again', headers={'Retry-After': '1'})
+
+
+# Worker side (module level so the pool can pickle them)
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    # Convert strings to bytes
+    pwd_bytes = plain_password.encode('utf-8')
+    hash_pwd_bytes = hashed_password.encode('utf-8')
+    
+    return bcrypt.checkpw(pwd_bytes, hash_pwd_bytes)
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    # Convert string pwd to bytes
+    pwd_bytes = password.encode('utf-8')
+    
+    # Generate a salt and hash the password
+    salt = bcrypt.gensalt(rounds=rounds)
+    hashed_password = bcrypt.hashpw(pwd_bytes, salt)
+
+    # Convert bytes to string
+    return hashed_password.decode('utf-8')
+
+
+# Verify password
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_password_pool(_check_password, plain_password, hashed_password)
+
+# Hash password
+async def get_password_hash(password: str) -> str:
+    return await _run_in_password_pool(_hash_password, password, BCRYPT_ROUNDS)
+
+# Create JWT access token -> header.payload.signature
+def create_access_token(data: dict):
+    # Header is created automatically and signature is created by applying the algorithm with header payload and secret key 
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRY_MINUTES)
+    
+    to_encode.update({'exp': expire}) # Payload
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+def invalidate_user(username: str):
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
+
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={'WWW-Authenticate':'Bearer'}
+    )
+
+
+def _username_from_token(token: str):
+    credentials_exception = _credentials_exception()
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username: str = payload.get('sub')
+        if username is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+    return username
+
+
+def _cached_user(username: str):
+    with _user_cache_lock:
+        return _user_cache.get(username)
+
+
+def _cache_user(username: str, user: User):
+    data = user.model_dump()
+    with _user_cache_lock:
+        _user_cache[username] = data
+    return data
+
+
+# Token -> (user columns, User when it had to be queried)
+def _authenticate(token: str, session: Session):
+    username = _username_from_token(token)
+    data = _cached_user(username)
+    if data is not None:
+        return data, None
+
+    # Find user in database
+    user = session.exec(select(User).where(User.username == username)).first()
+    if user is None:
+        raise _credentials_exception()
+    return _cache_user(username, user), user
+
+
+# Get current user to let the endpoints know who is making the request
+# Rebuilt from the cache and attached to the session without a query, so it can still be updated / deleted
+def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
+    data, user = _authenticate(token, session)
+
+    if user is None:
+        user = User(**data)
+        make_transient_to_detached(user)
+        session.add(user)
+    return user
+
+
+# For endpoints that only need the caller's id (and rec period)
+# Async => cache hits never leave the event loop, misses share the request's async session
+async def get_current_principal(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)):
+    username = _username_from_token(token)
+    data = _cached_user(username)
+    if data is None:
+        user = (await session.exec(select(User).where(User.username == username))).first()
+        if user is None:
+            raise _credentials_exception()
+        data = _cache_user(username, user)
+    return Principal(id=data['id'], username=data['username'], rec_period=data['rec_period'])
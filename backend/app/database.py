@@ -1,25 +1,109 @@
-import os
-from dotenv import load_dotenv
-from sqlmodel import SQLModel, Session, create_engine
-
-# Load secrets from .env
-load_dotenv()
-
-# Setup the database
-database_url = os.getenv('DATABASE_URL')
-
-# SQL alchemy require postgresql://, but Render provides postgres://
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-# Fallback to SQLite if no url found
-if not database_url:
-    database_url = "sqlite:///music.db"
-
-# Create engine
-engine = create_engine(database_url)
-
-# Helper function to get db session
-def get_session():
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+import os
+from dotenv import load_dotenv
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.metrics import instrument_engine
+
+# Load secrets from .env
+load_dotenv()
+
+# Setup the database
+database_url = os.getenv('DATABASE_URL')
+
+# SQL alchemy require postgresql://, but Render provides postgres://
+if database_url and database_url.startswith("postgres://"):
+    database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+# Fallback to SQLite if no url found
+if not database_url:
+    database_url = "sqlite:///music.db"
+
+# Connection pool => sized per worker process (total connections = workers * (size + overflow))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30')) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800')) # Reconnect before the server / proxy drops idle connections
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0')) # 0 => no limit (Postgres only)
+
+is_sqlite = database_url.startswith('sqlite')
+
+# SQLite profile => WAL so readers never wait on the writer, and a busy timeout instead of "database is locked"
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL') # Safe with WAL, only the last commits can be lost on power loss
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))) # Bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', str(64 * 1024))) # Per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+
+# Same database through the async drivers => asyncpg for Postgres, aiosqlite for SQLite
+def async_database_url(url: str):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    if url.get_backend_name() == 'postgresql':
+        url = url.set(drivername='postgresql+asyncpg')
+        # asyncpg takes ssl instead of libpq's sslmode
+        if 'sslmode' in url.query:
+            url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': url.query['sslmode']})
+        return url
+    return url
+
+
+def engine_options(asynchronous: bool):
+    options = {'pool_pre_ping': DB_POOL_PRE_PING}
+    if is_sqlite:
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        if asynchronous:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options['connect_args'] = {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+    return options
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}') # Negative => KiB instead of pages
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.close()
+
+
+# Create engine
+engine = create_engine(database_url, **engine_options(asynchronous=False))
+
+# Hot read / write paths (stats, scrobbles) => no thread per request waiting on the database
+async_engine = create_async_engine(async_database_url(database_url), **engine_options(asynchronous=True))
+
+if is_sqlite:
+    event.listen(engine, 'connect', apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, 'connect', apply_sqlite_pragmas)
+
+# Statement timings for /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+
+# Helper function to get db session
+def get_session():
+    with Session(engine) as session:
+        yield session
+
+
+async def get_async_session():
+    # expire_on_commit=False => returned objects can still be read after commit without another await
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,170 @@
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Log records are queued by the calling thread, a listener thread formats and writes them => requests never wait on stdout
+# LOG_LEVEL => default level, LOG_LEVELS => per module overrides, eg: app.services.mb_graph=DEBUG,httpx=WARNING
+# LOG_FORMAT => json (one object per line, extras included) or text
+# LOG_DEBUG_SAMPLE_RATE => share of DEBUG lines kept, a line can set its own with extra={'sample_rate': 0.01}
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000')) # Full => new records are dropped instead of blocking
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has => anything else on a record came from extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'sample_rate'}
+# Libraries that log every request / statement at INFO or DEBUG, LOG_LEVELS can still turn them up
+_QUIET_LIBRARIES = {'httpx': 'WARNING', 'httpcore': 'WARNING', 'aiosqlite': 'INFO', 'asyncio': 'INFO'}
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_handler = None
+_listener = None
+
+
+# Calling thread side => cheap checks only (sampling, request id)
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None and record.levelno <= logging.DEBUG:
+            rate = LOG_DEBUG_SAMPLE_RATE
+        if rate is not None and rate < 1 and random.random() >= rate:
+            return False
+
+        record.request_id = request_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    dropped = 0
+
+    # Only the message is resolved here (msg % args), the layout and traceback are left to the listener
+    # Args and extras can be live objects (ORM rows, lists still being filled) => read them now, in the calling thread
+    def prepare(self, record):
+        record = copy.copy(record) # Other handlers (eg: pytest's) still see the original
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in _extras(record).items():
+            if not isinstance(value, (str, int, float, bool, type(None))):
+                setattr(record, key, str(value))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}"
+        if getattr(record, 'request_id', None):
+            line += f" [{record.request_id}]"
+        line += f" {record.getMessage()}"
+
+        extras = _extras(record)
+        if extras:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in extras.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def _apply_levels():
+    logging.getLogger().setLevel(LOG_LEVEL)
+    for name, level in _QUIET_LIBRARIES.items():
+        logging.getLogger(name).setLevel(level)
+    for item in LOG_LEVELS.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+# Idempotent => safe from both the app's import and its lifespan
+def setup_logging():
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+
+    _handler = NonBlockingQueueHandler(_queue)
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    _apply_levels()
+
+    _listener = QueueListener(_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+# Shutdown => write out what is queued
+def stop_logging():
+    global _handler, _listener
+    if _listener is None:
+        return
+
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _handler = _listener = None
+
+
+# Pure ASGI => every log line of a request (and of threads that copy its context) carries the same id
+# A valid incoming X-Request-ID (eg: from a proxy) is kept, the id is echoed back in the response
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope['headers']).get(b'x-request-id', b'').decode('latin-1')
+        request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': list(message.get('headers', [])) + [(b'x-request-id', request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
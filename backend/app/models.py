@@ -1,82 +1,219 @@
-from sqlmodel import SQLModel, Field
-from sqlalchemy import BigInteger
-from typing import Optional
-from datetime import datetime, timezone
-
-# USER TABLE
-class User(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    username: str = Field(index=True, unique=True)
-    email: str = Field(index=True, unique=True)
-    hashed_password:  str
-
-    # Verification fields
-    is_verified: bool = Field(default=False)
-    otp_code: Optional[str] = None
-    otp_expiry: Optional[datetime] = None
-
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    rec_period: int = Field(default=1) 
-
-
-# SCROBBLE TABLE
-class Scrobble(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key='user.id')
-    title: str
-    artist: str
-    package: str
-    timestamp: int = Field(sa_type=BigInteger)
-    # Time server recieved data
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-    # Spotify data
-    spotify_id: Optional[str] = None
-    duration_ms: int = Field(default=0)
-    image_url: Optional[str] = None
-    artist_image: Optional[str] = None
-    genres: Optional[str] = None
-
-
-# CACHE TABLE -> Stores AI recs results
-class AICache(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    seed_title: str
-    seed_artist: str
-    rec_type: str
-    data_json: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-# Handle request endpoint
-class ScrobbleRequest(SQLModel):
-    title: str
-    artist: str
-    package: str
-    timestamp: int
-
-# Handle signup requests
-class UserCreate(SQLModel):
-    username: str
-    email: str
-    password: str
-
-# Handle email-otp verification
-class VerifyRequest(SQLModel):
-    email: str
-    otp: str
-
-# Handle forgot password endpoint
-class ForgotPasswordRequest(SQLModel):
-    email: str
-
-
-# Handle reset password endpoint
-class ResetPasswordRequest(SQLModel):
-    email: str
-    otp: str
-    new_password: str
-
-
-# Handle recommendation period 
-class PreferenceUpdate(SQLModel):
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, DateTime, LargeBinary, UniqueConstraint
+from sqlalchemy.types import TypeDecorator
+from typing import Optional
+from datetime import datetime, timezone
+
+
+# Timestamps are stored as naive UTC (TIMESTAMP WITHOUT TIME ZONE)
+# Aware values are converted on the way in => asyncpg refuses aware datetimes for these columns (psycopg2 didn't mind)
+class UTCDateTime(TypeDecorator):
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+# USER TABLE
+class User(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    username: str = Field(index=True, unique=True)
+    email: str = Field(index=True, unique=True)
+    hashed_password:  str
+
+    # Verification fields
+    is_verified: bool = Field(default=False)
+    otp_code: Optional[str] = None
+    otp_expiry: Optional[datetime] = Field(default=None, sa_type=UTCDateTime)
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    rec_period: int = Field(default=1) 
+
+
+# SCROBBLE TABLE
+class Scrobble(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key='user.id')
+    title: str
+    artist: str
+    package: str
+    timestamp: int = Field(sa_type=BigInteger)
+    # Time server recieved data
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+    # Spotify data
+    spotify_id: Optional[str] = None
+    duration_ms: int = Field(default=0)
+    image_url: Optional[str] = None
+    artist_image: Optional[str] = None
+    genres: Optional[str] = None
+
+
+# CACHE TABLE -> Stores AI recs results
+class AICache(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    seed_title: str
+    seed_artist: str
+    rec_type: str
+    data_json: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+# LYRICS CACHE -> Genius lyrics snippets (zlib compressed), found=False remembers songs Genius doesn't have
+class LyricsCache(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint('title_key', 'artist_key'),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    title_key: str = Field(index=True)
+    artist_key: str = Field(index=True)
+    snippet: Optional[bytes] = Field(default=None, sa_type=LargeBinary)
+    found: bool = Field(default=True)
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+# ITEM-ITEM NEIGHBOURS -> Tracks most listened to by the same people, built from every user's scrobbles
+class TrackNeighbors(SQLModel, table=True):
+    track_key: str = Field(primary_key=True) # "title\tartist", normalized
+    neighbors_json: str # [{"title", "artist", "score", "image_url", "spotify_url"}]
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+# NEXT TRACK MODEL -> How often `to` was played right after `from` in a listening session (all users)
+class TrackTransition(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint('from_key', 'to_key'),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    from_key: str = Field(index=True) # "title\tartist", normalized
+    to_key: str
+    title: str
+    artist: str
+    image_url: Optional[str] = None
+    spotify_id: Optional[str] = None
+    count: int = Field(default=1)
+
+
+# EMAIL OUTBOX -> Emails written in the same transaction as the OTP, sent by a background task
+class EmailOutbox(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    to_email: str
+    subject: str
+    html: str
+    status: str = Field(default='pending', index=True) # pending -> sent / failed
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime, index=True)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+    sent_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime)
+
+
+# GENIUS SAMPLE GRAPH -> (title, artist) search hit and song_relationships per Genius song
+class GeniusSearch(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint('title_key', 'artist_key'),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    title_key: str = Field(index=True)
+    artist_key: str = Field(index=True)
+    genius_id: Optional[int] = None # None when Genius had no hit
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+class GeniusRelations(SQLModel, table=True):
+    genius_id: int = Field(primary_key=True)
+    relations_json: str # Sample candidates [{"title", "artist", "type"}]
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+# GENRE ARTIST POOL -> Candidate artists per genre, shared by every user's artist recommendations
+class GenreArtist(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    genre: str = Field(index=True)
+    artist_id: str # Spotify artist id
+    name: str
+    genres: str = '' # Comma separated, same format as Scrobble.genres
+    popularity: int = Field(default=0)
+    image_url: Optional[str] = None
+    spotify_url: Optional[str] = None
+    refreshed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+# MUSICBRAINZ GRAPH TABLES -> Local copy of recording -> work -> songwriter -> works -> recordings (keyed by MBID)
+class MBRecording(SQLModel, table=True):
+    mbid: str = Field(primary_key=True)
+    title: str
+    artist_name: Optional[str] = None # Main credited artist
+    works_fetched_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime) # When the work relations were last fetched
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+# (title, artist) search -> recording MBID, recording_mbid is None when MB had no match
+class MBRecordingSearch(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    query_title: str = Field(index=True)
+    query_artist: str = Field(index=True)
+    recording_mbid: Optional[str] = None
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCDateTime)
+
+
+class MBWork(SQLModel, table=True):
+    mbid: str = Field(primary_key=True)
+    title: str
+    artists_fetched_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime) # When the songwriter relations were last fetched
+    recordings_fetched_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime) # When the recording relations were last fetched
+
+
+# Songwriter (composer, writer, lyricist) of a work
+class MBWorkArtist(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    work_mbid: str = Field(index=True)
+    artist_mbid: str = Field(index=True)
+    artist_name: str
+    rel_type: str
+
+
+# Recording of a work (position 0 is the first recording listed by MB, -1 when found from the recording side)
+class MBWorkRecording(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    work_mbid: str = Field(index=True)
+    recording_mbid: str = Field(index=True)
+    position: int = Field(default=0)
+
+
+# Songwriter whose list of works has been fetched
+class MBArtist(SQLModel, table=True):
+    mbid: str = Field(primary_key=True)
+    name: str
+    works_fetched_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime)
+
+
+# Handle request endpoint
+class ScrobbleRequest(SQLModel):
+    title: str
+    artist: str
+    package: str
+    timestamp: int
+
+# Handle signup requests
+class UserCreate(SQLModel):
+    username: str
+    email: str
+    password: str
+
+# Handle email-otp verification
+class VerifyRequest(SQLModel):
+    email: str
+    otp: str
+
+# Handle forgot password endpoint
+class ForgotPasswordRequest(SQLModel):
+    email: str
+
+
+# Handle reset password endpoint
+class ResetPasswordRequest(SQLModel):
+    email: str
+    otp: str
+    new_password: str
+
+
+# Handle recommendation period 
+class PreferenceUpdate(SQLModel):
     rec_period: int
\ No newline at end of file
@@ -1,92 +1,128 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select, delete
-from sqlalchemy import func
-from typing import Optional
-
-from app.models import Scrobble, User
-from app.database import get_session
-from app.auth import get_current_user
-from app.services.spotify import enrich_data
-
-router = APIRouter(prefix='/scrobble', tags=["Scrobble"])
-
-@router.post('')
-async def receive_scrobble(
-    req: Scrobble, 
-    session: Session = Depends(get_session),
-    user: User = Depends(get_current_user)
-): # Dependancy Injection
-    print(f"Recieved: {req.title} by {req.artist}")
-
-    spotify_data = enrich_data(req.title, req.artist)
-
-    if not spotify_data:
-        print(f"{req.title} not found on Spotify. Skipping database save")
-        return {
-            'status': 'Skipped',
-            'message': 'Song not found on Spotify'
-        }
-
-    new_scrobble = Scrobble(
-        user_id=user.id,
-        title=req.title,
-        artist=req.artist,
-        package=req.package,
-        timestamp=req.timestamp,
-        # Unpack spotify data 
-        **spotify_data
-    )
-
-    # Save to database
-    session.add(new_scrobble)
-    session.commit()
-    session.refresh(new_scrobble)
-
-    return {
-        "status": "success",
-        "data": new_scrobble
-    }
-
-# See history : Defines http GET endpoint
-@router.get("/history")
-def read_history(
-    limit: Optional[int] = None,
-    session: Session = Depends(get_session),
-    user: User = Depends(get_current_user),
-):
-    query = select(Scrobble).where(Scrobble.user_id == user.id).order_by(Scrobble.id.desc())
-
-    if limit:
-        subquery = (
-            select(Scrobble.title, Scrobble.artist, func.max(Scrobble.id).label('latest_id'))
-            .where(Scrobble.user_id == user.id)
-            .group_by(Scrobble.title, Scrobble.artist)
-            .subquery()
-        )
-        query = (
-            select(Scrobble)
-            .join(subquery, Scrobble.id == subquery.c.latest_id)
-            .order_by(Scrobble.id.desc())
-            .limit(limit)
-        )
-    
-    scrobbles = session.exec(query).all()
-    return scrobbles
-
-# Get the track album image
-@router.get('/track/image')
-def get_track_image(title: str, artist: str, user: User = Depends(get_current_user)):
-    data = enrich_data(title, artist)
-
-    if data and 'image_url' in data:
-        return {'image_url': data['image_url']}
-    
-    return {'image_url': None}
-
-# Delete history
-@router.delete('/history/clear')
-def clear_history(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    query = delete(Scrobble).where(Scrobble.user_id == user.id)
-    session.exec(query)
-    session.commit()
+import asyncio
+import logging
+from fastapi import APIRouter, Depends
+from sqlmodel import Session, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func
+from typing import Optional
+
+from app.models import Scrobble
+from app.database import get_async_session
+from app.auth import Principal, get_current_principal
+from app.services.spotify import enrich_data
+from app.services.rate_limiter import PRIORITY_INTERACTIVE
+from app.services.known_tracks import add_known_track, evict_known_tracks
+from app.services.collab import forget_user_plays, mark_track_played
+from app.services.next_track import record_transition
+from app.services.samples import invalidate_samples
+from app.services.stats_service import invalidate_top_tracks
+from app.services.write_queue import submit_write, write_queue_enabled
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix='/scrobble', tags=["Scrobble"])
+
+
+# Runs on the writer thread
+def _save_scrobble(scrobble: Scrobble):
+    def write(session: Session):
+        session.add(scrobble)
+        return scrobble
+    return write
+
+
+@router.post('')
+async def receive_scrobble(
+    req: Scrobble, 
+    session: AsyncSession = Depends(get_async_session),
+    user: Principal = Depends(get_current_principal)
+): # Dependancy Injection
+    logger.debug('Received: %s by %s', req.title, req.artist)
+
+    # Spotify client is blocking => off the event loop
+    spotify_data = await asyncio.to_thread(enrich_data, req.title, req.artist)
+
+    if not spotify_data:
+        logger.info('%s not found on Spotify. Skipping database save', req.title, extra={'artist': req.artist})
+        return {
+            'status': 'Skipped',
+            'message': 'Song not found on Spotify'
+        }
+
+    new_scrobble = Scrobble(
+        user_id=user.id,
+        title=req.title,
+        artist=req.artist,
+        package=req.package,
+        timestamp=req.timestamp,
+        # Unpack spotify data 
+        **spotify_data
+    )
+
+    # Save to database
+    if write_queue_enabled():
+        # SQLite => group committed by the single writer, no fighting over the file lock
+        await asyncio.wrap_future(submit_write(_save_scrobble(new_scrobble), after_commit=record_transition))
+    else:
+        session.add(new_scrobble)
+        await session.commit()
+        await session.refresh(new_scrobble)
+        await session.run_sync(record_transition, new_scrobble)
+
+    add_known_track(user.id, req.title, req.artist)
+    invalidate_top_tracks(user.id)
+    invalidate_samples(user.id)
+    mark_track_played(user.id, req.title, req.artist, new_scrobble.spotify_id, new_scrobble.image_url)
+
+    return {
+        "status": "success",
+        "data": new_scrobble
+    }
+
+# See history : Defines http GET endpoint
+@router.get("/history")
+async def read_history(
+    limit: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session),
+    user: Principal = Depends(get_current_principal),
+):
+    query = select(Scrobble).where(Scrobble.user_id == user.id).order_by(Scrobble.id.desc())
+
+    if limit:
+        subquery = (
+            select(Scrobble.title, Scrobble.artist, func.max(Scrobble.id).label('latest_id'))
+            .where(Scrobble.user_id == user.id)
+            .group_by(Scrobble.title, Scrobble.artist)
+            .subquery()
+        )
+        query = (
+            select(Scrobble)
+            .join(subquery, Scrobble.id == subquery.c.latest_id)
+            .order_by(Scrobble.id.desc())
+            .limit(limit)
+        )
+    
+    scrobbles = (await session.exec(query)).all()
+    return scrobbles
+
+# Get the track album image
+@router.get('/track/image')
+async def get_track_image(title: str, artist: str, user: Principal = Depends(get_current_principal)):
+    data = await asyncio.to_thread(enrich_data, title, artist, priority=PRIORITY_INTERACTIVE)
+
+    if data and 'image_url' in data:
+        return {'image_url': data['image_url']}
+    
+    return {'image_url': None}
+
+# Delete history
+@router.delete('/history/clear')
+async def clear_history(user: Principal = Depends(get_current_principal), session: AsyncSession = Depends(get_async_session)):
+    query = delete(Scrobble).where(Scrobble.user_id == user.id)
+    await session.exec(query)
+    await session.commit()
+    evict_known_tracks(user.id)
+    invalidate_top_tracks(user.id)
+    invalidate_samples(user.id)
+    forget_user_plays(user.id)
     return {'message': 'History cleared successfully'}
\ No newline at end of file
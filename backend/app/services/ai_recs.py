@@ -0,0 +1,533 @@
+import contextvars
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlmodel import Session
+
+from app.database import engine
+from app.services.gemini import get_gemini_client
+from app.services.jobs import Job, submit_job
+from app.services.lyrics_cache import get_lyrics_snippet
+from app.services.rate_limiter import PRIORITY_RECOMMEND
+from app.services.rec_cache import read_cache, save_cache
+from app.services.spotify import get_spotify, spotify_call
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '5')) # Seeds sent in one prompt
+
+# Spotify lookups for streamed answers run while Gemini is still writing the rest
+verify_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('STREAM_VERIFY_WORKERS', '4')),
+    thread_name_prefix='verify',
+)
+
+
+# Prompt to get music with the same vibe and flow
+def vibes_prompt(title: str, artist: str):
+    prompt = f"""
+    You are a human music listener, not a music theorist.
+
+    I am currently listening to the song:
+    Title: "{title}"
+    Artist: "{artist}"
+
+    Your task is to recommend songs that, to the HUMAN EAR, feel almost interchangeable with this song.
+
+    IMPORTANT RULES:
+    - Do NOT analyze music theory, chord progressions, keys, BPM, genre labels, or production techniques.
+    - Do NOT recommend songs just because they are by the same artist or are popular.
+    - Do NOT recommend songs that only partially match the vibe.
+
+    FOCUS ONLY ON:
+    - The emotional sensation while listening
+    - The pacing and energy as perceived by a listener
+    - The atmosphere and mood carried throughout the song
+    - How the song *feels* in isolation (late night, alone, headphones on)
+    - The internal emotional response it triggers
+
+    Think in terms of:
+    “If someone deeply connects to this song, which other songs would make them feel the SAME way when played right after it?”
+
+    CRITICAL CONSTRAINT:
+    - If a recommendation feels even slightly more energetic, darker, happier, heavier, or calmer than the seed song, DO NOT include it.
+    - Every recommended song should feel like it belongs in the SAME emotional moment.
+
+    RECOMMENDATION QUALITY:
+    - Precision matters more than variety.
+    - Hidden gems are preferred if they match perfectly.
+    - Cultural and era proximity is allowed ONLY if the emotional feel is identical.
+
+    OUTPUT FORMAT:
+    Return ONLY a raw JSON array.
+    No explanations. No markdown. No extra text.
+
+    Format:
+    [
+    {{ "title": "Song Name", "artist": "Artist Name" }}
+    ]
+
+    Return exactly 10 songs.
+
+    """
+    return prompt
+
+
+# Prompt to get music telling the same story (uses the lyrics when Genius has them)
+def lyrics_prompt(title: str, artist: str, lyrics_snippet: str = None):
+    if lyrics_snippet:
+        # Analyse the lyrics and recommend with Gemini
+        prompt = f"""
+        You are a human reader and storyteller, not a music critic or genre classifier.
+
+        Below are the lyrics from a song:
+
+        Title: "{title}"
+        Artist: "{artist}"
+
+        Lyrics:
+        "{lyrics_snippet}"
+
+        STEP 1 — INTERNAL ANALYSIS (DO NOT OUTPUT):
+        Carefully understand the song’s:
+        - Core story or situation
+        - Emotional journey (beginning → middle → end)
+        - Underlying message or meaning
+        - Perspective (who is speaking and why)
+        - What the song is REALLY about beneath the words
+
+        STEP 2 — RECOMMENDATIONS:
+        Recommend 10 OTHER songs that tell the SAME STORY or convey the SAME MEANING.
+
+        IMPORTANT RULES:
+        - Do NOT recommend songs just because they share similar words or topics.
+        - Do NOT recommend songs by the same artist unless unavoidable.
+        - Do NOT recommend songs that only match the emotion but not the narrative.
+        - Do NOT generalize (e.g., “sad songs”, “love songs”, “breakup songs”).
+
+        FOCUS ONLY ON:
+        - Narrative similarity (the same situation or life event)
+        - Storytelling perspective (regret, farewell, waiting, loss, hope, resignation, etc.)
+        - Emotional resolution (or lack of it)
+        - The takeaway a listener is left with after the song ends
+
+        CRITICAL CONSTRAINT:
+        If the story meaning or emotional conclusion differs even slightly, DO NOT include the song.
+
+        Think in terms of:
+        “If someone deeply understands this song’s message, which other songs would feel like they are saying the SAME THING in different words?”
+
+        RECOMMENDATION QUALITY:
+        - Precision over popularity.
+        - Hidden or lesser-known songs are preferred if they match perfectly.
+        - Cultural or language differences are allowed ONLY if the story is identical.
+
+        OUTPUT FORMAT:
+        Return ONLY a raw JSON array.
+        No markdown. No explanations outside JSON.
+
+        Format:
+        [
+        {{
+            "title": "Song Name",
+            "artist": "Artist Name"
+        }}
+        ]
+
+        Return exactly 10 songs.
+        """
+   
+    else:
+        prompt = f"""
+        You are a human reader and storyteller, not a music critic or genre classifier.
+
+        I am currently listening to the following song:
+        Title: "{title}"
+        Artist: "{artist}"
+
+        STEP 1 — INTERNAL LYRICS RETRIEVAL & UNDERSTANDING (DO NOT OUTPUT):
+        - Recall or infer the song’s lyrics based on your knowledge.
+        - If you are not fully confident about the lyrics, rely on the commonly understood meaning and narrative of the song.
+        - Carefully understand:
+        - The core story or situation
+        - The emotional journey (beginning → middle → end)
+        - The underlying message or meaning
+        - The speaker’s perspective
+        - What the song is REALLY about beneath the words
+
+        STEP 2 — RECOMMENDATIONS:
+        Recommend 10 OTHER songs that tell the SAME STORY or convey the SAME MEANING.
+
+        IMPORTANT RULES:
+        - Do NOT recommend songs just because they share similar keywords or topics.
+        - Do NOT recommend songs by the same artist unless unavoidable.
+        - Do NOT recommend songs that only match the emotion but not the narrative.
+        - Do NOT generalize (e.g., “sad songs”, “love songs”, “breakup songs”).
+
+        FOCUS ONLY ON:
+        - Narrative equivalence (same situation or life event)
+        - Storytelling perspective (regret, farewell, waiting, unresolved loss, quiet hope, emotional resignation, etc.)
+        - Emotional resolution (or intentional lack of resolution)
+        - The final takeaway a listener is left with
+
+        CRITICAL CONSTRAINT:
+        If the story meaning or emotional conclusion differs even slightly, DO NOT include the song.
+
+        Think in terms of:
+        “If someone understands this song’s message deeply, which other songs would feel like they are saying the SAME THING in different words?”
+
+        RECOMMENDATION QUALITY:
+        - Precision over popularity.
+        - Hidden or lesser-known songs are preferred if they match perfectly.
+        - Cultural or language differences are allowed ONLY if the narrative meaning is identical.
+
+        OUTPUT FORMAT:
+        Return ONLY a raw JSON array.
+        No markdown. No explanations outside JSON.
+
+        Format:
+        [
+        {{
+            "title": "Song Name",
+            "artist": "Artist Name"
+        }}
+        ]
+
+        Return exactly 10 songs.
+        """
+    return prompt
+
+
+# Same task as vibes_prompt / lyrics_prompt for several seeds in one call => one JSON array per seed
+def batch_prompt(rec_type: str, seeds: list, lyrics: dict = None):
+    lyrics = lyrics or {}
+
+    songs = []
+    for i, (title, artist) in enumerate(seeds, start=1):
+        song = f'{i}. Title: "{title}" | Artist: "{artist}"'
+        if lyrics.get((title, artist)):
+            song += f'\n       Lyrics:\n       "{lyrics[(title, artist)]}"'
+        songs.append(song)
+    songs = '\n\n    '.join(songs)
+
+    if rec_type == 'vibes':
+        task = """
+    You are a human music listener, not a music theorist.
+
+    For EACH song below, recommend songs that, to the HUMAN EAR, feel almost interchangeable with it.
+
+    IMPORTANT RULES:
+    - Do NOT analyze music theory, chord progressions, keys, BPM, genre labels, or production techniques.
+    - Do NOT recommend songs just because they are by the same artist or are popular.
+    - Do NOT recommend songs that only partially match the vibe.
+
+    FOCUS ONLY ON:
+    - The emotional sensation while listening
+    - The pacing and energy as perceived by a listener
+    - The atmosphere and mood carried throughout the song
+    - The internal emotional response it triggers
+
+    CRITICAL CONSTRAINT:
+    - If a recommendation feels even slightly more energetic, darker, happier, heavier, or calmer than its seed song, DO NOT include it.
+    - Precision matters more than variety. Hidden gems are preferred if they match perfectly.
+    - Treat every song on its own, recommendations for one song must not be influenced by the others.
+    """
+    else:
+        task = """
+    You are a human reader and storyteller, not a music critic or genre classifier.
+
+    For EACH song below, understand its core story, emotional journey and underlying message
+    (from the lyrics when given, otherwise from your own knowledge of the song; DO NOT output this analysis),
+    then recommend OTHER songs that tell the SAME STORY or convey the SAME MEANING.
+
+    IMPORTANT RULES:
+    - Do NOT recommend songs just because they share similar words or topics.
+    - Do NOT recommend songs by the same artist unless unavoidable.
+    - Do NOT recommend songs that only match the emotion but not the narrative.
+    - Do NOT generalize (e.g., "sad songs", "love songs", "breakup songs").
+
+    CRITICAL CONSTRAINT:
+    - If the story meaning or emotional conclusion differs even slightly, DO NOT include the song.
+    - Precision over popularity. Hidden or lesser-known songs are preferred if they match perfectly.
+    - Treat every song on its own, recommendations for one song must not be influenced by the others.
+    """
+
+    prompt = f"""{task}
+    SONGS:
+
+    {songs}
+
+    OUTPUT FORMAT:
+    Return ONLY a raw JSON object keyed by the song number.
+    No explanations. No markdown. No extra text.
+
+    Format:
+    {{
+    "1": [ {{ "title": "Song Name", "artist": "Artist Name" }} ],
+    "2": [ ... ]
+    }}
+
+    Return exactly 10 songs for every number.
+    """
+    return prompt
+
+
+# Reponse may contain ```json .... ```
+def parse_ai_json(text: str):
+    text_response = text.replace("```json", "").replace("```", "").strip()
+    return json.loads(text_response)
+
+
+# Decode error that more text could still fix (cut inside a string, a literal or at the end of the buffer)
+def _unfinished(error: json.JSONDecodeError, buffer: str):
+    if error.pos >= len(buffer) or error.msg.startswith('Unterminated string'):
+        return True
+    rest = buffer[error.pos:]
+    return any(literal.startswith(rest) for literal in ('true', 'false', 'null', '-'))
+
+
+# Streamed answer chunks -> each {"title", "artist"} object as soon as it is complete
+def iter_streamed_songs(chunks):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+
+    for chunk in chunks:
+        buffer += chunk or ''
+
+        while True:
+            start = buffer.find('{', pos)
+            if start == -1:
+                break
+            try:
+                song, end = decoder.raw_decode(buffer, start)
+            except json.JSONDecodeError as e:
+                if _unfinished(e, buffer):
+                    break # Object not finished yet, wait for the next chunk
+                pos = start + 1 # Malformed => skip it instead of waiting on it forever
+                continue
+
+            pos = end
+            if isinstance(song, dict) and song.get('title') and song.get('artist'):
+                yield song
+
+
+# Look up one AI suggestion on Spotify => rec dict or None
+def verify_song(song: dict, reason: str, priority: int = PRIORITY_RECOMMEND):
+    try:
+        query = f"track:{song['title']} artist:{song['artist']}"
+        result = spotify_call(get_spotify().search, q=query, type='track', limit=1, priority=priority)
+
+        items = result['tracks']['items']
+        if items:
+            track = items[0]
+            return {
+                "title": track['name'],
+                "artist": track['artists'][0]['name'],
+                "image_url": track['album']['images'][0]["url"] if track['album']['images'] else "",
+                "spotify_url": track['external_urls']['spotify'],
+                "reason": reason,
+            }
+
+    except Exception as e:
+        logger.warning('Error verifying %s: %s', song.get('title'), e)
+
+    return None
+
+
+# Verify AI suggestions on Spotify, skipping the seed itself
+def verify_songs(ai_recommendations: list, seed_title: str, reason: str, priority: int = PRIORITY_RECOMMEND):
+    # List to store final recommendations
+    recommendations = []
+
+    for song in ai_recommendations:
+        # Skip if it recommends same song
+        if song['title'].lower() == seed_title.lower():
+            continue
+
+        rec = verify_song(song, reason, priority=priority)
+        if rec:
+            recommendations.append(rec)
+
+    return recommendations
+
+
+def generate_vibes(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND):
+    logger.debug('Analysing vibes of %s by %s', title, artist)
+
+    response = get_gemini_client().models.generate_content(model=GEMINI_MODEL, contents=vibes_prompt(title, artist))
+    ai_recommendations = parse_ai_json(response.text)
+    logger.debug('Gemini answer: %s', ai_recommendations, extra={'sample_rate': 0.1})
+
+    return verify_songs(ai_recommendations, title, f"Similar vibe to {title}", priority=priority)
+
+
+def generate_lyrics(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND):
+    logger.debug('Analysing lyrics of %s by %s', title, artist)
+
+    # Fetch lyrics from Genius (or the lyrics cache)
+    lyrics_snippet = get_lyrics_snippet(session, title, artist)
+
+    response = get_gemini_client().models.generate_content(model=GEMINI_MODEL, contents=lyrics_prompt(title, artist, lyrics_snippet))
+    ai_recommendations = parse_ai_json(response.text)
+    logger.debug('Gemini answer: %s', ai_recommendations, extra={'sample_rate': 0.1})
+
+    return verify_songs(ai_recommendations, title, f"Lyrically similar to {title}", priority=priority)
+
+
+REASONS = {
+    'vibes': "Similar vibe to {title}",
+    'lyrics': "Lyrically similar to {title}",
+}
+
+
+# Several seeds in one Gemini call => {(title, artist): verified recs}, seeds missing from the answer are left out
+def generate_batch(session: Session, seeds: list, rec_type: str, priority: int = PRIORITY_RECOMMEND):
+    logger.info('Analysing %s of %s songs in one batch', rec_type, len(seeds))
+
+    lyrics = {}
+    if rec_type == 'lyrics':
+        for title, artist in seeds:
+            try:
+                lyrics[(title, artist)] = get_lyrics_snippet(session, title, artist)
+            except Exception as e:
+                logger.warning('Genius error for %s: %s', title, e)
+
+    response = get_gemini_client().models.generate_content(model=GEMINI_MODEL, contents=batch_prompt(rec_type, seeds, lyrics))
+    ai_recommendations = parse_ai_json(response.text)
+
+    pools = {}
+    for i, (title, artist) in enumerate(seeds, start=1):
+        songs = ai_recommendations.get(str(i))
+        if not isinstance(songs, list):
+            continue
+
+        songs = [song for song in songs if isinstance(song, dict) and song.get('title') and song.get('artist')]
+        reason = REASONS[rec_type].format(title=title)
+        pools[(title, artist)] = verify_songs(songs, title, reason, priority=priority)
+
+    return pools
+
+
+def seed_prompt(session: Session, title: str, artist: str, rec_type: str):
+    if rec_type == 'vibes':
+        return vibes_prompt(title, artist)
+    return lyrics_prompt(title, artist, get_lyrics_snippet(session, title, artist))
+
+
+# Same pool as get_seed_pool, but yields each verified song as soon as its Spotify lookup completes
+# (Gemini's answer is streamed, so lookups start before the full JSON array has arrived)
+def stream_seed_pool(session: Session, title: str, artist: str, rec_type: str, priority: int = PRIORITY_RECOMMEND):
+    pool = read_cache(session, title, artist, rec_type)
+    if pool is not None:
+        logger.debug('Found %s in cache. Returning stored recs', title)
+        yield from pool
+        return
+
+    logger.debug('Streaming %s of %s by %s', rec_type, title, artist)
+    reason = REASONS[rec_type].format(title=title)
+    response = get_gemini_client().models.generate_content_stream(model=GEMINI_MODEL, contents=seed_prompt(session, title, artist, rec_type))
+
+    pool = []
+    pending = []
+    for song in iter_streamed_songs(chunk.text for chunk in response):
+        # Skip if it recommends same song
+        if song['title'].lower() == title.lower():
+            continue
+        # Copied context => the Spotify time still counts towards the request in /metrics
+        pending.append(verify_executor.submit(contextvars.copy_context().run, verify_song, song, reason, priority))
+
+        # Emit whatever finished while the rest of the answer streams in
+        for future in [f for f in pending if f.done()]:
+            pending.remove(future)
+            rec = future.result()
+            if rec:
+                pool.append(rec)
+                yield rec
+
+    for future in as_completed(pending):
+        rec = future.result()
+        if rec:
+            pool.append(rec)
+            yield rec
+
+    if pool:
+        logger.debug('Saving recommendations to cache')
+        save_cache(session, title, artist, rec_type, pool)
+
+
+GENERATORS = {
+    'vibes': generate_vibes,
+    'lyrics': generate_lyrics,
+}
+
+
+# Verified candidate pool for a seed, shared by every user (each user's known songs are removed at read time)
+def get_seed_pool(session: Session, title: str, artist: str, rec_type: str, priority: int = PRIORITY_RECOMMEND):
+    logger.debug('Checking cache for %s - %s', title, artist)
+    pool = read_cache(session, title, artist, rec_type)
+
+    if pool is not None:
+        logger.debug('Found %s in cache. Returning stored recs', title)
+        return pool
+
+    logger.debug('Song details not found in cache')
+
+    try:
+        pool = GENERATORS[rec_type](session, title, artist, priority=priority)
+    except Exception as e:
+        logger.error('AI error: %s', e)
+        return []
+
+    # Save song and recommendations to cache
+    if pool:
+        logger.debug('Saving recommendations to cache')
+        save_cache(session, title, artist, rec_type, pool)
+
+    return pool
+
+
+# Pools for several seeds => cached ones are read, the rest are generated GEMINI_BATCH_SIZE at a time
+# and each seed is cached on its own (same entries get_seed_pool reads). None => not generated this time
+def get_seed_pools(session: Session, seeds: list, rec_type: str, priority: int = PRIORITY_RECOMMEND):
+    pools = {}
+    for title, artist in seeds:
+        pools[(title, artist)] = read_cache(session, title, artist, rec_type)
+
+    missing = [seed for seed, pool in pools.items() if pool is None]
+
+    for i in range(0, len(missing), GEMINI_BATCH_SIZE):
+        batch = missing[i:i + GEMINI_BATCH_SIZE]
+
+        try:
+            generated = generate_batch(session, batch, rec_type, priority=priority) if len(batch) > 1 else {}
+        except Exception as e:
+            # Gemini is failing (quota, 503, timeout) => no per seed calls on top, the rest stay None for the next request
+            logger.error('AI batch error: %s. Leaving %s seeds uncached', e, len(missing) - i)
+            break
+
+        for title, artist in batch:
+            pool = generated.get((title, artist))
+            if pool is None:
+                # Left out of a batch answer (or a batch of one) => ask for it alone
+                pools[(title, artist)] = get_seed_pool(session, title, artist, rec_type, priority=priority)
+                continue
+
+            if pool:
+                save_cache(session, title, artist, rec_type, pool)
+            pools[(title, artist)] = pool
+
+    return pools
+
+
+def _prefetch_job(job: Job, seeds: list, rec_type: str):
+    with Session(engine) as session:
+        get_seed_pools(session, seeds, rec_type, priority=PRIORITY_RECOMMEND)
+    return []
+
+
+# Warm the user's other seeds in the background, batched into as few Gemini calls as possible
+def prefetch_seed_pools(user_id: int, seeds: list, rec_type: str) -> Job:
+    return submit_job(f'{rec_type}-prefetch', f'{rec_type}-prefetch:{user_id}', _prefetch_job, list(seeds), rec_type)
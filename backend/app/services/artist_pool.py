@@ -0,0 +1,138 @@
+import logging
+import os
+import time
+from datetime import timedelta
+from sqlmodel import Session, select, delete
+
+from app.database import engine
+from app.models import GenreArtist
+from app.services.genre_scoring import encode_genres
+from app.services.jobs import Job, submit_job
+from app.services.rec_cache import get_cache_age
+from app.services.spotify import get_spotify, spotify_call
+
+logger = logging.getLogger(__name__)
+
+# Candidates for a genre are the same for everyone => built once, refreshed in the background when stale
+POOL_TTL = timedelta(hours=int(os.getenv('GENRE_POOL_TTL_HOURS', '24')))
+PLAYLISTS_PER_GENRE = 3
+TRACKS_PER_PLAYLIST = 30
+MIN_POPULARITY = 20
+
+# Encoded pools kept in memory => {genre: (loaded_at, candidates, genre matrix)}
+INDEX_TTL_SECONDS = 10 * 60
+EMPTY_POOL_TTL_SECONDS = int(os.getenv('GENRE_EMPTY_POOL_TTL_SECONDS', '1800')) # Nothing found => Spotify isn't asked again until then
+_pool_index = {}
+
+
+def _to_candidate(row: GenreArtist):
+    return {
+        'id': row.artist_id,
+        'name': row.name,
+        'genres': [g for g in row.genres.split(', ') if g],
+        'popularity': row.popularity,
+        'image_url': row.image_url or "",
+        'spotify_url': row.spotify_url or "",
+    }
+
+
+# Search playlists for the genre and collect the (full) artists behind their tracks
+def refresh_genre_pool(session: Session, genre: str):
+    logger.info('Refreshing artist pool for %s', genre)
+    artist_ids = []
+
+    # Search for playlists with this genre
+    playlist_results = spotify_call(get_spotify().search, q=f'{genre} top artists', type='playlist', limit=PLAYLISTS_PER_GENRE)
+
+    if not playlist_results or 'playlists' not in playlist_results:
+        logger.info('No playlists found for %s', genre)
+        return []
+
+    for playlist in playlist_results['playlists']['items']:
+        if not playlist: # Skip None playlists
+            continue
+
+        try:
+            # Get tracks from this playlist
+            tracks_result = spotify_call(get_spotify().playlist_tracks, playlist['id'], limit=TRACKS_PER_PLAYLIST)
+
+            if not tracks_result or not tracks_result.get('items'):
+                logger.debug('No tracks found in playlist %s', playlist.get('name', 'Unknown'))
+                continue
+
+            for item in tracks_result['items']:
+                if not item['track']:
+                    continue
+
+                artist_id = item['track']['artists'][0]['id']
+                if artist_id and artist_id not in artist_ids:
+                    artist_ids.append(artist_id)
+
+        except Exception as e:
+            logger.warning('Error processing playlist: %s', e)
+            continue
+
+    # Fetch full artists 50 at a time instead of one request per artist
+    rows = []
+    for i in range(0, len(artist_ids), 50):
+        try:
+            result = spotify_call(get_spotify().artists, artist_ids[i:i + 50])
+        except Exception as e:
+            logger.warning('Error fetching artists for %s: %s', genre, e)
+            continue
+
+        for artist in result['artists']:
+            if not artist or artist['popularity'] <= MIN_POPULARITY:
+                continue
+
+            rows.append(GenreArtist(
+                genre=genre,
+                artist_id=artist['id'],
+                name=artist['name'],
+                genres=', '.join(artist['genres']),
+                popularity=artist['popularity'],
+                image_url=artist['images'][0]['url'] if artist['images'] else None,
+                spotify_url=artist['external_urls']['spotify'],
+            ))
+
+    # Keep the old pool if Spotify gave us nothing this time
+    if rows:
+        session.exec(delete(GenreArtist).where(GenreArtist.genre == genre))
+        session.add_all(rows)
+        session.commit()
+        _pool_index.pop(genre, None)
+
+    return rows
+
+
+def _refresh_job(job: Job, genre: str):
+    with Session(engine) as session:
+        refresh_genre_pool(session, genre)
+    return []
+
+
+# Candidate artists for a genre (and their encoded genre matrix), building the pool on first use
+# and refreshing it in the background once stale
+def get_genre_pool(session: Session, genre: str):
+    cached = _pool_index.get(genre)
+    if cached and time.monotonic() - cached[0] < (INDEX_TTL_SECONDS if cached[1] else EMPTY_POOL_TTL_SECONDS):
+        return cached[1], cached[2]
+
+    rows = session.exec(select(GenreArtist).where(GenreArtist.genre == genre)).all()
+
+    if not rows:
+        try:
+            rows = refresh_genre_pool(session, genre)
+        except Exception as e:
+            logger.warning('Search error for %s: %s', genre, e)
+            rows = []
+
+    elif get_cache_age(rows[0].refreshed_at) > POOL_TTL:
+        submit_job('genre-pool', f'genre-pool:{genre}', _refresh_job, genre)
+
+    candidates = [_to_candidate(row) for row in rows]
+    matrix = encode_genres([c['genres'] for c in candidates])
+
+    # Empty pools (niche genres, failed refreshes) are kept too, so they don't cost a search per request
+    _pool_index[genre] = (time.monotonic(), candidates, matrix)
+    return candidates, matrix
@@ -0,0 +1,85 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# External API clients (Gemini, Spotify, Genius, MusicBrainz) are built on first use instead of at import
+# => the SDKs are only imported when a request needs them, and a missing credential only breaks the features using it
+# The app's lifespan closes whatever was created on shutdown
+
+
+class ClientUnavailable(RuntimeError):
+    pass
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._entries = {} # {name: {factory, close, env, lock}}
+        self._clients = {}
+        self._status = {}
+
+    # env => variables the client can't work without, checked before importing anything
+    def register(self, name: str, factory, close=None, env=()):
+        self._entries[name] = {'factory': factory, 'close': close, 'env': tuple(env), 'lock': threading.Lock()}
+        self._status.setdefault(name, {'status': 'not_started', 'error': None, 'init_ms': None})
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        entry = self._entries[name]
+        with entry['lock']: # One construction per client, others wait for it
+            client = self._clients.get(name)
+            if client is not None:
+                return client
+
+            missing = [var for var in entry['env'] if not os.getenv(var)]
+            if missing:
+                error = f"{name} is not configured (missing {', '.join(missing)})"
+                self._status[name] = {'status': 'unconfigured', 'error': error, 'init_ms': None}
+                raise ClientUnavailable(error)
+
+            start = time.perf_counter()
+            try:
+                client = entry['factory']()
+            except Exception as e:
+                self._status[name] = {'status': 'error', 'error': f'{type(e).__name__}: {e}', 'init_ms': None}
+                raise ClientUnavailable(f'{name} client failed to start: {e}') from e
+
+            self._status[name] = {'status': 'ready', 'error': None, 'init_ms': round((time.perf_counter() - start) * 1000, 1)}
+            self._clients[name] = client
+            return client
+
+    # Never builds a client => safe for health checks
+    def status(self):
+        report = {}
+        for name, entry in self._entries.items():
+            report[name] = {
+                **self._status[name],
+                'configured': all(os.getenv(var) for var in entry['env']),
+            }
+        return report
+
+    def close_all(self):
+        for name, client in list(self._clients.items()):
+            close = self._entries[name]['close']
+            if close is not None:
+                try:
+                    close(client)
+                except Exception as e:
+                    logger.warning('Closing %s client failed: %s', name, e)
+            del self._clients[name]
+            self._status[name] = {'status': 'closed', 'error': None, 'init_ms': None}
+
+
+registry = ClientRegistry()
+
+
+# requests based SDKs keep a Session (connection pool) on the client
+def close_requests_session(client):
+    session = getattr(client, '_session', None)
+    if session is not None and hasattr(session, 'close'):
+        session.close()
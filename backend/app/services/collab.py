@@ -0,0 +1,281 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+from scipy import sparse
+from sqlmodel import Session, select, delete
+from sqlalchemy import func
+
+from app.database import engine
+from app.models import Scrobble, TrackNeighbors, User
+from app.services.jobs import Job, submit_job
+from app.services.known_tracks import KnownTracks, normalize_track
+from app.services.stats_service import get_user_top_tracks
+
+logger = logging.getLogger(__name__)
+
+# Item-item collaborative filtering => "people who play this also play ..." from our own scrobbles, no external calls
+CF_NEIGHBORS = int(os.getenv('CF_NEIGHBORS', '20')) # Neighbours kept per track
+CF_MIN_LISTENERS = int(os.getenv('CF_MIN_LISTENERS', '2')) # Tracks with fewer listeners only add noise
+CF_BLOCK_SIZE = 2048 # Tracks per similarity block, bounds memory of the product
+
+# New scrobbles mark their track dirty => its neighbours are recomputed once enough tracks changed (or enough time passed)
+CF_REFRESH_MIN_TRACKS = int(os.getenv('CF_REFRESH_MIN_TRACKS', '50'))
+CF_REFRESH_SECONDS = int(os.getenv('CF_REFRESH_SECONDS', '600'))
+
+_dirty = set()
+_dirty_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def track_key(title: str, artist: str):
+    return '\t'.join(normalize_track(title, artist))
+
+
+def _track_info(title: str, artist: str, spotify_id, image_url):
+    return {
+        'title': title,
+        'artist': artist,
+        'image_url': image_url or "",
+        'spotify_url': f"https://open.spotify.com/track/{spotify_id}" if spotify_id else "",
+    }
+
+
+# User x track play counts kept in memory => loaded by a full build, then updated on ingest
+# A refresh only reads the rows of the dirty tracks' listeners instead of scanning every scrobble again
+class PlayCounts:
+    def __init__(self, rows=()):
+        self.keys = {} # track key -> index
+        self.track_keys = []
+        self.tracks = [] # Display info per index
+        self.users = {} # user_id -> {track index: plays}
+        self.listeners = [] # track index -> user_ids
+        self.sq_norms = [] # track index -> sum of log1p(plays)^2 over its listeners
+
+        for user_id, title, artist, plays, spotify_id, image_url in rows:
+            self.add(user_id, title, artist, plays, spotify_id, image_url)
+
+    def _track(self, title: str, artist: str, spotify_id, image_url):
+        key = track_key(title, artist)
+        index = self.keys.get(key)
+        if index is None:
+            index = self.keys[key] = len(self.track_keys)
+            self.track_keys.append(key)
+            self.tracks.append(_track_info(title, artist, spotify_id, image_url))
+            self.listeners.append(set())
+            self.sq_norms.append(0.0)
+        return index
+
+    def add(self, user_id: int, title: str, artist: str, plays: int = 1, spotify_id=None, image_url=None):
+        track = self._track(title, artist, spotify_id, image_url)
+        row = self.users.setdefault(user_id, {})
+        old = row.get(track, 0)
+        row[track] = old + plays
+        self.listeners[track].add(user_id)
+        self.sq_norms[track] += math.log1p(old + plays) ** 2 - math.log1p(old) ** 2
+        return self.track_keys[track]
+
+    # History cleared / account deleted => keys of the tracks that lost a listener
+    def remove_user(self, user_id: int):
+        row = self.users.pop(user_id, {})
+        for track, plays in row.items():
+            self.listeners[track].discard(user_id)
+            self.sq_norms[track] = max(self.sq_norms[track] - math.log1p(plays) ** 2, 0.0)
+        return {self.track_keys[track] for track in row}
+
+    # Listeners of `tracks` (all tracks when None) x every track they played (log-scaled play counts)
+    # => (matrix, global index per column, column norms and listener counts over all users)
+    def matrix(self, tracks=None):
+        if tracks is None:
+            users = list(self.users)
+        else:
+            users = list(set().union(*(self.listeners[t] for t in tracks))) if tracks else []
+        columns = sorted({t for user in users for t in self.users[user]})
+        column_of = {track: i for i, track in enumerate(columns)}
+
+        rows, cols, plays = [], [], []
+        for i, user in enumerate(users):
+            for track, count in self.users[user].items():
+                rows.append(i)
+                cols.append(column_of[track])
+                plays.append(count)
+
+        matrix = sparse.csr_matrix(
+            (np.log1p(np.array(plays, dtype=np.float32)), (rows, cols)), shape=(len(users), len(columns)),
+        )
+        norms = np.sqrt(np.array([self.sq_norms[t] for t in columns], dtype=np.float32))
+        listeners = np.array([len(self.listeners[t]) for t in columns], dtype=np.int64)
+        return matrix, columns, norms, listeners
+
+
+# Scrobbles grouped per (user, track) => one full scan
+def load_play_counts(session: Session):
+    rows = session.exec(
+        select(
+            Scrobble.user_id, Scrobble.title, Scrobble.artist,
+            func.count(Scrobble.id), func.max(Scrobble.spotify_id), func.max(Scrobble.image_url),
+        )
+        .group_by(Scrobble.user_id, Scrobble.title, Scrobble.artist)
+    )
+    return PlayCounts(rows)
+
+
+# Scrobbles -> user x track matrix (log-scaled play counts) and the display info of each track
+def load_matrix(session: Session):
+    counts = load_play_counts(session)
+    if not counts.users:
+        return sparse.csr_matrix((0, 0), dtype=np.float32), counts.keys, counts.tracks
+    matrix, _, _, _ = counts.matrix()
+    return matrix, counts.keys, counts.tracks
+
+
+# Cosine similarity between track columns, top-k per requested track => {track index: [(neighbour index, score)]}
+# norms / listeners default to the matrix's own columns, a partial matrix passes the ones over all users
+def compute_neighbors(matrix, track_indices, k: int = CF_NEIGHBORS, norms=None, listeners=None):
+    if listeners is None:
+        listeners = np.diff(matrix.tocsc().indptr)
+    if norms is None:
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms = np.array(norms, dtype=np.float32)
+    norms[(norms == 0) | (listeners < CF_MIN_LISTENERS)] = np.inf # Rare tracks score 0
+
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    track_indices = [i for i in track_indices if listeners[i] >= CF_MIN_LISTENERS]
+
+    neighbors = {}
+    for start in range(0, len(track_indices), CF_BLOCK_SIZE):
+        block = track_indices[start:start + CF_BLOCK_SIZE]
+        similarity = (normalized[:, block].T @ normalized).tocsr()
+
+        for row, track in enumerate(block):
+            cols = similarity.indices[similarity.indptr[row]:similarity.indptr[row + 1]]
+            scores = similarity.data[similarity.indptr[row]:similarity.indptr[row + 1]]
+
+            keep = (cols != track) & (scores > 0)
+            cols, scores = cols[keep], scores[keep]
+            if len(cols) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+                cols, scores = cols[best], scores[best]
+
+            order = np.argsort(-scores)
+            neighbors[track] = [(int(cols[i]), float(scores[i])) for i in order]
+
+    return neighbors
+
+
+_counts = None
+_counts_lock = threading.Lock()
+
+
+# Recompute and store neighbours => every track when `only_keys` is None, else just those
+def build_neighbors(session: Session, only_keys: set = None):
+    global _counts
+    started = time.perf_counter()
+
+    with _counts_lock:
+        if only_keys is None or _counts is None:
+            _counts = load_play_counts(session) # Full builds also resync the in memory counts
+        counts = _counts
+
+        if only_keys is None:
+            tracks = list(range(len(counts.track_keys)))
+        else:
+            tracks = [counts.keys[key] for key in only_keys if key in counts.keys]
+        matrix, columns, norms, listeners = counts.matrix(tracks)
+        column_of = {track: i for i, track in enumerate(columns)}
+        track_keys, track_info = counts.track_keys, counts.tracks
+
+    if only_keys is None:
+        session.exec(delete(TrackNeighbors))
+    else:
+        session.exec(delete(TrackNeighbors).where(TrackNeighbors.track_key.in_(only_keys)))
+
+    local = [column_of[track] for track in tracks if track in column_of]
+    neighbors = compute_neighbors(matrix, local, norms=norms, listeners=listeners) if local else {}
+
+    for column, similar in neighbors.items():
+        if not similar:
+            continue
+        session.add(TrackNeighbors(
+            track_key=track_keys[columns[column]],
+            neighbors_json=json.dumps([{**track_info[columns[i]], 'score': round(score, 4)} for i, score in similar]),
+        ))
+    session.commit()
+
+    logger.info('Item neighbours built for %s of %s tracks (%s listeners) in %.2fs',
+                len(neighbors), len(track_keys), matrix.shape[0], time.perf_counter() - started)
+    return len(neighbors)
+
+
+def _refresh_job(job: Job):
+    global _last_refresh
+    with _dirty_lock:
+        keys = set(_dirty)
+        _dirty.clear()
+        _last_refresh = time.monotonic()
+
+    with Session(engine) as session:
+        build_neighbors(session, only_keys=keys)
+    return []
+
+
+def _mark_dirty(keys):
+    with _dirty_lock:
+        _dirty.update(keys)
+        due = len(_dirty) >= CF_REFRESH_MIN_TRACKS or time.monotonic() - _last_refresh >= CF_REFRESH_SECONDS
+
+    if due:
+        submit_job('cf-refresh', 'cf-refresh', _refresh_job)
+
+
+# Called on ingest => the play is counted and the track's neighbour list is refreshed in the background with the next batch
+def mark_track_played(user_id: int, title: str, artist: str, spotify_id=None, image_url=None):
+    with _counts_lock:
+        if _counts is not None:
+            _counts.add(user_id, title, artist, 1, spotify_id, image_url)
+    _mark_dirty({track_key(title, artist)})
+
+
+# Called when a user's scrobbles are deleted => their tracks lose a listener
+def forget_user_plays(user_id: int):
+    with _counts_lock:
+        keys = _counts.remove_user(user_id) if _counts is not None else set()
+    if keys:
+        _mark_dirty(keys)
+
+
+# Neighbours of the user's top tracks, summed => tracks their co-listeners play most
+def get_similar_listener_recs(session: Session, user: User, known_songs: KnownTracks, limit: int = 10):
+    top_tracks = get_user_top_tracks(session, user, limit=10)
+    if not top_tracks:
+        return None
+
+    seeds = {track_key(t.title, t.artist): t.title for t in top_tracks}
+    rows = session.exec(select(TrackNeighbors).where(TrackNeighbors.track_key.in_(list(seeds)))).all()
+
+    scores, best_seed, info = {}, {}, {}
+    for row in rows:
+        for neighbor in json.loads(row.neighbors_json):
+            key = track_key(neighbor['title'], neighbor['artist'])
+            if key in seeds or (neighbor['title'], neighbor['artist']) in known_songs:
+                continue
+
+            scores[key] = scores.get(key, 0.0) + neighbor['score']
+            if neighbor['score'] > best_seed.get(key, (None, 0.0))[1]:
+                best_seed[key] = (seeds[row.track_key], neighbor['score'])
+            info[key] = neighbor
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [
+        {
+            "title": info[key]['title'],
+            "artist": info[key]['artist'],
+            "image_url": info[key]['image_url'],
+            "spotify_url": info[key]['spotify_url'],
+            "reason": f"Listeners of {best_seed[key][0]} also play this",
+        }
+        for key in ranked
+    ]
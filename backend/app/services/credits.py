@@ -0,0 +1,170 @@
+import logging
+import threading
+from sqlmodel import Session
+
+from app.database import engine
+from app.services.jobs import Job, submit_job
+from app.services.known_tracks import KnownTracks, filter_known
+from app.services import mb_graph
+from app.services.rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_RECOMMEND
+from app.services.rec_cache import read_cache, save_cache
+from app.services.spotify import get_spotify, spotify_call
+
+logger = logging.getLogger(__name__)
+
+CREDITS_POOL_SIZE = 8 # Verified songs kept per seed, each user's known songs are removed at read time
+CREDITS_MAX_WORKS = 50
+
+# Striped seed locks => two users with the same top song don't crawl it twice
+# Fixed set, so memory doesn't grow with every seed ever crawled (seeds sharing a stripe just take turns)
+SEED_LOCK_STRIPES = 64
+_seed_locks = [threading.Lock() for _ in range(SEED_LOCK_STRIPES)]
+
+
+def _seed_lock(title: str, artist: str):
+    return _seed_locks[hash((title, artist)) % SEED_LOCK_STRIPES]
+
+
+# Walk recording -> work -> songwriter -> other works -> recordings, then verify on Spotify
+# Edges come from the local MusicBrainz graph tables, only missing ones are fetched from MB
+def crawl_credits(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND, job: Job = None):
+    logger.debug('Credits search for: %s - %s', title, artist)
+
+    recording_id = mb_graph.find_recording(session, title, artist, priority=priority)
+    if not recording_id:
+        logger.debug('Song not found on MB. Skipping')
+        return []
+
+    # Find the main songwriter
+    songwriter = None
+    songwriter_id = None
+
+    for work_id in mb_graph.recording_works(session, recording_id, priority=priority):
+        writers = mb_graph.work_writers(session, work_id, priority=priority)
+        if writers:
+            songwriter_id, songwriter, rel_type = writers[0]
+            logger.debug('Found %s: %s', rel_type, songwriter)
+            break
+
+    if not songwriter:
+        logger.debug('No songwriter found for this song. Skipping')
+        return []
+
+    logger.debug('Finding other works by %s', songwriter)
+    works = mb_graph.artist_works(session, songwriter_id, songwriter, limit=CREDITS_MAX_WORKS, priority=priority)
+
+    # Popular songwriters are answered by this single join
+    known_artists = mb_graph.cached_work_artists(session, [work_id for work_id, _ in works])
+
+    songs = []
+    seen_songs = {title.lower()}
+
+    for i, (work_id, work_title) in enumerate(works):
+        if job:
+            job.update(progress=i / max(len(works), 1), message=f'Checking works by {songwriter}')
+
+        # Skip duplicates
+        if work_title.lower() in seen_songs:
+            continue
+
+        try:
+            artist_name = known_artists.get(work_id) or mb_graph.work_artist(session, work_id, priority=priority)
+        except Exception as e:
+            logger.warning('Error fetching work %s: %s', work_title, e)
+            session.rollback()
+            continue
+
+        if not artist_name:
+            continue
+
+        songs.append({'title': work_title, 'artist': artist_name})
+        seen_songs.add(work_title.lower())
+
+        if len(songs) >= CREDITS_POOL_SIZE: break
+
+    # Search spotify for the songs
+    logger.debug('Verifying %s candidates on spotify', len(songs))
+    recommendations = []
+
+    for song in songs:
+        try:
+            query = f"track:{song['title']} artist:{song['artist']}"
+            result = spotify_call(get_spotify().search, q=query, type='track', limit=1, priority=priority)
+
+            items = result['tracks']['items']
+            if items:
+                track = items[0]
+                recommendations.append({
+                    "title": track['name'],
+                    "artist": track['artists'][0]['name'],
+                    "image_url": track['album']['images'][0]["url"] if track['album']['images'] else "",
+                    "spotify_url": track['external_urls']['spotify'],
+                    "reason": f"Also produced by {songwriter}",
+                })
+
+        except Exception as e:
+            logger.warning('Error finding on spotify: %s: %s', song['title'], e)
+            continue
+
+    return recommendations
+
+
+# Cached credits pool for a seed, crawling it if needed (empty pools are cached too, so dead ends aren't re-crawled)
+def get_seed_credits(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND, job: Job = None):
+    cached = read_cache(session, title, artist, 'credits')
+    if cached is not None:
+        return cached
+
+    with _seed_lock(title, artist):
+        # Another worker may have crawled it while we waited
+        cached = read_cache(session, title, artist, 'credits')
+        if cached is not None:
+            return cached
+
+        try:
+            recommendations = crawl_credits(session, title, artist, priority=priority, job=job)
+        except Exception as e:
+            logger.warning('Credits crawl failed for %s: %s', title, e)
+            session.rollback()
+            return []
+
+        logger.debug('Saving credit recs to cache')
+        save_cache(session, title, artist, 'credits', recommendations)
+        return recommendations
+
+
+# Job body => Crawl seeds until one gives the user something new, then keep going to prefetch the rest
+def _credits_job(job: Job, seeds: list, known_songs: KnownTracks):
+    with Session(engine) as session:
+        for title, artist in seeds:
+            if job.finished:
+                # User already has results => warm the remaining seeds at low priority
+                get_seed_credits(session, title, artist, priority=PRIORITY_RECOMMEND)
+                continue
+
+            job.update(message=f'Searching credits for {title}')
+            pool = get_seed_credits(session, title, artist, priority=PRIORITY_INTERACTIVE, job=job)
+
+            recommendations = filter_known(pool, known_songs)
+            if recommendations:
+                job.finish(recommendations)
+
+        if not job.finished:
+            job.finish([{'message': 'No credits found for any artists'}])
+
+
+def start_credits_job(user_id: int, seeds: list, known_songs: KnownTracks) -> Job:
+    return submit_job('credits', f'credits:{user_id}', _credits_job, seeds, known_songs)
+
+
+# Job body => Warm the credits cache for seeds nobody is waiting on yet
+def _prefetch_job(job: Job, seeds: list):
+    with Session(engine) as session:
+        for i, (title, artist) in enumerate(seeds):
+            job.update(progress=i / len(seeds), message=f'Prefetching credits for {title}')
+            get_seed_credits(session, title, artist, priority=PRIORITY_RECOMMEND)
+    return []
+
+
+def prefetch_credits(user_id: int, seeds: list) -> Job:
+    return submit_job('credits-prefetch', f'credits-prefetch:{user_id}', _prefetch_job, list(seeds))
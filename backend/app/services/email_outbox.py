@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timezone, timedelta
+import httpx
+from sqlmodel import Session, select
+from sqlalchemy import delete, update
+
+from app.database import engine
+from app.models import EmailOutbox
+from app.services.http_pool import HTTP_KEEPALIVE_SECONDS, pooled_httpx_async_client
+
+logger = logging.getLogger(__name__)
+
+# Emails are queued in the outbox with the OTP (same commit) and sent here, so requests never wait on Brevo
+BREVO_URL = os.getenv('BREVO_URL', 'https://api.brevo.com/v3/smtp/email')
+EMAIL_POLL_SECONDS = float(os.getenv('EMAIL_POLL_SECONDS', '5'))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '20'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '6'))
+EMAIL_BACKOFF_SECONDS = float(os.getenv('EMAIL_BACKOFF_SECONDS', '2')) # Doubles per attempt
+EMAIL_MAX_BACKOFF_SECONDS = 300
+EMAIL_LEASE_SECONDS = 60 # A claimed email is retried after this if its sender died
+EMAIL_TIMEOUT_SECONDS = float(os.getenv('EMAIL_TIMEOUT_SECONDS', '10'))
+EMAIL_RETENTION_DAYS = int(os.getenv('EMAIL_RETENTION_DAYS', '7')) # Sent / failed rows kept this long (without their body)
+EMAIL_PURGE_SECONDS = 3600
+
+
+def otp_email_html(otp: str):
+    return f"""
+    <div style="font-family: Arial, sans-serif; padding: 20px">
+    <h2>Universal Scrobbler Security</h2>
+    <p>Your One-Time Password (OTP) is :</p>
+    <h1 style="color: #697565; letter-spacing: 5px;">{otp}</h1>
+    <p>This code expires in 10 minutes</p>
+    <p>If you did not request this, please ignore this email.</p>
+    </div>
+    """
+
+
+# Added to the caller's session => sent once the caller commits (call wake_email_sender() after)
+def queue_email(session: Session, to_email: str, subject: str, html: str):
+    email = EmailOutbox(to_email=to_email, subject=subject, html=html)
+    session.add(email)
+    return email
+
+
+def queue_otp_email(session: Session, email: str, otp: str, subject: str = 'Your Verification Code'):
+    return queue_email(session, email, subject, otp_email_html(otp))
+
+
+def backoff_seconds(attempts: int):
+    delay = min(EMAIL_BACKOFF_SECONDS * 2 ** (attempts - 1), EMAIL_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# Due emails, each leased with a conditional update => two senders never send the same email
+def _claim_due(limit: int = EMAIL_BATCH_SIZE):
+    now = datetime.now(timezone.utc)
+    claimed = []
+
+    with Session(engine) as session:
+        due = session.exec(
+            select(EmailOutbox)
+            .where(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(limit)
+        ).all()
+
+        for email in due:
+            attempts = email.attempts + 1 # Read first, the update below also refreshes email.attempts
+            result = session.exec(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == email.id, EmailOutbox.attempts == email.attempts)
+                .values(attempts=attempts, next_attempt_at=now + timedelta(seconds=EMAIL_LEASE_SECONDS))
+            )
+            if result.rowcount == 1:
+                claimed.append({
+                    'id': email.id,
+                    'to_email': email.to_email,
+                    'subject': email.subject,
+                    'html': email.html,
+                    'attempts': attempts,
+                })
+        session.commit()
+
+    return claimed
+
+
+def _record_result(email: dict, error: str = None, retryable: bool = False):
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        row = session.get(EmailOutbox, email['id'])
+        if row is None:
+            return
+
+        if error is None:
+            row.status = 'sent'
+            row.sent_at = now
+            row.last_error = None
+            row.html = '' # The body holds the OTP => only kept while it may still be sent
+        elif retryable and email['attempts'] < EMAIL_MAX_ATTEMPTS:
+            row.next_attempt_at = now + timedelta(seconds=backoff_seconds(email['attempts']))
+            row.last_error = error
+        else:
+            row.status = 'failed'
+            row.last_error = error
+            row.html = ''
+
+        session.add(row)
+        session.commit()
+
+
+# Sent / failed rows past the retention => deleted (number of rows)
+def purge_outbox(days: int = EMAIL_RETENTION_DAYS):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    with Session(engine) as session:
+        result = session.exec(
+            delete(EmailOutbox)
+            .where(EmailOutbox.status.in_(['sent', 'failed']), EmailOutbox.created_at < cutoff)
+        )
+        session.commit()
+    return result.rowcount
+
+
+# => None when sent, else (error, retryable)
+async def _send(client: httpx.AsyncClient, email: dict):
+    payload = {
+        'sender': {'email': os.getenv('MAIL_USERNAME'), 'name': 'Universal Scrobbler'},
+        'to': [{'email': email['to_email']}],
+        'subject': email['subject'],
+        'htmlContent': email['html'],
+    }
+
+    try:
+        response = await client.post(BREVO_URL, json=payload)
+    except httpx.HTTPError as e:
+        return f'{type(e).__name__}: {e}', True
+
+    if response.status_code in (200, 201, 202):
+        return None
+    # Rate limited or Brevo having a bad moment => try again later, anything else won't fix itself
+    retryable = response.status_code == 429 or response.status_code >= 500
+    return f'{response.status_code}: {response.text[:500]}', retryable
+
+
+# Send everything that is due => number of emails handled
+async def drain_outbox(client: httpx.AsyncClient):
+    handled = 0
+    while True:
+        emails = await asyncio.to_thread(_claim_due)
+        if not emails:
+            return handled
+
+        results = await asyncio.gather(*[_send(client, email) for email in emails])
+        for email, result in zip(emails, results):
+            if result is None:
+                logger.info('Email sent to %s', email['to_email'], extra={'email_id': email['id']})
+                await asyncio.to_thread(_record_result, email)
+            else:
+                error, retryable = result
+                logger.warning('Email to %s failed (attempt %s): %s', email['to_email'], email['attempts'], error, extra={'email_id': email['id'], 'retryable': retryable})
+                await asyncio.to_thread(_record_result, email, error, retryable)
+        handled += len(emails)
+
+
+def make_email_client():
+    return pooled_httpx_async_client(
+        'brevo',
+        headers={
+            'accept': 'application/json',
+            'api-key': os.getenv('BREVO_API_KEY') or '',
+            'content-type': 'application/json',
+        },
+        timeout=EMAIL_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+    )
+
+
+_loop = None
+_wake = None
+_task = None
+
+
+# New email committed => send now instead of at the next poll
+def wake_email_sender():
+    if _loop is not None and _wake is not None:
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+async def _sender_loop():
+    last_purge = 0.0
+    async with make_email_client() as client:
+        while True:
+            try:
+                await drain_outbox(client)
+            except Exception as e:
+                logger.exception('Email sender error: %s', e)
+
+            if _loop.time() - last_purge >= EMAIL_PURGE_SECONDS:
+                last_purge = _loop.time()
+                try:
+                    purged = await asyncio.to_thread(purge_outbox)
+                    if purged:
+                        logger.info('Purged %s old outbox emails', purged)
+                except Exception as e:
+                    logger.exception('Email purge error: %s', e)
+
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=EMAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wake.clear()
+
+
+# Called from the app's startup (inside the event loop)
+def start_email_sender():
+    global _loop, _wake, _task
+    if _task is not None:
+        return
+
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    _task = _loop.create_task(_sender_loop())
+
+
+async def stop_email_sender():
+    global _loop, _wake, _task
+    if _task is None:
+        return
+
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _loop = _wake = _task = None
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from scipy.sparse.linalg import svds
+from sqlmodel import Session
+
+from app.services.collab import load_matrix, track_key
+
+logger = logging.getLogger(__name__)
+
+# Track embeddings => each track is a unit vector (from factorizing the user x track play matrix)
+# so "similar tracks" is a nearest neighbour search, answered from memory without any external call
+EMBEDDINGS_DIR = os.getenv('EMBEDDINGS_DIR', 'embeddings')
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '64'))
+
+# Brute force is exact and fast enough for small stores, bigger ones also get an IVF index
+IVF_MIN_TRACKS = int(os.getenv('IVF_MIN_TRACKS', '50000'))
+IVF_PROBES = int(os.getenv('IVF_PROBES', '8'))
+IVF_TRAIN_SAMPLE = 50_000
+IVF_ITERATIONS = 10
+IVF_SUFFIXES = ('.centroids.npy', '.order.npy', '.offsets.npy')
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+# Best k of a score array, best first
+def _top_k(scores, k: int):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+# Inverted file index => vectors are grouped around centroids, a query only scans the groups closest to it
+class IVFIndex:
+    def __init__(self, centroids, order, offsets):
+        self.centroids = centroids
+        self.order = order # Track ids grouped by list
+        self.offsets = offsets # List i is order[offsets[i]:offsets[i + 1]]
+
+    # Spherical k-means on a sample, then every vector goes to its closest centroid
+    @classmethod
+    def train(cls, vectors, n_lists: int = None, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), max(IVF_TRAIN_SAMPLE, n_lists)), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(IVF_ITERATIONS):
+            assigned = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assigned, sample)
+            empty = np.bincount(assigned, minlength=n_lists) == 0
+            sums[empty] = centroids[empty] # Keep empty lists where they were
+            centroids = _normalize(sums)
+
+        assigned = np.concatenate([
+            np.argmax(vectors[i:i + 20_000] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), 20_000)
+        ])
+        order = np.argsort(assigned, kind='stable').astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assigned, minlength=n_lists))]).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def search(self, vectors, query, k: int, n_probe: int = IVF_PROBES):
+        lists = _top_k(self.centroids @ query, n_probe)
+        # Sorted => memmap reads go forward
+        candidates = np.sort(np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists]))
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: str):
+        for suffix, array in zip(IVF_SUFFIXES, (self.centroids, self.order, self.offsets)):
+            np.save(f'{path}{suffix}', array)
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(f'{path}.centroids.npy'):
+            return None
+        return cls(
+            np.load(f'{path}.centroids.npy'),
+            np.load(f'{path}.order.npy', mmap_mode='r'),
+            np.load(f'{path}.offsets.npy'),
+        )
+
+
+# Unit vectors in a memory mapped float32 file + the track behind each row
+class EmbeddingStore:
+    def __init__(self, vectors, tracks: list, index: IVFIndex = None):
+        self.vectors = vectors
+        self.tracks = tracks
+        self.keys = {track_key(t['title'], t['artist']): i for i, t in enumerate(tracks)}
+        self.index = index
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def vector(self, title: str, artist: str):
+        row = self.keys.get(track_key(title, artist))
+        return None if row is None else np.asarray(self.vectors[row])
+
+    # Exact cosine search over every track
+    def search_exact(self, query, k: int):
+        scores = np.asarray(self.vectors @ query)
+        best = _top_k(scores, k)
+        return best, scores[best]
+
+    def search(self, query, k: int, exact: bool = False):
+        if self.index is None or exact:
+            return self.search_exact(query, k)
+        return self.index.search(self.vectors, query, k)
+
+    # Written to temp files first, so a running server never reads a half written store
+    @classmethod
+    def save(cls, path: str, vectors, tracks: list, index: IVFIndex = None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.tmp'
+
+        mapped = np.memmap(f'{tmp}.f32', dtype=np.float32, mode='w+', shape=vectors.shape)
+        mapped[:] = vectors
+        mapped.flush()
+        del mapped
+
+        with open(f'{tmp}.json', 'w', encoding='utf-8') as f:
+            json.dump({'dim': int(vectors.shape[1]), 'tracks': tracks, 'ivf': index is not None}, f)
+
+        if index is not None:
+            index.save(tmp)
+            for suffix in IVF_SUFFIXES:
+                os.replace(f'{tmp}{suffix}', f'{path}{suffix}')
+
+        os.replace(f'{tmp}.f32', f'{path}.f32')
+        os.replace(f'{tmp}.json', f'{path}.json') # Written last => marks the store complete
+
+        # No index this time => the old one is ignored (see 'ivf'), removed once the new store is in place
+        if index is None:
+            for suffix in IVF_SUFFIXES:
+                if os.path.exists(f'{path}{suffix}'):
+                    os.remove(f'{path}{suffix}')
+
+    @classmethod
+    def load(cls, path: str):
+        with open(f'{path}.json', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        tracks = meta['tracks']
+        if not tracks:
+            return cls(np.zeros((0, meta['dim']), dtype=np.float32), tracks)
+
+        vectors = np.memmap(f'{path}.f32', dtype=np.float32, mode='r', shape=(len(tracks), meta['dim']))
+        return cls(vectors, tracks, IVFIndex.load(path) if meta.get('ivf', True) else None)
+
+
+STORE_PATH = os.path.join(EMBEDDINGS_DIR, 'tracks')
+
+_store = None
+_store_mtime = None
+_store_lock = threading.Lock()
+
+
+# Current store, reloaded when a rebuild replaced the files => None until the first build
+def get_store():
+    global _store, _store_mtime
+    try:
+        mtime = os.path.getmtime(f'{STORE_PATH}.json')
+    except OSError:
+        return None
+
+    with _store_lock:
+        if mtime != _store_mtime:
+            _store = EmbeddingStore.load(STORE_PATH)
+            _store_mtime = mtime
+        return _store
+
+
+# Factorize the play matrix => track vectors that are close when the same people play them
+def build_embeddings(session: Session, dim: int = EMBEDDING_DIM):
+    started = time.perf_counter()
+    matrix, _, tracks = load_matrix(session)
+
+    rank = min(dim, min(matrix.shape) - 1)
+    if rank < 2:
+        logger.info('Not enough listening data for track embeddings')
+        return 0
+
+    _, singular, vt = svds(matrix.astype(np.float32), k=rank)
+    vectors = _normalize(vt.T * np.sqrt(singular))
+
+    index = IVFIndex.train(vectors) if len(vectors) >= IVF_MIN_TRACKS else None
+    EmbeddingStore.save(STORE_PATH, vectors, tracks, index)
+
+    logger.info('Track embeddings built for %s tracks (%s dims) in %.2fs', len(tracks), rank, time.perf_counter() - started)
+    return len(tracks)
+
+
+# Nearest tracks to each of the user's top tracks, merged => best score wins
+def recommend_from_tracks(store: EmbeddingStore, seeds: list, known_songs, limit: int = 10):
+    seed_keys = {track_key(title, artist) for title, artist in seeds}
+    best = {}
+
+    for title, artist in seeds:
+        query = store.vector(title, artist)
+        if query is None:
+            continue
+
+        rows, scores = store.search(query, limit + len(seeds) + 10)
+        for row, score in zip(rows, scores):
+            track = store.tracks[row]
+            key = track_key(track['title'], track['artist'])
+            if key in seed_keys or (track['title'], track['artist']) in known_songs:
+                continue
+            if score > best.get(key, (None, -1.0))[1]:
+                best[key] = ({**track, 'reason': f"Close to {title}"}, float(score))
+
+    ranked = sorted(best.values(), key=lambda x: x[1], reverse=True)[:limit]
+    return [rec for rec, _ in ranked]
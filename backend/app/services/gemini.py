@@ -1,7 +1,34 @@
-import os
-from dotenv import load_dotenv
-import google.genai as genai
-
-load_dotenv()
-
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
\ No newline at end of file
+import os
+import httpx
+from dotenv import load_dotenv
+
+from app.services.clients import registry
+from app.services.http_pool import HTTP_CONNECT_TIMEOUT, pooled_httpx_client
+
+load_dotenv()
+
+GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '120'))
+
+
+# google.genai is slow to import => loaded with the client, on the first Gemini call
+# Requests go through a pooled httpx client (generations are slow => long read timeout)
+def _create_client():
+    import google.genai as genai
+    from google.genai import types
+
+    http_client = pooled_httpx_client('gemini', timeout=httpx.Timeout(GEMINI_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT))
+    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"), http_options=types.HttpOptions(httpx_client=http_client))
+    client._pooled_http_client = http_client
+    return client
+
+
+def _close_client(client):
+    client.close()
+    client._pooled_http_client.close() # Passed in => not closed by the SDK
+
+
+registry.register('gemini', _create_client, close=_close_client, env=('GEMINI_API_KEY',))
+
+
+def get_gemini_client():
+    return registry.get('gemini')
@@ -1,12 +1,28 @@
-import os
-import lyricsgenius
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Initialize the client
-genius = lyricsgenius.Genius(os.getenv("GENIUS_ACCESS_TOKEN"), timeout=15, retries=3)
-
-# Global Settings
-genius.remove_section_headers = True # Remove headers ([Chorus] [Verse])
-genius.verbose = False # Turn off status messages
\ No newline at end of file
+import os
+from dotenv import load_dotenv
+
+from app.services.clients import registry, close_requests_session
+from app.services.http_pool import mount_pooled
+
+load_dotenv()
+
+
+# Initialize the client (on first use)
+def _create_client():
+    import lyricsgenius
+    genius = lyricsgenius.Genius(os.getenv("GENIUS_ACCESS_TOKEN"), timeout=15, retries=3)
+
+    # Global Settings
+    genius.remove_section_headers = True # Remove headers ([Chorus] [Verse])
+    genius.verbose = False # Turn off status messages
+
+    # lyricsgenius keeps its own session (headers), its requests go through the shared pool
+    mount_pooled(genius._session, 'genius')
+    return genius
+
+
+registry.register('genius', _create_client, close=close_requests_session, env=('GENIUS_ACCESS_TOKEN',))
+
+
+def get_genius():
+    return registry.get('genius')
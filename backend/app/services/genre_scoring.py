@@ -0,0 +1,136 @@
+import os
+import re
+import threading
+from functools import lru_cache
+import numpy as np
+from scipy import sparse
+
+# A partial match (shared word, eg "pop" in "indie pop") counts half as much as the exact genre
+TOKEN_WEIGHT = 0.5
+
+# Feature -> column, shared by every pool so their matrices can be stacked
+# Capped => features past GENRE_VOCAB_MAX share a few hashed columns after it (Spotify has a few thousand genres, only junk gets there)
+GENRE_VOCAB_MAX = int(os.getenv('GENRE_VOCAB_MAX', '50000'))
+OVERFLOW_COLUMNS = 1024
+_vocab = {}
+_vocab_lock = threading.Lock()
+
+
+# Caller holds _vocab_lock
+def _column(feature: str):
+    col = _vocab.get(feature)
+    if col is None:
+        if len(_vocab) < GENRE_VOCAB_MAX:
+            col = _vocab[feature] = len(_vocab)
+        else:
+            col = GENRE_VOCAB_MAX + hash(feature) % OVERFLOW_COLUMNS
+    return col
+
+
+# Columns a matrix needs right now (grows with the vocabulary, fixed once it is full)
+def vocab_width():
+    size = len(_vocab)
+    return size if size < GENRE_VOCAB_MAX else GENRE_VOCAB_MAX + OVERFLOW_COLUMNS
+
+
+# Genre -> ((column, weight), ...) for the genre itself plus its words
+@lru_cache(maxsize=50_000)
+def genre_features(genre: str):
+    features = {genre: 1.0}
+    for word in re.split(r'[\s\-&/]+', genre):
+        if word:
+            features['#' + word] = TOKEN_WEIGHT
+
+    with _vocab_lock:
+        return tuple((_column(feature), weight) for feature, weight in features.items())
+
+
+def _word_columns(genre: str):
+    return {col for col, weight in genre_features(genre) if weight == TOKEN_WEIGHT}
+
+
+# Candidates' genre lists -> candidate x vocabulary matrix of raw feature weights
+# Pools encode once when loaded, so requests only stack and multiply
+def encode_genres(candidate_genres: list):
+    indptr, cols, vals = [0], [], []
+
+    for genres in candidate_genres:
+        features = {}
+        for genre in genres:
+            for col, weight in genre_features(genre):
+                features[col] = max(features.get(col, 0.0), weight)
+
+        cols.extend(features.keys())
+        vals.extend(features.values())
+        indptr.append(len(cols))
+
+    return sparse.csr_matrix(
+        (np.asarray(vals, dtype=np.float32), np.asarray(cols, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+        shape=(len(candidate_genres), vocab_width()),
+    )
+
+
+# Matrices built earlier have fewer columns (the vocabulary only grows)
+def _pad(matrix, width: int):
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width))
+
+
+def stack(matrices: list):
+    width = vocab_width()
+    return sparse.vstack([_pad(m, width) for m in matrices], format='csr')
+
+
+# Genres the candidate shares with the user (exact first, then partial) => used for the reason text
+def shared_genres(user_genres: list, cand_genres: list):
+    overlap = [g for g in user_genres if g in cand_genres]
+    if overlap:
+        return overlap
+
+    cand_words = set().union(*[_word_columns(g) for g in cand_genres]) if cand_genres else set()
+    return [g for g in user_genres if _word_columns(g) & cand_words]
+
+
+# Rank candidates by cosine similarity between their TF-IDF genre vectors and the user's genre profile
+def rank_candidates(candidates: list, genre_weights: dict, limit: int = 10, matrix=None):
+    if not candidates or not genre_weights:
+        return []
+
+    # Encode the user first so their features are part of the vocabulary
+    profile_features = {}
+    for genre, weight in genre_weights.items():
+        for col, feature_weight in genre_features(genre):
+            profile_features[col] = max(profile_features.get(col, 0.0), weight * feature_weight)
+
+    if matrix is None:
+        matrix = encode_genres([c['genres'] for c in candidates])
+    matrix = _pad(matrix, vocab_width())
+
+    # Rare features say more about an artist than "pop" does
+    doc_freq = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = (np.log((1 + matrix.shape[0]) / (1 + doc_freq)) + 1).astype(np.float32)
+
+    weighted = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+
+    profile = np.zeros(matrix.shape[1], dtype=np.float32)
+    for col, weight in profile_features.items():
+        profile[col] = weight * idf[col]
+    profile /= np.linalg.norm(profile) or 1
+
+    scores = (weighted @ profile) / norms
+
+    # Only sort the winners
+    top = min(limit, len(candidates))
+    best = np.argpartition(-scores, top - 1)[:top]
+    best = best[np.argsort(-scores[best])]
+
+    user_genres = list(genre_weights)
+    return [
+        {
+            'artist': candidates[i],
+            'score': float(scores[i]),
+            'overlap': shared_genres(user_genres, candidates[i]['genres']),
+        }
+        for i in best if scores[i] > 0
+    ]
@@ -0,0 +1,249 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.metrics import observe_external
+
+logger = logging.getLogger(__name__)
+
+# One transport setup for every external integration (Spotify, Genius, MusicBrainz, Gemini, Brevo)
+# => keep-alive connection pools per host, the same timeouts everywhere and reuse / latency numbers per service
+# requests based SDKs get an instrumented adapter mounted on their session, httpx based ones get a client built here
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '10')) # Hosts with their own pool, per service
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20')) # Keep-alive connections kept per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '60')) # Idle connections closed after this (httpx)
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() == 'true' # httpx clients only, needs the h2 package
+LATENCY_WINDOW = 500 # Recent calls kept per service for percentiles
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+class ServiceStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.connections = 0 # httpx clients count these themselves, requests adapters are read from their pools
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.adapters = []
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, error: bool = False):
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.latencies.append(seconds)
+        observe_external(self.name, seconds, error)
+
+    def record_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def snapshot(self):
+        requests_sent, connections = self.requests, self.connections
+        for adapter in self.adapters:
+            pool_requests, pool_connections = adapter.pool_counts()
+            # Retries inside urllib3 are extra requests on the pool, count those instead of calls
+            requests_sent += max(pool_requests - adapter.calls, 0)
+            connections += pool_connections
+
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+        return {
+            'requests': requests_sent,
+            'connections_opened': connections,
+            'reuse_rate': round(1 - connections / requests_sent, 3) if requests_sent else None,
+            'errors': self.errors,
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)},
+        }
+
+
+# Caps on the requests sent per service while it is active (off-peak prefetch) => counted here so every SDK is covered,
+# a request over the cap is refused before it goes out. Executors that copy the context share the caller's meter
+class CallLimitReached(Exception):
+    pass
+
+
+class CallMeter:
+    def __init__(self, limits: dict):
+        self.remaining = dict(limits)
+        self.refused = set() # Services that hit their cap
+        self._lock = threading.Lock()
+
+    def charge(self, service: str, calls: int = 1, refuse: bool = True):
+        with self._lock:
+            if service not in self.remaining:
+                return
+            if refuse and self.remaining[service] < calls:
+                self.refused.add(service)
+                raise CallLimitReached(f'{service} call limit reached')
+            self.remaining[service] -= calls
+
+    def has_calls(self, services):
+        with self._lock:
+            return all(self.remaining.get(service, 0) > 0 for service in services)
+
+
+_call_meter = contextvars.ContextVar('call_meter', default=None)
+
+
+@contextmanager
+def metered_calls(meter: CallMeter):
+    token = _call_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _call_meter.reset(token)
+
+
+def _charge(name: str, calls: int = 1, refuse: bool = True):
+    meter = _call_meter.get()
+    if meter is not None:
+        meter.charge(name, calls, refuse)
+
+
+def _service(name: str):
+    with _services_lock:
+        if name not in _services:
+            _services[name] = ServiceStats(name)
+        return _services[name]
+
+
+# requests => pooled adapter with a default timeout, timing every call
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, service: ServiceStats, max_retries=0):
+        self.service = service
+        self.calls = 0
+        super().__init__(
+            pool_connections=HTTP_POOL_HOSTS,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=max_retries,
+        )
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+        _charge(self.service.name)
+        start = time.perf_counter()
+        self.calls += 1
+        try:
+            response = super().send(request, timeout=timeout, **kwargs)
+        except Exception:
+            self.service.record(time.perf_counter() - start, error=True)
+            raise
+        self.service.record(time.perf_counter() - start, error=response.status_code >= 500)
+
+        # urllib3's own retries were sent too => charged after the fact (they can't be refused)
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            _charge(self.service.name, len(retries.history), refuse=False)
+        return response
+
+    # (requests, new connections) across the host pools
+    def pool_counts(self):
+        pools = []
+        for key in self.poolmanager.pools.keys():
+            try:
+                pools.append(self.poolmanager.pools[key])
+            except KeyError: # Evicted meanwhile
+                pass
+        return sum(pool.num_requests for pool in pools), sum(pool.num_connections for pool in pools)
+
+
+# Mount the pooled adapter on a session an SDK made itself (keeps its headers / auth)
+def mount_pooled(session: requests.Session, name: str, max_retries=0):
+    service = _service(name)
+    adapter = PooledAdapter(service, max_retries=max_retries)
+    service.adapters.append(adapter)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def pooled_session(name: str, max_retries=0):
+    return mount_pooled(requests.Session(), name, max_retries)
+
+
+_http2 = None
+
+
+def _http2_available():
+    global _http2
+    if _http2 is None:
+        try:
+            import h2 # noqa: F401
+            _http2 = True
+        except ImportError:
+            logger.warning('HTTP2_ENABLED is set but the h2 package is missing (pip install httpx[http2]), using HTTP/1.1')
+            _http2 = False
+    return _http2
+
+
+# httpx => new connections are seen through the trace extension, latency is request sent -> headers received
+def _httpx_options(name: str, kwargs: dict, asynchronous: bool):
+    service = _service(name)
+
+    def on_trace(event, info):
+        if event == 'connection.connect_tcp.complete':
+            service.record_connection()
+
+    async def on_trace_async(event, info):
+        on_trace(event, info)
+
+    def on_request(request):
+        _charge(name)
+        request.extensions['trace'] = on_trace_async if asynchronous else on_trace
+        request.extensions['pool_start'] = time.perf_counter()
+
+    def on_response(response):
+        start = response.request.extensions.get('pool_start')
+        if start is not None:
+            service.record(time.perf_counter() - start, error=response.status_code >= 500)
+
+    if asynchronous:
+        request_hook, response_hook = on_request, on_response
+
+        async def on_request(request):
+            request_hook(request)
+
+        async def on_response(response):
+            response_hook(response)
+
+    kwargs.setdefault('timeout', httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT))
+    kwargs.setdefault('limits', httpx.Limits(
+        max_connections=HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=HTTP_POOL_MAXSIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    ))
+    kwargs.setdefault('http2', HTTP2_ENABLED and _http2_available())
+    kwargs['event_hooks'] = {'request': [on_request], 'response': [on_response]}
+    return kwargs
+
+
+def pooled_httpx_client(name: str, **kwargs):
+    return httpx.Client(**_httpx_options(name, kwargs, asynchronous=False))
+
+
+def pooled_httpx_async_client(name: str, **kwargs):
+    return httpx.AsyncClient(**_httpx_options(name, kwargs, asynchronous=True))
+
+
+def transport_stats():
+    with _services_lock:
+        services = list(_services.values())
+    return {service.name: service.snapshot() for service in services}
@@ -0,0 +1,111 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Background workers for slow crawls, so request threads return immediately
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('JOB_WORKERS', '2')),
+    thread_name_prefix='job',
+)
+
+JOB_TTL_SECONDS = 60 * 60 # Finished jobs are kept for an hour so clients can collect results
+
+_jobs = {} # {job_id: Job}
+_active = {} # {key: Job} => Prevents starting the same crawl twice
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = 'pending' # pending -> running -> done / failed
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def update(self, progress: float = None, message: str = None):
+        if progress is not None:
+            self.progress = round(min(max(progress, 0.0), 1.0), 3)
+        if message is not None:
+            self.message = message
+        self.updated_at = time.time()
+
+    # Publish the result; the worker may keep going afterwards (eg: prefetching)
+    def finish(self, result):
+        self.result = result
+        self.status = 'done'
+        self.update(progress=1.0)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+def _run(job: Job, fn, args, kwargs):
+    job.status = 'running'
+    job.update()
+    try:
+        result = fn(job, *args, **kwargs)
+        if not job.finished:
+            job.finish(result)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed: %s', job.kind, job.key, e)
+        job.status = 'failed'
+        job.error = str(e)
+        job.update()
+    finally:
+        with _lock:
+            if _active.get(job.key) is job:
+                del _active[job.key]
+
+
+def _cleanup():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for job_id, job in list(_jobs.items()):
+        if job.finished and job.updated_at < cutoff:
+            del _jobs[job_id]
+
+
+# Start fn(job, *args, **kwargs) in the background, or return the job already running for this key
+def submit_job(kind: str, key: str, fn, *args, **kwargs) -> Job:
+    with _lock:
+        _cleanup()
+
+        existing = _active.get(key)
+        if existing and not existing.finished:
+            return existing
+
+        job = Job(kind, key)
+        _jobs[job.id] = job
+        _active[key] = job
+
+    # Copied context => the job's log lines keep the request id of the request that started it
+    executor.submit(contextvars.copy_context().run, _run, job, fn, args, kwargs)
+    return job
+
+
+def get_job(job_id: str):
+    with _lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,99 @@
+import hashlib
+import math
+import os
+import threading
+from cachetools import LRUCache
+from sqlmodel import Session, select
+
+from app.models import Scrobble
+
+# Users kept in memory, least recently used are evicted first
+KNOWN_TRACKS_MAX_USERS = int(os.getenv('KNOWN_TRACKS_MAX_USERS', '1000'))
+# Histories bigger than this are stored as a Bloom filter instead of a set
+BLOOM_THRESHOLD = int(os.getenv('KNOWN_TRACKS_BLOOM_THRESHOLD', '20000'))
+BLOOM_ERROR_RATE = 0.001
+
+
+# Same key everywhere => "Starboy" by "The Weeknd" matches "starboy " by "the weeknd"
+def normalize_track(title: str, artist: str):
+    return (title or '').strip().lower(), (artist or '').strip().lower()
+
+
+# Fixed size probabilistic set, false positives only (a few unknown songs may be skipped, known songs never slip through)
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+# Songs a user has already listened to => `(title, artist) in known` works with any casing
+class KnownTracks:
+    def __init__(self, tracks: list):
+        keys = ['\t'.join(normalize_track(title, artist)) for title, artist in tracks]
+
+        if len(keys) > BLOOM_THRESHOLD:
+            # Leave room to grow before the error rate degrades
+            self._keys = BloomFilter(len(keys) * 2)
+            for key in keys:
+                self._keys.add(key)
+        else:
+            self._keys = set(keys)
+
+    def add(self, title: str, artist: str):
+        self._keys.add('\t'.join(normalize_track(title, artist)))
+
+    def __contains__(self, track):
+        title, artist = track
+        return '\t'.join(normalize_track(title, artist)) in self._keys
+
+
+# Remove songs the user already knows and cut to top N
+def filter_known(recs: list, known_songs: KnownTracks, limit: int = 5):
+    return [rec for rec in recs if (rec['title'], rec['artist']) not in known_songs][:limit]
+
+
+_cache = LRUCache(maxsize=KNOWN_TRACKS_MAX_USERS)
+_lock = threading.Lock()
+
+
+# Built once from the user's history, then kept up to date on ingest
+def get_known_tracks(session: Session, user_id: int) -> KnownTracks:
+    with _lock:
+        known = _cache.get(user_id)
+    if known is not None:
+        return known
+
+    history_query = select(Scrobble.title, Scrobble.artist).where(Scrobble.user_id == user_id).distinct()
+    known = KnownTracks(session.exec(history_query).all())
+
+    with _lock:
+        # Keep the copy another request may have built meanwhile (it may already have new scrobbles)
+        return _cache.setdefault(user_id, known)
+
+
+def add_known_track(user_id: int, title: str, artist: str):
+    with _lock:
+        known = _cache.get(user_id)
+        if known is not None:
+            known.add(title, artist)
+
+
+# History cleared or account deleted
+def evict_known_tracks(user_id: int):
+    with _lock:
+        _cache.pop(user_id, None)
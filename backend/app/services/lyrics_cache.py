@@ -0,0 +1,68 @@
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.models import LyricsCache
+from app.services.genius import get_genius
+from app.services.known_tracks import normalize_track
+from app.services.rec_cache import get_cache_age
+
+logger = logging.getLogger(__name__)
+
+LYRICS_TTL = timedelta(days=int(os.getenv('LYRICS_TTL_DAYS', '90')))
+LYRICS_NOT_FOUND_TTL = timedelta(days=int(os.getenv('LYRICS_NOT_FOUND_TTL_DAYS', '7')))
+SNIPPET_LENGTH = 1000
+
+
+# Ask Genius => (found, snippet). Raises on network errors so they aren't cached as "not found"
+def fetch_lyrics_snippet(title: str, artist: str):
+    song = get_genius().search_song(title, artist)
+    if song and song.lyrics:
+        # Truncate the lyrics to first 1000 charachters
+        return True, song.lyrics[:SNIPPET_LENGTH] + "..."
+    return False, None
+
+
+# Lyrics snippet for a song, None if Genius doesn't have it
+def get_lyrics_snippet(session: Session, title: str, artist: str):
+    title_key, artist_key = normalize_track(title, artist)
+
+    cached = session.exec(select(LyricsCache).where(
+        LyricsCache.title_key == title_key,
+        LyricsCache.artist_key == artist_key,
+    )).first()
+
+    if cached:
+        ttl = LYRICS_TTL if cached.found else LYRICS_NOT_FOUND_TTL
+        if get_cache_age(cached.fetched_at) < ttl:
+            if not cached.found:
+                logger.debug('Lyrics not found on genius (cached). Switching to AI memory')
+                return None
+            logger.debug('Lyrics found in cache')
+            return zlib.decompress(cached.snippet).decode('utf-8')
+
+    try:
+        found, snippet = fetch_lyrics_snippet(title, artist)
+    except Exception as e:
+        logger.warning('Genius error: %s. Switching to AI memory', e)
+        return None
+
+    if found:
+        logger.debug('Lyrics fetched successfully')
+    else:
+        logger.debug('Lyrics not found on genius. Switching to AI memory')
+
+    # Expired => refresh the row in place, (title_key, artist_key) is unique
+    entry = cached or LyricsCache(title_key=title_key, artist_key=artist_key)
+    entry.snippet = zlib.compress(snippet.encode('utf-8'), 9) if found else None
+    entry.found = found
+    entry.fetched_at = datetime.now(timezone.utc)
+    session.add(entry)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback() # Same song cached by another request at the same time
+    return snippet
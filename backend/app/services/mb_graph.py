@@ -0,0 +1,252 @@
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from sqlmodel import Session, select, delete
+
+from app.models import MBRecording, MBRecordingSearch, MBWork, MBWorkArtist, MBWorkRecording, MBArtist
+from app.services.musicbrainz import get_musicbrainz, mb_call
+from app.services.rate_limiter import PRIORITY_RECOMMEND
+
+logger = logging.getLogger(__name__)
+
+# Credits rarely change => edges are kept for a month, failed searches are retried after a week
+GRAPH_TTL = timedelta(days=int(os.getenv('MB_GRAPH_TTL_DAYS', '30')))
+NOT_FOUND_TTL = timedelta(days=int(os.getenv('MB_NOT_FOUND_TTL_DAYS', '7')))
+
+SONGWRITER_TYPES = ['composer', 'writer', 'lyricist']
+
+
+def _is_fresh(fetched_at: datetime, ttl: timedelta):
+    if fetched_at is None:
+        return False
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - fetched_at < ttl
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _credited_artist(recording: dict):
+    credits = recording.get('artist-credit', [])
+    for credit in credits:
+        if isinstance(credit, dict) and 'artist' in credit:
+            return credit['artist']['name']
+    return None
+
+
+def _upsert_recording(session: Session, recording: dict):
+    row = session.get(MBRecording, recording['id'])
+    if row is None:
+        row = MBRecording(mbid=recording['id'], title=recording.get('title', ''))
+
+    artist_name = _credited_artist(recording)
+    if artist_name:
+        row.artist_name = artist_name
+    row.fetched_at = _now()
+
+    session.add(row)
+    return row
+
+
+def _get_work(session: Session, work_mbid: str, title: str = ''):
+    row = session.get(MBWork, work_mbid)
+    if row is None:
+        row = MBWork(mbid=work_mbid, title=title)
+    elif title:
+        row.title = title
+    return row
+
+
+# (title, artist) -> recording MBID
+def find_recording(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND):
+    cached = session.exec(select(MBRecordingSearch).where(
+        MBRecordingSearch.query_title == title.lower(),
+        MBRecordingSearch.query_artist == artist.lower(),
+    )).first()
+
+    if cached:
+        ttl = GRAPH_TTL if cached.recording_mbid else NOT_FOUND_TTL
+        if _is_fresh(cached.fetched_at, ttl):
+            return cached.recording_mbid
+        session.delete(cached)
+
+    logger.debug('Searching for %s - %s', title, artist)
+    result = mb_call(get_musicbrainz().search_recordings, query=title, artist=artist, limit=5, priority=priority)
+
+    recording_mbid = None
+    if result['recording-list']:
+        # Get the first match
+        recording = result['recording-list'][0]
+        recording_mbid = recording['id']
+        _upsert_recording(session, recording)
+        logger.debug('Found recording %s - %s', recording['title'], recording_mbid)
+
+    session.add(MBRecordingSearch(query_title=title.lower(), query_artist=artist.lower(), recording_mbid=recording_mbid))
+    session.commit()
+    return recording_mbid
+
+
+# Recording -> works it is a performance of
+def recording_works(session: Session, recording_mbid: str, priority: int = PRIORITY_RECOMMEND):
+    row = session.get(MBRecording, recording_mbid)
+
+    if not row or not _is_fresh(row.works_fetched_at, GRAPH_TTL):
+        details = mb_call(
+            get_musicbrainz().get_recording_by_id,
+            id=recording_mbid,
+            includes=['artist-rels', 'work-rels'],
+            priority=priority,
+        )['recording']
+
+        row = _upsert_recording(session, details)
+        row.works_fetched_at = _now()
+
+        for work_rel in details.get('work-relation-list', []):
+            if 'work' not in work_rel:
+                continue
+            work = work_rel['work']
+            session.add(_get_work(session, work['id'], work.get('title', '')))
+
+            existing = session.exec(select(MBWorkRecording).where(
+                MBWorkRecording.work_mbid == work['id'],
+                MBWorkRecording.recording_mbid == recording_mbid,
+            )).first()
+            if not existing:
+                session.add(MBWorkRecording(work_mbid=work['id'], recording_mbid=recording_mbid, position=-1))
+
+        session.commit()
+
+    return session.exec(
+        select(MBWorkRecording.work_mbid).where(MBWorkRecording.recording_mbid == recording_mbid)
+    ).all()
+
+
+# Work -> songwriters [(artist_mbid, name, rel_type)]
+def work_writers(session: Session, work_mbid: str, priority: int = PRIORITY_RECOMMEND):
+    work = session.get(MBWork, work_mbid)
+
+    if not work or not _is_fresh(work.artists_fetched_at, GRAPH_TTL):
+        details = mb_call(get_musicbrainz().get_work_by_id, work_mbid, includes=['artist-rels'], priority=priority)['work']
+
+        work = _get_work(session, work_mbid, details.get('title', ''))
+        work.artists_fetched_at = _now()
+        session.add(work)
+
+        session.exec(delete(MBWorkArtist).where(
+            MBWorkArtist.work_mbid == work_mbid,
+            MBWorkArtist.rel_type.in_(SONGWRITER_TYPES),
+        ))
+        for artist_rel in details.get('artist-relation-list', []):
+            rel_type = artist_rel.get('type', '')
+            if rel_type in SONGWRITER_TYPES:
+                session.add(MBWorkArtist(
+                    work_mbid=work_mbid,
+                    artist_mbid=artist_rel['artist']['id'],
+                    artist_name=artist_rel['artist']['name'],
+                    rel_type=rel_type,
+                ))
+        session.commit()
+
+    rows = session.exec(select(MBWorkArtist).where(
+        MBWorkArtist.work_mbid == work_mbid,
+        MBWorkArtist.rel_type.in_(SONGWRITER_TYPES),
+    ).order_by(MBWorkArtist.id)).all()
+    return [(row.artist_mbid, row.artist_name, row.rel_type) for row in rows]
+
+
+# Songwriter -> their works (from a MB search on their name, like the original crawl)
+def artist_works(session: Session, artist_mbid: str, name: str, limit: int = 50, priority: int = PRIORITY_RECOMMEND):
+    artist = session.get(MBArtist, artist_mbid)
+
+    if not artist or not _is_fresh(artist.works_fetched_at, GRAPH_TTL):
+        work_result = mb_call(get_musicbrainz().search_works, artist=name, limit=limit, priority=priority)
+
+        artist = artist or MBArtist(mbid=artist_mbid, name=name)
+        artist.works_fetched_at = _now()
+        session.add(artist)
+
+        session.exec(delete(MBWorkArtist).where(
+            MBWorkArtist.artist_mbid == artist_mbid,
+            MBWorkArtist.rel_type == 'search',
+        ))
+        seen = set()
+        for work in work_result['work-list']:
+            if work['id'] in seen:
+                continue
+            seen.add(work['id'])
+            session.add(_get_work(session, work['id'], work.get('title', '')))
+            session.add(MBWorkArtist(work_mbid=work['id'], artist_mbid=artist_mbid, artist_name=name, rel_type='search'))
+        session.commit()
+
+    rows = session.exec(
+        select(MBWork.mbid, MBWork.title)
+        .join(MBWorkArtist, MBWorkArtist.work_mbid == MBWork.mbid)
+        .where(MBWorkArtist.artist_mbid == artist_mbid, MBWorkArtist.rel_type == 'search')
+        .order_by(MBWorkArtist.id)
+        .limit(limit)
+    ).all()
+    return [(row.mbid, row.title) for row in rows]
+
+
+# Works -> (first recording's artist) in one join, for every work whose edges are already stored
+def cached_work_artists(session: Session, work_mbids: list):
+    if not work_mbids:
+        return {}
+
+    rows = session.exec(
+        select(MBWorkRecording.work_mbid, MBRecording.artist_name)
+        .join(MBRecording, MBRecording.mbid == MBWorkRecording.recording_mbid)
+        .join(MBWork, MBWork.mbid == MBWorkRecording.work_mbid)
+        .where(MBWorkRecording.work_mbid.in_(work_mbids))
+        .where(MBWork.recordings_fetched_at >= _now() - GRAPH_TTL)
+        .where(MBWorkRecording.position == 0)
+        .where(MBRecording.artist_name.is_not(None))
+    ).all()
+    return {row.work_mbid: row.artist_name for row in rows}
+
+
+# Work -> artist of its first recording, fetching only the missing edges
+def work_artist(session: Session, work_mbid: str, priority: int = PRIORITY_RECOMMEND):
+    work = session.get(MBWork, work_mbid)
+
+    if not work or not _is_fresh(work.recordings_fetched_at, GRAPH_TTL):
+        details = mb_call(get_musicbrainz().get_work_by_id, work_mbid, includes=['recording-rels'], priority=priority)['work']
+
+        work = _get_work(session, work_mbid, details.get('title', ''))
+        work.recordings_fetched_at = _now()
+        session.add(work)
+
+        session.exec(delete(MBWorkRecording).where(
+            MBWorkRecording.work_mbid == work_mbid,
+            MBWorkRecording.position >= 0,
+        ))
+        recordings = [
+            rec_rel['recording'] for rec_rel in details.get('recording-relation-list', [])
+            if rec_rel.get('recording', {}).get('id')
+        ]
+        for position, recording in enumerate(recordings):
+            if not session.get(MBRecording, recording['id']):
+                session.add(MBRecording(mbid=recording['id'], title=recording.get('title', '')))
+            session.add(MBWorkRecording(work_mbid=work_mbid, recording_mbid=recording['id'], position=position))
+        session.commit()
+
+    first = session.exec(
+        select(MBWorkRecording.recording_mbid)
+        .where(MBWorkRecording.work_mbid == work_mbid, MBWorkRecording.position >= 0)
+        .order_by(MBWorkRecording.position)
+    ).first()
+    if not first:
+        return None
+
+    recording = session.get(MBRecording, first)
+    if recording.artist_name is None:
+        # Get artist name from full recording details
+        details = mb_call(get_musicbrainz().get_recording_by_id, first, includes=['artists'], priority=priority)['recording']
+        recording = _upsert_recording(session, details)
+        if recording.artist_name is None:
+            recording.artist_name = 'Unknown Artist'
+        session.commit()
+
+    return recording.artist_name
@@ -0,0 +1,226 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text format metrics (GET /metrics), kept in process => no client library, no background work
+# Hot path cost is a perf_counter, a bisect and a short lock per observation
+# Scrape time collectors fold in the stats other modules already keep (rate limiters, pools, write queue)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        lines += [f'{self.name}{_labels(self.labelnames, labels)} {value}' for labels, value in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # {labels: [bucket counts..., +Inf count, sum]}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, seconds: float, *labels):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+# fn() => [(name, type, help, [(labels dict, value)])], called on every scrape
+def register_collector(fn):
+    _collectors.append(fn)
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logger.exception('Metrics collector failed: %s', e)
+            continue
+        for name, kind, help, samples in families:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f'{name}{_labels(labels.keys(), labels.values())} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Request latency by route template', ('method', 'route', 'status'),
+)
+request_dependency_duration = Histogram(
+    'http_request_dependency_seconds', 'Time a request spent in each dependency (db, spotify, gemini, ...), summed over its calls',
+    ('route', 'dependency'),
+)
+db_query_duration = Histogram(
+    'db_query_duration_seconds', 'SQL statement execution time by statement type', ('operation',), buckets=DB_BUCKETS,
+)
+external_call_duration = Histogram(
+    'external_call_duration_seconds', 'External API call latency (request sent to response headers)', ('service',),
+)
+external_call_errors = Counter(
+    'external_call_errors_total', 'External API calls that failed (connection errors and 5xx responses)', ('service',),
+)
+ai_cache_lookups = Counter(
+    'ai_cache_lookups_total', 'AICache reads by recommendation type and result (hit, miss, expired)', ('rec_type', 'result'),
+)
+
+
+# Per request time per dependency => the middleware creates the dict, DB events and external calls add to it
+# contextvars follow the request into run_in_threadpool / asyncio.to_thread (and executors that copy the context)
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _add_request_time(dependency: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[dependency] = timings.get(dependency, 0.0) + seconds
+
+
+def observe_db(operation: str, seconds: float):
+    db_query_duration.observe(seconds, operation)
+    _add_request_time('db', seconds)
+
+
+def observe_external(service: str, seconds: float, error: bool = False):
+    external_call_duration.observe(seconds, service)
+    if error:
+        external_call_errors.inc(service)
+    _add_request_time(service, seconds)
+
+
+def observe_ai_cache(rec_type: str, result: str):
+    ai_cache_lookups.inc(rec_type, result)
+
+
+def _ai_cache_ratios():
+    with ai_cache_lookups._lock:
+        values = dict(ai_cache_lookups._values)
+    totals, hits = {}, {}
+    for (rec_type, result), count in values.items():
+        totals[rec_type] = totals.get(rec_type, 0) + count
+        if result == 'hit':
+            hits[rec_type] = hits.get(rec_type, 0) + count
+    return [(
+        'ai_cache_hit_ratio', 'gauge', 'AICache hits / lookups since start, by recommendation type',
+        [({'rec_type': rec_type}, round(hits.get(rec_type, 0) / total, 4)) for rec_type, total in totals.items()],
+    )]
+
+
+register_collector(_ai_cache_ratios)
+
+
+# SQLAlchemy cursor events => every statement of an engine is timed (sync engine, or async_engine.sync_engine)
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    # A connection runs one statement at a time => one start time per connection is enough
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('query_start', None)
+        if start is not None:
+            words = statement.split(None, 1)
+            observe_db(words[0].upper() if words else 'OTHER', time.perf_counter() - start)
+
+
+# Pure ASGI => no BaseHTTPMiddleware overhead, streaming responses are timed to their end
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get('route')
+            # Route template, not the raw path => bounded label values
+            path = getattr(route, 'path', None) or 'unmatched'
+            request_duration.observe(time.perf_counter() - start, scope['method'], path, str(status['code']))
+            for dependency, seconds in timings.items():
+                request_dependency_duration.observe(seconds, path, dependency)
@@ -0,0 +1,79 @@
+import logging
+import os
+import requests
+
+from app.services.clients import registry
+from app.services.http_pool import pooled_session
+from app.services.rate_limiter import TokenBucket, PRIORITY_RECOMMEND
+
+logger = logging.getLogger(__name__)
+
+
+# musicbrainzngs is configured globally => the module itself is the client, set up on first use
+def _create_client():
+    import musicbrainzngs
+    musicbrainzngs.set_useragent("UniversalScrobbler", "1.0", "http://localhost:8000")
+
+    # MusicBrainz allows ~1 request per second per client, shared by every crawl in the process.
+    # The module's own limiter is turned off so callers queue (with priorities) in mb_limiter instead of sleeping.
+    musicbrainzngs.set_rate_limit(False)
+
+    # musicbrainzngs opens a fresh urllib connection per request => its reads go through the shared pool instead
+    musicbrainzngs.musicbrainz._safe_read = _pooled_read
+    return musicbrainzngs
+
+
+_mb_session = pooled_session('musicbrainz')
+
+
+# Stand-in for musicbrainzngs' _safe_read(opener, req, body) => same errors, one keep-alive session
+# No sleeping retries in here, 503s come back as ResponseError and mb_call backs off through mb_limiter
+def _pooled_read(opener, req, body=None, **kwargs):
+    from urllib.error import HTTPError
+    from musicbrainzngs.musicbrainz import AuthenticationError, NetworkError, ResponseError
+
+    try:
+        response = _mb_session.request(req.get_method(), req.full_url, headers=dict(req.header_items()), data=body or req.data)
+    except requests.RequestException as e:
+        raise NetworkError(cause=e)
+
+    if response.status_code >= 400:
+        cause = HTTPError(req.full_url, response.status_code, response.reason, response.headers, None)
+        if response.status_code == 401:
+            raise AuthenticationError(cause=cause)
+        raise ResponseError(cause=cause)
+    return response.content
+
+
+registry.register('musicbrainz', _create_client)
+
+
+def get_musicbrainz():
+    return registry.get('musicbrainz')
+
+
+mb_limiter = TokenBucket(
+    'musicbrainz',
+    rate=1 / float(os.getenv('MUSICBRAINZ_INTERVAL_SECONDS', '1.1')),
+    capacity=1,
+)
+MB_MAX_RETRIES = 2
+
+
+# Every MusicBrainz request goes through here => musicbrainzngs.search_works(...) becomes mb_call(get_musicbrainz().search_works, ...)
+def mb_call(fn, *args, priority: int = PRIORITY_RECOMMEND, **kwargs):
+    musicbrainzngs = get_musicbrainz()
+    for attempt in range(MB_MAX_RETRIES + 1):
+        mb_limiter.acquire(priority)
+        try:
+            return fn(*args, **kwargs)
+        except musicbrainzngs.ResponseError as e:
+            # 503 => we are being rate limited, back off before the next request
+            code = getattr(e.cause, 'code', None)
+            if code != 503 or attempt == MB_MAX_RETRIES:
+                mb_limiter.record_failure()
+                raise
+
+            logger.warning('MusicBrainz rate limited. Backing off for %ss', 2 ** attempt)
+            mb_limiter.throttle(2 ** attempt)
+            mb_limiter.record_retry()
@@ -0,0 +1,161 @@
+import logging
+import os
+from collections import Counter, defaultdict
+from sqlmodel import Session, select, delete
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Scrobble, TrackTransition
+from app.services.collab import track_key
+
+logger = logging.getLogger(__name__)
+
+# Next track model => what people play right after a song, counted across every user's listening sessions
+NEXT_SESSION_GAP_MS = int(os.getenv('NEXT_SESSION_GAP_MINUTES', '30')) * 60 * 1000 # Longer pause => new session
+NEXT_MAX_SUCCESSORS = int(os.getenv('NEXT_MAX_SUCCESSORS', '30')) # Successors kept per track
+NEXT_MIN_COUNT = int(os.getenv('NEXT_MIN_COUNT', '2')) # Rebuilds drop transitions seen fewer times
+
+
+# Plays ordered by (user, timestamp) -> lists of consecutive plays with no long pause in between
+def split_sessions(plays, gap_ms: int = NEXT_SESSION_GAP_MS):
+    current = []
+    for play in plays:
+        if current and (play.user_id != current[-1].user_id or play.timestamp - current[-1].timestamp > gap_ms):
+            yield current
+            current = []
+        current.append(play)
+
+    if current:
+        yield current
+
+
+# Sessions -> {(from key, to key): count}, and the display info of every track seen
+def count_transitions(sessions):
+    counts = Counter()
+    info = {}
+
+    for plays in sessions:
+        keys = [track_key(p.title, p.artist) for p in plays]
+        for play, key in zip(plays, keys):
+            info.setdefault(key, play)
+
+        for prev, key in zip(keys, keys[1:]):
+            if prev != key: # Repeats say nothing about what comes next
+                counts[(prev, key)] += 1
+
+    return counts, info
+
+
+# Keep the top successors of each track => {from key: [(to key, count)]}, most played first
+def prune_transitions(counts: Counter, max_successors: int = NEXT_MAX_SUCCESSORS, min_count: int = 1):
+    successors = defaultdict(list)
+    for (prev, key), count in counts.items():
+        if count >= min_count:
+            successors[prev].append((key, count))
+
+    return {
+        prev: sorted(nexts, key=lambda x: x[1], reverse=True)[:max_successors]
+        for prev, nexts in successors.items()
+    }
+
+
+# Rebuild the whole table from the scrobble history
+def build_transitions(session: Session):
+    plays = session.exec(
+        select(Scrobble.user_id, Scrobble.timestamp, Scrobble.title, Scrobble.artist, Scrobble.image_url, Scrobble.spotify_id)
+        .order_by(Scrobble.user_id, Scrobble.timestamp)
+        .execution_options(yield_per=5000)
+    )
+    counts, info = count_transitions(split_sessions(plays))
+    successors = prune_transitions(counts, min_count=NEXT_MIN_COUNT)
+
+    session.exec(delete(TrackTransition))
+    for prev, nexts in successors.items():
+        for key, count in nexts:
+            track = info[key]
+            session.add(TrackTransition(
+                from_key=prev, to_key=key, count=count,
+                title=track.title, artist=track.artist, image_url=track.image_url, spotify_id=track.spotify_id,
+            ))
+    session.commit()
+
+    logger.info('Next track model: %s transitions for %s tracks', sum(len(n) for n in successors.values()), len(successors))
+    return successors
+
+
+# Increment in SQL => concurrent scrobbles of the same step don't overwrite each other's count
+def _increment_transition(session: Session, prev: str, key: str):
+    bumped = session.exec(
+        update(TrackTransition)
+        .where(TrackTransition.from_key == prev, TrackTransition.to_key == key)
+        .values(count=TrackTransition.count + 1)
+    )
+    session.commit()
+    return bumped.rowcount > 0
+
+
+# Called on ingest => count the step from the user's previous play (if it was the same session)
+def record_transition(session: Session, scrobble: Scrobble):
+    previous = session.exec(
+        select(Scrobble.title, Scrobble.artist, Scrobble.timestamp)
+        .where(Scrobble.user_id == scrobble.user_id)
+        .where(Scrobble.id != scrobble.id)
+        .where(Scrobble.timestamp <= scrobble.timestamp)
+        .order_by(Scrobble.timestamp.desc())
+        .limit(1)
+    ).first()
+
+    if not previous or scrobble.timestamp - previous.timestamp > NEXT_SESSION_GAP_MS:
+        return
+
+    prev, key = track_key(previous.title, previous.artist), track_key(scrobble.title, scrobble.artist)
+    if prev == key:
+        return
+
+    if _increment_transition(session, prev, key):
+        return
+
+    # Full => the rarest older successor makes room (new transitions still get a chance to grow)
+    successors = session.exec(
+        select(func.count(TrackTransition.id)).where(TrackTransition.from_key == prev)
+    ).one()
+    if successors >= NEXT_MAX_SUCCESSORS:
+        rarest = session.exec(
+            select(TrackTransition)
+            .where(TrackTransition.from_key == prev)
+            .order_by(TrackTransition.count, TrackTransition.id)
+            .limit(successors - NEXT_MAX_SUCCESSORS + 1)
+        ).all()
+        for row in rarest:
+            session.delete(row)
+
+    session.add(TrackTransition(
+        from_key=prev, to_key=key, title=scrobble.title, artist=scrobble.artist,
+        image_url=scrobble.image_url, spotify_id=scrobble.spotify_id,
+    ))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback() # Same transition recorded by another request at the same time => count this play on its row
+        _increment_transition(session, prev, key)
+
+
+# Most common follow-ups of a track
+def get_next_tracks(session: Session, title: str, artist: str, limit: int = 10):
+    rows = session.exec(
+        select(TrackTransition)
+        .where(TrackTransition.from_key == track_key(title, artist))
+        .order_by(TrackTransition.count.desc())
+        .limit(limit)
+    ).all()
+
+    return [
+        {
+            "title": row.title,
+            "artist": row.artist,
+            "image_url": row.image_url or "",
+            "spotify_url": f"https://open.spotify.com/track/{row.spotify_id}" if row.spotify_id else "",
+            "reason": f"Often played after {title}",
+        }
+        for row in rows
+    ]
@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from sqlmodel import Session, select
+from sqlalchemy import func
+
+from app.database import engine
+from app.models import User, Scrobble
+from app.services.ai_recs import GEMINI_BATCH_SIZE, get_seed_pools
+from app.services.collab import build_neighbors
+from app.services.credits import get_seed_credits
+from app.services.embeddings import build_embeddings
+from app.services.http_pool import CallMeter, metered_calls
+from app.services.next_track import build_transitions
+from app.services.rate_limiter import PRIORITY_RECOMMEND
+from app.services.rec_cache import drop_cache, read_cache
+from app.services.samples import get_seed_samples
+from app.services.stats_service import get_user_top_tracks
+
+logger = logging.getLogger(__name__)
+
+# Warm recommendation caches for recently active users, so opening the page is a cache hit
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+PREFETCH_INTERVAL_MINUTES = int(os.getenv('PREFETCH_INTERVAL_MINUTES', '60'))
+PREFETCH_HOURS = os.getenv('PREFETCH_HOURS', '1-6') # Off-peak window in UTC hours (start-end), empty => any time
+PREFETCH_ACTIVE_DAYS = int(os.getenv('PREFETCH_ACTIVE_DAYS', '7'))
+PREFETCH_MAX_USERS = int(os.getenv('PREFETCH_MAX_USERS', '200'))
+
+# Max external requests per off-peak window, counted at the transport (retries and every page of a crawl included)
+PREFETCH_BUDGET = {
+    'gemini': int(os.getenv('PREFETCH_BUDGET_GEMINI', '50')),
+    'spotify': int(os.getenv('PREFETCH_BUDGET_SPOTIFY', '1000')),
+    'genius': int(os.getenv('PREFETCH_BUDGET_GENIUS', '50')),
+    'musicbrainz': int(os.getenv('PREFETCH_BUDGET_MUSICBRAINZ', '500')),
+}
+
+# Services a warmer calls => a batch only starts while all of them have calls left
+WARM_SERVICES = {
+    'vibes': ('gemini', 'spotify'),
+    'lyrics': ('gemini', 'genius', 'spotify'),
+    'credits': ('musicbrainz', 'spotify'),
+    'samples': ('genius', 'spotify'),
+}
+
+# Seeds warmed together
+WARM_BATCH_SIZES = {
+    'vibes': GEMINI_BATCH_SIZE,
+    'lyrics': GEMINI_BATCH_SIZE,
+}
+
+
+def _warm_vibes(session: Session, seeds: list):
+    get_seed_pools(session, seeds, 'vibes', priority=PRIORITY_RECOMMEND)
+
+
+def _warm_lyrics(session: Session, seeds: list):
+    get_seed_pools(session, seeds, 'lyrics', priority=PRIORITY_RECOMMEND)
+
+
+def _warm_credits(session: Session, seeds: list):
+    for title, artist in seeds:
+        get_seed_credits(session, title, artist, priority=PRIORITY_RECOMMEND)
+
+
+def _warm_samples(session: Session, seeds: list):
+    for title, artist in seeds:
+        get_seed_samples(session, title, artist, priority=PRIORITY_RECOMMEND)
+
+
+WARMERS = {
+    'vibes': _warm_vibes,
+    'lyrics': _warm_lyrics,
+    'credits': _warm_credits,
+    'samples': _warm_samples,
+}
+
+
+def in_prefetch_window(now: datetime = None):
+    if not PREFETCH_HOURS:
+        return True
+
+    now = now or datetime.now(timezone.utc)
+    start, end = (int(h) for h in PREFETCH_HOURS.split('-'))
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end # Window wraps past midnight
+
+
+# The off-peak window a time falls in, named by the day it opened (no window => one per day)
+def prefetch_window_key(now: datetime = None):
+    now = now or datetime.now(timezone.utc)
+    if PREFETCH_HOURS:
+        start, end = (int(h) for h in PREFETCH_HOURS.split('-'))
+        if start > end and now.hour < end:
+            return (now - timedelta(days=1)).date()
+    return now.date()
+
+
+# Users who scrobbled recently, most recent first
+def get_active_users(session: Session, days: int = PREFETCH_ACTIVE_DAYS, limit: int = PREFETCH_MAX_USERS):
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    user_ids = session.exec(
+        select(Scrobble.user_id)
+        .where(Scrobble.created_at >= since)
+        .group_by(Scrobble.user_id)
+        .order_by(func.max(Scrobble.created_at).desc())
+        .limit(limit)
+    ).all()
+
+    if not user_ids:
+        return []
+    return session.exec(select(User).where(User.id.in_(user_ids))).all()
+
+
+def run_prefetch(budget: CallMeter = None):
+    budget = budget or CallMeter(PREFETCH_BUDGET)
+    warmed = {rec_type: 0 for rec_type in WARMERS}
+    skipped = 0
+
+    with Session(engine) as session:
+        # Seeds are shared between users, warm each once
+        seeds = []
+        for user in get_active_users(session):
+            for track in get_user_top_tracks(session, user, limit=5):
+                seed = (track.title, track.artist)
+                if seed not in seeds:
+                    seeds.append(seed)
+
+        logger.info('Prefetch: %s seeds', len(seeds))
+
+        for rec_type, warm in WARMERS.items():
+            # Already fresh => nothing to do
+            pending = [seed for seed in seeds if read_cache(session, *seed, rec_type) is None]
+            skipped += len(seeds) - len(pending)
+
+            batch_size = WARM_BATCH_SIZES.get(rec_type, 1)
+            for i in range(0, len(pending), batch_size):
+                if not budget.has_calls(WARM_SERVICES[rec_type]):
+                    break
+
+                batch = pending[i:i + batch_size]
+                refused = set(budget.refused)
+                try:
+                    with metered_calls(budget):
+                        warm(session, batch)
+                    done = True
+                except Exception as e:
+                    logger.warning('Prefetch %s failed for %s: %s', rec_type, batch[0][0], e)
+                    session.rollback()
+                    done = False
+
+                # Calls were refused mid batch => its pools may be partial, they are rebuilt on demand instead
+                if budget.refused - refused:
+                    for seed in batch:
+                        drop_cache(session, *seed, rec_type)
+                elif done:
+                    warmed[rec_type] += len(batch)
+
+    logger.info('Prefetch done: warmed %s, %s already fresh, budget left %s', warmed, skipped, budget.remaining)
+    return warmed
+
+
+# Offline models are rebuilt off-peak (ingest only updates what was played)
+def build_offline_models():
+    with Session(engine) as session:
+        build_neighbors(session)
+        build_transitions(session)
+        build_embeddings(session)
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _loop():
+    # One call budget and one model rebuild per window, however many passes fit in it
+    window, budget, models_window = None, None, None
+
+    while not _stop.wait(PREFETCH_INTERVAL_MINUTES * 60):
+        if not in_prefetch_window():
+            continue
+
+        key = prefetch_window_key()
+        if key != window:
+            window, budget = key, CallMeter(PREFETCH_BUDGET)
+        try:
+            run_prefetch(budget)
+        except Exception as e:
+            logger.exception('Prefetch error: %s', e)
+
+        if models_window == window:
+            continue
+        try:
+            build_offline_models()
+            models_window = window
+        except Exception as e:
+            logger.exception('Offline model error: %s', e)
+
+
+def start_prefetch_scheduler():
+    global _thread
+    if not PREFETCH_ENABLED or _thread is not None:
+        return
+
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name='prefetch', daemon=True)
+    _thread.start()
+
+
+def stop_prefetch_scheduler():
+    global _thread
+    _stop.set()
+    _thread = None
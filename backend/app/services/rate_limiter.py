@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Priority classes (lower number is served first)
+PRIORITY_INGEST = 0 # Scrobble enrichment, user is waiting on the save
+PRIORITY_INTERACTIVE = 1 # Single lookups for the UI (album art)
+PRIORITY_RECOMMEND = 2 # Candidate scans for the recommenders
+
+PRIORITY_NAMES = {
+    PRIORITY_INGEST: 'ingest',
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_RECOMMEND: 'recommend',
+}
+
+
+# Process wide token bucket => Every thread calling an external API waits here for its turn
+class TokenBucket:
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self.rate = rate # Tokens added per second
+        self.capacity = capacity # Max burst size
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0 # Set when the API tells us to back off (Retry-After)
+
+        self._cond = threading.Condition()
+        self._waiters = [] # Heap of (priority, seq) tickets
+        self._seq = itertools.count()
+
+        # Metrics
+        self._stats = {
+            name: {'calls': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self._throttles = 0
+        self._retries = 0
+        self._failures = 0
+
+    def _refill(self, now: float):
+        # No tokens accumulate while backing off, so the end of a Retry-After is not a burst
+        start = max(self._updated, self._blocked_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+            self._updated = now
+
+    # Block until a token is available and every higher priority caller has been served
+    def acquire(self, priority: int = PRIORITY_RECOMMEND):
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if self._waiters[0] == ticket:
+                    if now >= self._blocked_until and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        break
+
+                    # Head of the queue sleeps until the next token (or the end of the back off)
+                    timeout = max(self._blocked_until - now, (1 - self._tokens) / self.rate, 0.001)
+                else:
+                    timeout = None # Wait for the head to be served
+
+                self._cond.wait(timeout)
+
+            # Wake the next caller in line
+            self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            stats = self._stats[PRIORITY_NAMES.get(priority, 'recommend')]
+            stats['calls'] += 1
+            stats['wait_seconds'] += waited
+            stats['max_wait_seconds'] = max(stats['max_wait_seconds'], waited)
+
+    # Pause the whole bucket after a 429
+    def throttle(self, seconds: float):
+        with self._cond:
+            self._throttles += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._cond.notify_all()
+
+    def record_retry(self):
+        with self._cond:
+            self._retries += 1
+
+    def record_failure(self):
+        with self._cond:
+            self._failures += 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(self._tokens, 2),
+                'queued': len(self._waiters),
+                'throttles': self._throttles,
+                'retries': self._retries,
+                'failures': self._failures,
+                'priorities': {
+                    name: {
+                        'calls': s['calls'],
+                        'wait_seconds': round(s['wait_seconds'], 4),
+                        'avg_wait_seconds': round(s['wait_seconds'] / s['calls'], 4) if s['calls'] else 0.0,
+                        'max_wait_seconds': round(s['max_wait_seconds'], 4),
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
+
+
+# Parse the Retry-After header (seconds), falling back to a default
+def parse_retry_after(headers, default: float = 1.0) -> float:
+    if not headers:
+        return default
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,73 @@
+import json
+import logging
+from datetime import datetime, timezone
+from sqlmodel import Session, select
+
+from app.models import AICache
+from app.services.metrics import observe_ai_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_DAYS = 7
+
+
+def get_cache_age(cached_at: datetime):
+    if cached_at.tzinfo is None:
+        cached_at = cached_at.replace(tzinfo=timezone.utc)
+
+    now = datetime.now(timezone.utc)
+    return now - cached_at
+
+
+# Returns the cached recs for a seed, or None if missing/expired (expired entries are deleted)
+def read_cache(session: Session, title: str, artist: str, rec_type: str):
+    cache_query = select(AICache).where(
+        AICache.seed_title == title,
+        AICache.seed_artist == artist,
+        AICache.rec_type == rec_type
+    )
+    cached_entry = session.exec(cache_query).first()
+
+    if not cached_entry:
+        observe_ai_cache(rec_type, 'miss')
+        return None
+
+    if get_cache_age(cached_entry.created_at).days < CACHE_TTL_DAYS:
+        observe_ai_cache(rec_type, 'hit')
+        return json.loads(cached_entry.data_json)
+
+    observe_ai_cache(rec_type, 'expired')
+    logger.debug('Cache expired for %s (%s). Regenerating', title, rec_type)
+    session.delete(cached_entry)
+    session.commit()
+    return None
+
+
+# Replace the cached recs for a seed
+def save_cache(session: Session, title: str, artist: str, rec_type: str, data):
+    old_entries = session.exec(select(AICache).where(
+        AICache.seed_title == title,
+        AICache.seed_artist == artist,
+        AICache.rec_type == rec_type
+    )).all()
+    for entry in old_entries:
+        session.delete(entry)
+
+    session.add(AICache(
+        seed_title=title,
+        seed_artist=artist,
+        rec_type=rec_type,
+        data_json=json.dumps(data)
+    ))
+    session.commit()
+
+
+# Forget the cached recs for a seed (e.g. a pool built while some calls were refused)
+def drop_cache(session: Session, title: str, artist: str, rec_type: str):
+    for entry in session.exec(select(AICache).where(
+        AICache.seed_title == title,
+        AICache.seed_artist == artist,
+        AICache.rec_type == rec_type
+    )).all():
+        session.delete(entry)
+    session.commit()
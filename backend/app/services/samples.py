@@ -0,0 +1,222 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from cachetools import TTLCache
+from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import engine
+from app.models import GeniusSearch, GeniusRelations
+from app.services.ai_recs import verify_song
+from app.services.genius import get_genius
+from app.services.known_tracks import KnownTracks, normalize_track
+from app.services.rate_limiter import PRIORITY_RECOMMEND
+from app.services.rec_cache import get_cache_age, read_cache, save_cache
+
+logger = logging.getLogger(__name__)
+
+GENIUS_TTL = timedelta(days=int(os.getenv('GENIUS_TTL_DAYS', '30')))
+GENIUS_NOT_FOUND_TTL = timedelta(days=int(os.getenv('GENIUS_NOT_FOUND_TTL_DAYS', '7')))
+
+SAMPLES_POOL_SIZE = 8 # Verified songs kept per seed
+SAMPLES_DEADLINE_SECONDS = float(os.getenv('SAMPLES_DEADLINE_SECONDS', '20'))
+
+# Final recs per user => repeat visits skip the top tracks query and the seed reads
+# Dropped on the user's next scrobble or history delete, only answers with every seed resolved are kept
+SAMPLES_RESULT_CACHE_USERS = int(os.getenv('SAMPLES_RESULT_CACHE_USERS', '2000'))
+SAMPLES_RESULT_TTL_SECONDS = int(os.getenv('SAMPLES_RESULT_TTL_SECONDS', '3600'))
+
+_results = TTLCache(maxsize=SAMPLES_RESULT_CACHE_USERS, ttl=SAMPLES_RESULT_TTL_SECONDS)
+_results_lock = threading.Lock()
+
+# Uncached seeds are resolved in parallel, bounded so one user can't flood Genius
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SAMPLES_WORKERS', '4')),
+    thread_name_prefix='samples',
+)
+
+
+# (title, artist) -> Genius song id
+def find_genius_id(session: Session, title: str, artist: str):
+    title_key, artist_key = normalize_track(title, artist)
+
+    cached = session.exec(select(GeniusSearch).where(
+        GeniusSearch.title_key == title_key,
+        GeniusSearch.artist_key == artist_key,
+    )).first()
+
+    if cached:
+        ttl = GENIUS_TTL if cached.genius_id else GENIUS_NOT_FOUND_TTL
+        if get_cache_age(cached.fetched_at) < ttl:
+            return cached.genius_id
+
+    result = get_genius().search_songs(f'{title} {artist}') # Get metadata of the song
+
+    genius_id = None
+    if result and result.get('hits'):
+        # Get ID of the first search match
+        genius_id = result['hits'][0]['result']['id']
+        logger.debug('Found genius id: %s', genius_id)
+
+    # Expired => refresh the row in place, (title_key, artist_key) is unique
+    entry = cached or GeniusSearch(title_key=title_key, artist_key=artist_key)
+    entry.genius_id = genius_id
+    entry.fetched_at = datetime.now(timezone.utc)
+    session.add(entry)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback() # Same search saved by another seed worker at the same time
+    return genius_id
+
+
+# Genius song id -> songs it samples / is sampled by
+def get_sample_relations(session: Session, genius_id: int):
+    cached = session.get(GeniusRelations, genius_id)
+    if cached and get_cache_age(cached.fetched_at) < GENIUS_TTL:
+        return json.loads(cached.relations_json)
+
+    # Fetch full song data of the speicific id
+    song_data = get_genius().song(genius_id)['song']
+
+    # Get song realtionships (returns dict of samples, sampled_in, remixes and covers)
+    candidates = []
+    for relation in song_data.get('song_relationships', []):
+        rel_type = relation['type']
+        if rel_type not in ['samples', 'sampled_by']:
+            continue
+
+        for rel_song in relation['songs']:
+            # Extract artist name
+            rel_artist = rel_song.get('artist_names')
+            if not rel_artist and 'primary_artist' in rel_song:
+                rel_artist = rel_song['primary_artist']['name']
+
+            candidates.append({'title': rel_song['title'], 'artist': rel_artist or '', 'type': rel_type})
+
+    entry = cached or GeniusRelations(genius_id=genius_id)
+    entry.relations_json = json.dumps(candidates)
+    entry.fetched_at = datetime.now(timezone.utc)
+    session.add(entry)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback() # Another seed resolved to the same song at the same time
+    return candidates
+
+
+# Genius relations of one seed verified on Spotify
+def build_samples_pool(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND):
+    logger.debug('Checking samples for %s - %s', title, artist)
+
+    genius_id = find_genius_id(session, title, artist)
+    if not genius_id:
+        return []
+
+    candidates = get_sample_relations(session, genius_id)
+    logger.debug('Found %s sample connections', len(candidates))
+
+    pool = []
+    for item in candidates:
+        if len(pool) >= SAMPLES_POOL_SIZE: break
+
+        if item['title'].lower() == title.lower(): continue
+        if item['artist'] and item['artist'].lower() in artist.lower(): continue # Skips remixes by same artist (unknown artist => kept)
+
+        if item['type'] == 'samples':
+            reason = f'Sampled in {title}' # Ancestor
+        else:
+            reason = f'Samples from {title}' # Descendant
+
+        rec = verify_song(item, reason, priority=priority)
+        if rec:
+            pool.append(rec)
+            logger.debug('Match found: %s - %s', item['title'], item['artist'])
+        else:
+            logger.debug('Not found on spotify')
+
+    return pool
+
+
+# Cached per seed for everyone, like the vibes/lyrics/credits pools
+def get_seed_samples(session: Session, title: str, artist: str, priority: int = PRIORITY_RECOMMEND):
+    pool = read_cache(session, title, artist, 'samples')
+    if pool is not None:
+        return pool
+
+    try:
+        pool = build_samples_pool(session, title, artist, priority=priority)
+    except Exception as e:
+        logger.warning('Genius error for %s: %s', title, e)
+        session.rollback()
+        return None # Not cached, try again next time
+
+    save_cache(session, title, artist, 'samples', pool)
+    return pool
+
+
+def _resolve_seed(title: str, artist: str):
+    with Session(engine) as session:
+        return get_seed_samples(session, title, artist)
+
+
+def get_cached_samples(user_id: int):
+    with _results_lock:
+        return _results.get(user_id)
+
+
+def invalidate_samples(user_id: int):
+    with _results_lock:
+        _results.pop(user_id, None)
+
+
+# Sample recs for a user's top tracks => cached seeds first, missing ones resolved in parallel until the deadline
+def get_samples_recommendations(session: Session, user_id: int, top_tracks: list, known_songs: KnownTracks, limit: int = 5):
+    seeds = [(t.title, t.artist) for t in top_tracks]
+    pools = {seed: read_cache(session, *seed, 'samples') for seed in seeds}
+
+    def collect():
+        recommendations = []
+        seen_songs = {title.lower() for title, _ in seeds}
+
+        for seed in seeds:
+            pool = list(pools.get(seed) or [])
+            random.shuffle(pool)
+
+            for rec in pool:
+                if len(recommendations) >= limit: return recommendations
+                if rec['title'].lower() in seen_songs: continue
+                if (rec['title'], rec['artist']) in known_songs: continue
+
+                recommendations.append(rec)
+                seen_songs.add(rec['title'].lower())
+
+        return recommendations
+
+    def finish(recommendations):
+        # Full, or every seed resolved => final. Seeds still resolving may add more on the next visit
+        if all(pools[seed] is not None for seed in seeds) or len(recommendations) >= limit:
+            with _results_lock:
+                _results[user_id] = recommendations
+        return recommendations
+
+    recommendations = collect()
+    missing = [seed for seed in seeds if pools[seed] is None]
+    if len(recommendations) >= limit or not missing:
+        return finish(recommendations)
+
+    futures = {executor.submit(contextvars.copy_context().run, _resolve_seed, *seed): seed for seed in missing}
+    done, not_done = wait(futures, timeout=SAMPLES_DEADLINE_SECONDS)
+    if not_done:
+        # They keep running and fill the cache for next time
+        logger.info('Samples deadline hit, %s seeds still resolving', len(not_done))
+
+    for future in done:
+        pools[futures[future]] = future.result()
+
+    return finish(collect())
@@ -1,53 +1,132 @@
-import os
-from dotenv import load_dotenv
-
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-
-load_dotenv()
-
-# Create spotify client
-sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-    client_id= os.getenv("SPOTIPY_CLIENT_ID"),
-    client_secret= os.getenv("SPOTIPY_CLIENT_SECRET"),
-))
-
-# Documentation : https://developer.spotify.com/documentation/web-api
-def enrich_data(title: str, artist: str):
-    print(f"Searching Spotify for {title} - {artist}")
-
-    try:
-        # Search for the track on spotify
-        query = f"track:{title} artist:{artist}" # Spotify query
-        results = sp.search(q=query, type="track", limit=1) # Returns track type dictonary with top search
-
-        items = results["tracks"]["items"]
-
-        # Return empty dictionary if song is not found (ie; items contains nothing)
-        if not items:
-            print("Song not found on Spotify")
-            return {}
-        
-        track = items[0] # Gets the first and only dict in items list
-        t_id = track["id"] # Stores spotify id of the track
-
-
-        artist_id = track["artists"][0]["id"]
-        artist_info = sp.artist(artist_id)
-        artist_image = artist_info["images"][0]["url"]
-        genre_list = artist_info["genres"] # Returns a list of genres
-
-        return {
-            "spotify_id": t_id,
-            "duration_ms": track['duration_ms'],
-            "image_url": track["album"]["images"][0]["url"],
-            "artist_image": artist_image,
-            "tempo": None, # features["tempo"],
-            "valence": None, # features["valence"],
-            "energy": None, # features["energy"],
-            "genres": ", ".join(genre_list) # Convert list to string
-        }
-
-    except Exception as e:
-        print(f"Error talking to Spotify: {e}")
-        return {}
+import logging
+import os
+from dotenv import load_dotenv
+
+from app.services.clients import registry, close_requests_session
+from app.services.http_pool import pooled_session
+from app.services.rate_limiter import TokenBucket, PRIORITY_INGEST, PRIORITY_RECOMMEND, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+# Create spotify client (on first use)
+# The session only retries 5xx => a real 429 reaches spotify_call with its Retry-After (urllib3 would sleep outside our limiter)
+# When those 5xx retries run out spotipy raises a 429 too, without headers => spotify_call treats that one as an upstream error
+def _create_client():
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    from urllib3.util.retry import Retry
+
+    # Same retries spotipy sets up on its own session, but 5xx only
+    # urllib3 also retries a 429 with Retry-After by default => turned off, 429s must reach spotify_call
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False,
+    )
+
+    return spotipy.Spotify(
+        auth_manager=SpotifyClientCredentials(
+            client_id= os.getenv("SPOTIPY_CLIENT_ID"),
+            client_secret= os.getenv("SPOTIPY_CLIENT_SECRET"),
+            requests_session=pooled_session('spotify-auth'),
+        ),
+        requests_session=pooled_session('spotify', max_retries=retry),
+    )
+
+
+def _close_client(sp):
+    close_requests_session(sp)
+    close_requests_session(sp.auth_manager) # Token requests use their own session
+
+
+registry.register('spotify', _create_client, close=_close_client, env=('SPOTIPY_CLIENT_ID', 'SPOTIPY_CLIENT_SECRET'))
+
+
+def get_spotify():
+    return registry.get('spotify')
+
+# Shared by ingestion, the image endpoint and all recommenders
+spotify_limiter = TokenBucket(
+    'spotify',
+    rate=float(os.getenv('SPOTIFY_RATE_PER_SECOND', '5')),
+    capacity=float(os.getenv('SPOTIFY_BURST', '10')),
+)
+SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', '3'))
+
+
+# spotipy reports exhausted 5xx retries as a 429 ("Max Retries", no response) => only a real response is a rate limit
+def _is_rate_limit(e):
+    return e.http_status == 429 and bool(e.headers) and 'Max Retries' not in str(e.msg)
+
+
+# Every Spotify request goes through here => sp.search(...) becomes spotify_call(get_spotify().search, ...)
+def spotify_call(fn, *args, priority: int = PRIORITY_RECOMMEND, **kwargs):
+    from spotipy.exceptions import SpotifyException # Already imported by the client that made fn
+
+    for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+        spotify_limiter.acquire(priority)
+        try:
+            return fn(*args, **kwargs)
+        except SpotifyException as e:
+            if not _is_rate_limit(e):
+                spotify_limiter.record_failure()
+                raise
+
+            # Rate limited => pause every caller for Retry-After seconds, then try again
+            wait = parse_retry_after(e.headers, default=2 ** attempt)
+            logger.warning('Spotify rate limited. Backing off for %ss', wait)
+            spotify_limiter.throttle(wait)
+
+            if attempt == SPOTIFY_MAX_RETRIES:
+                spotify_limiter.record_failure()
+                raise
+            spotify_limiter.record_retry()
+
+# Documentation : https://developer.spotify.com/documentation/web-api
+def enrich_data(title: str, artist: str, priority: int = PRIORITY_INGEST):
+    logger.debug('Searching Spotify for %s - %s', title, artist)
+
+    try:
+        # Search for the track on spotify
+        query = f"track:{title} artist:{artist}" # Spotify query
+        results = spotify_call(get_spotify().search, q=query, type="track", limit=1, priority=priority) # Returns track type dictonary with top search
+
+        items = results["tracks"]["items"]
+
+        # Return empty dictionary if song is not found (ie; items contains nothing)
+        if not items:
+            logger.debug('Song not found on Spotify')
+            return {}
+        
+        track = items[0] # Gets the first and only dict in items list
+        t_id = track["id"] # Stores spotify id of the track
+
+
+        artist_id = track["artists"][0]["id"]
+        artist_info = spotify_call(get_spotify().artist, artist_id, priority=priority)
+        artist_image = artist_info["images"][0]["url"]
+        genre_list = artist_info["genres"] # Returns a list of genres
+
+        return {
+            "spotify_id": t_id,
+            "duration_ms": track['duration_ms'],
+            "image_url": track["album"]["images"][0]["url"],
+            "artist_image": artist_image,
+            "tempo": None, # features["tempo"],
+            "valence": None, # features["valence"],
+            "energy": None, # features["energy"],
+            "genres": ", ".join(genre_list) # Convert list to string
+        }
+
+    except Exception as e:
+        logger.error('Error talking to Spotify: %s', e)
+        return {}
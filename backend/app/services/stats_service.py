@@ -1,29 +1,68 @@
-from datetime import datetime, timezone, timedelta
-from sqlmodel import SQLModel, Session, select
-from sqlalchemy import func, extract, BigInteger
-
-from app.models import User, Scrobble
-
-def get_user_top_tracks(session: Session, user: User, limit: int = 5):
-    now = datetime.now(timezone.utc)
-    start_date = None
-
-    # If period is only present month, start date is 1st of this month
-    if user.rec_period == 0:
-        start_date = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
-    # Else start date is X months ago
-    else:
-        start_date = now - timedelta(days=user.rec_period * 30)
-
-    print(f"Filtering recommendations from: {start_date}")
-
-    query = (
-        select(Scrobble.title, Scrobble.artist)
-        .where(Scrobble.user_id == user.id)
-        .where(Scrobble.created_at >= start_date)
-        .group_by(Scrobble.title, Scrobble.artist)
-        .order_by(func.count(Scrobble.id).desc())
-        .limit(limit)
-    )
-
-    return session.exec(query).all()
\ No newline at end of file
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+from cachetools import TTLCache
+from sqlmodel import SQLModel, Session, select
+from sqlalchemy import func, extract, BigInteger
+
+from app.models import User, Scrobble
+
+logger = logging.getLogger(__name__)
+
+# Top tracks per (user, rec_period) => every recommendation starts here, so cache hits skip the Scrobble table
+# Dropped on new scrobbles, preference changes and history deletes, the TTL only covers the period window moving
+TOP_TRACKS_CACHE_SIZE = int(os.getenv('TOP_TRACKS_CACHE_USERS', '2000'))
+TOP_TRACKS_TTL_SECONDS = int(os.getenv('TOP_TRACKS_TTL_SECONDS', '3600'))
+TOP_TRACKS_CACHED = 10 # Longest list callers ask for, shorter ones are slices
+
+TopTrack = namedtuple('TopTrack', 'title artist')
+
+_top_tracks = TTLCache(maxsize=TOP_TRACKS_CACHE_SIZE, ttl=TOP_TRACKS_TTL_SECONDS)
+_top_tracks_lock = threading.Lock()
+
+
+def invalidate_top_tracks(user_id: int):
+    with _top_tracks_lock:
+        for key in [key for key in _top_tracks if key[0] == user_id]:
+            del _top_tracks[key]
+
+
+def get_user_top_tracks(session: Session, user: User, limit: int = 5):
+    key = (user.id, user.rec_period)
+    with _top_tracks_lock:
+        cached = _top_tracks.get(key)
+    if cached is not None and limit <= TOP_TRACKS_CACHED:
+        return cached[:limit]
+
+    top_tracks = _query_top_tracks(session, user, max(limit, TOP_TRACKS_CACHED))
+
+    with _top_tracks_lock:
+        _top_tracks[key] = top_tracks
+    return top_tracks[:limit]
+
+
+def _query_top_tracks(session: Session, user: User, limit: int):
+    now = datetime.now(timezone.utc)
+    start_date = None
+
+    # If period is only present month, start date is 1st of this month
+    if user.rec_period == 0:
+        start_date = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    # Else start date is X months ago
+    else:
+        start_date = now - timedelta(days=user.rec_period * 30)
+
+    logger.debug('Filtering recommendations from: %s', start_date)
+
+    query = (
+        select(Scrobble.title, Scrobble.artist)
+        .where(Scrobble.user_id == user.id)
+        .where(Scrobble.created_at >= start_date)
+        .group_by(Scrobble.title, Scrobble.artist)
+        .order_by(func.count(Scrobble.id).desc())
+        .limit(limit)
+    )
+
+    return [TopTrack(title, artist) for title, artist in session.exec(query).all()]
\ No newline at end of file
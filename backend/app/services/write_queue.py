@@ -0,0 +1,159 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from sqlmodel import Session
+
+from app.database import engine, is_sqlite
+
+logger = logging.getLogger(__name__)
+
+# SQLite allows one writer at a time => concurrent commits from request threads queue up on the file lock
+# Writes are handed to a single writer thread instead, which commits whatever is waiting as one transaction
+# auto => on for SQLite, off for Postgres (which handles concurrent writers itself)
+WRITE_QUEUE_MODE = os.getenv('DB_WRITE_QUEUE', 'auto').lower()
+WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '200'))
+WRITE_BATCH_WAIT_MS = float(os.getenv('DB_WRITE_BATCH_WAIT_MS', '5')) # How long a batch waits for company
+
+_queue = queue.Queue()
+_thread = None
+_lock = threading.Lock()
+_stats = {'batches': 0, 'writes': 0, 'failed': 0, 'largest_batch': 0}
+
+_STOP = object()
+
+
+class WriteItem:
+    def __init__(self, write, after_commit=None):
+        self.write = write # fn(session) -> result, must not commit
+        self.after_commit = after_commit # fn(session, result), for follow up writes that commit themselves
+        self.future = Future()
+
+
+def write_queue_enabled():
+    if WRITE_QUEUE_MODE == 'auto':
+        return is_sqlite
+    return WRITE_QUEUE_MODE in ('1', 'true', 'yes', 'on')
+
+
+def _next_batch():
+    first = _queue.get()
+    if first is _STOP:
+        return None
+
+    batch = [first]
+    deadline = time.monotonic() + WRITE_BATCH_WAIT_MS / 1000
+    while len(batch) < WRITE_BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        try:
+            item = _queue.get(timeout=timeout) if timeout > 0 else _queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is _STOP:
+            _queue.put(_STOP) # Finish this batch first, stop on the next one
+            break
+        batch.append(item)
+    return batch
+
+
+# A caller that gave up (cancelled await) leaves a cancelled future behind => nothing left to tell it
+def _resolve(future: Future, result=None, error: Exception = None):
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+# One transaction for the whole batch, or one per item if any of them fails (so one bad write can't sink the rest)
+def _commit_batch(session: Session, batch):
+    try:
+        results = [item.write(session) for item in batch]
+        session.commit()
+        return list(zip(batch, results))
+    except Exception:
+        session.rollback()
+
+    done = []
+    for item in batch:
+        try:
+            result = item.write(session)
+            session.commit()
+            done.append((item, result))
+        except Exception as e:
+            session.rollback()
+            _stats['failed'] += 1
+            _resolve(item.future, error=e)
+    return done
+
+
+def _write_batch(batch):
+    with Session(engine, expire_on_commit=False) as session:
+        done = _commit_batch(session, batch)
+
+        for item, result in done:
+            if item.after_commit is not None:
+                try:
+                    item.after_commit(session, result)
+                except Exception as e:
+                    session.rollback()
+                    logger.exception('Write queue follow up failed: %s', e)
+            _resolve(item.future, result)
+
+
+def _writer():
+    while True:
+        batch = _next_batch()
+        if batch is None:
+            return
+
+        try:
+            _write_batch(batch)
+        except Exception as e:
+            # Session / connection setup or close failed => every caller still waiting gets the error, the writer keeps going
+            logger.exception('Write queue batch failed: %s', e)
+            for item in batch:
+                if not item.future.done():
+                    _stats['failed'] += 1
+                    _resolve(item.future, error=e)
+
+        _stats['batches'] += 1
+        _stats['writes'] += len(batch)
+        _stats['largest_batch'] = max(_stats['largest_batch'], len(batch))
+
+
+def _ensure_writer():
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_writer, name='db-writer', daemon=True)
+            _thread.start()
+
+
+# Queue a write => Future with write(session)'s result once it is committed
+# Async callers: await asyncio.wrap_future(submit_write(...))
+def submit_write(write, after_commit=None):
+    _ensure_writer()
+    item = WriteItem(write, after_commit)
+    _queue.put(item)
+    return item.future
+
+
+# Shutdown => commit what is already queued, then stop the writer
+def stop_write_queue(timeout: float = 10):
+    global _thread
+    with _lock:
+        thread, _thread = _thread, None
+    if thread is None:
+        return
+
+    _queue.put(_STOP)
+    thread.join(timeout)
+
+
+def write_queue_stats():
+    return {**_stats, 'pending': _queue.qsize(), 'enabled': write_queue_enabled()}
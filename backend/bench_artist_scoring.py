@@ -0,0 +1,73 @@
+import random
+import time
+
+from app.services.genre_scoring import encode_genres, rank_candidates
+
+# Benchmark => vectorized genre scoring vs the old set intersection / substring loop
+# Run from backend/: python bench_artist_scoring.py
+
+GENRE_WORDS = ['pop', 'rock', 'indie', 'hip hop', 'rap', 'soul', 'r&b', 'jazz', 'lo-fi', 'house', 'techno', 'metal', 'folk', 'punk', 'k-pop', 'bollywood']
+PREFIXES = ['', 'alt ', 'dark ', 'dream ', 'uk ', 'modern ', 'desi ', 'bedroom ', 'neo ', 'art ']
+
+
+def random_genre():
+    return random.choice(PREFIXES) + random.choice(GENRE_WORDS)
+
+
+def make_candidates(n):
+    return [
+        {'id': str(i), 'name': f'Artist {i}', 'genres': list({random_genre() for _ in range(random.randint(1, 4))})}
+        for i in range(n)
+    ]
+
+
+# The scoring loop get_artist_recommendations used before
+def loop_scoring(candidates, top_genres):
+    scored_artists = []
+    user_genre_set = set(top_genres)
+
+    for artist_obj in candidates:
+        cand_genres = set(artist_obj['genres'])
+        overlap = list(cand_genres.intersection(user_genre_set))
+        score = len(overlap)
+
+        if score == 0:
+            overlap = []
+            for user_genre in user_genre_set:
+                for cand_genre in cand_genres:
+                    if user_genre in cand_genre:
+                        overlap.append(user_genre)
+                        score += 0.5
+                        break
+
+        if score > 0:
+            scored_artists.append({'artist': artist_obj, 'score': score, 'overlap': overlap})
+
+    scored_artists.sort(key=lambda x: x['score'], reverse=True)
+    return scored_artists[:10]
+
+
+def timed(fn, runs=20):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+if __name__ == '__main__':
+    random.seed(7)
+    genre_weights = {random_genre(): random.randint(1, 50) for _ in range(5)}
+    top_genres = list(genre_weights)
+
+    print(f"User genres: {genre_weights}")
+    print("'vector ms' scores a pool encoded when it was loaded (what a request does), 'encode ms' is that one-off cost")
+    print(f"{'candidates':>10} {'loop ms':>10} {'vector ms':>10} {'encode ms':>10}")
+
+    for n in [50, 500, 5000, 20000, 100000]:
+        candidates = make_candidates(n)
+        matrix = encode_genres([c['genres'] for c in candidates])
+
+        loop_ms = timed(lambda: loop_scoring(candidates, top_genres))
+        vector_ms = timed(lambda: rank_candidates(candidates, genre_weights, matrix=matrix))
+        encode_ms = timed(lambda: encode_genres([c['genres'] for c in candidates]), runs=3)
+        print(f"{n:>10} {loop_ms:>10.2f} {vector_ms:>10.2f} {encode_ms:>10.2f}")
@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from app.services.embeddings import EmbeddingStore, IVFIndex, _normalize
+
+# Benchmark => exact brute force vs IVF search over a memory mapped store (recall@k and latency)
+# Run from backend/: python bench_embeddings.py [--tracks 200000] [--dim 64]
+
+
+# Clustered vectors, like real tracks (genres / scenes) rather than uniform noise
+def make_vectors(n, dim, clusters=500, seed=7):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return _normalize(vectors)
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.tracks, args.dim)
+    tracks = [{'title': f'Track {i}', 'artist': f'Artist {i % 1000}'} for i in range(args.tracks)]
+
+    start = time.perf_counter()
+    index = IVFIndex.train(vectors)
+    print(f'{args.tracks} tracks x {args.dim} dims, IVF with {len(index.centroids)} lists trained in {time.perf_counter() - start:.1f}s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tracks')
+        EmbeddingStore.save(path, vectors, tracks, index)
+        store = EmbeddingStore.load(path)
+
+        rng = np.random.default_rng(1)
+        queries = [np.asarray(store.vectors[i]) for i in rng.integers(0, args.tracks, args.queries)]
+
+        exact, exact_ms = timed(lambda q: store.search_exact(q, args.k)[0], queries)
+        print(f'Brute force: {exact_ms:.2f} ms/query')
+
+        for n_probe in (1, 4, 8, 16, 32):
+            approx, ivf_ms = timed(lambda q: store.index.search(store.vectors, q, args.k, n_probe=n_probe)[0], queries)
+            recall = np.mean([len(set(a) & set(e)) / args.k for a, e in zip(approx, exact)])
+            print(f'IVF nprobe={n_probe:>2}: {ivf_ms:.2f} ms/query, recall@{args.k} {recall:.3f}')
+
+        del store # Release the memmap before the directory is removed
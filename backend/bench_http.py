@@ -0,0 +1,90 @@
+import argparse
+import statistics
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+from app.services.http_pool import pooled_httpx_client, pooled_session, transport_stats
+
+# Benchmark => per call latency and connection reuse, one connection per call (before) vs the shared pools (after)
+# Run from backend/: python bench_http.py [--calls 300] (local keep-alive stub)
+#                    python bench_http.py --url https://musicbrainz.org/ws/2/artist?query=abba&limit=1 --calls 20
+#                    => a real TLS endpoint, where the handshake saved per call shows (mind the API's rate limits)
+
+USER_AGENT = 'UniversalScrobbler/1.0 (http bench)'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive
+    disable_nagle_algorithm = True # Headers and body are separate writes => no 40ms delayed ACK stall on reused connections
+
+    def do_GET(self):
+        body = b'<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#"><recording-list count="0"/></metadata>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(fn, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies, reuse=None):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    reuse_text = f', reuse {reuse:.1%}' if reuse is not None else ', reuse 0% (new connection per call)'
+    print(f'{label:<34} p50 {statistics.median(latencies):6.2f} ms, p95 {p95:6.2f} ms{reuse_text}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_stub()
+        url = f'http://127.0.0.1:{server.server_port}/ws/2/recording?query=x'
+    headers = {'User-Agent': USER_AGENT}
+
+    # Before => what musicbrainzngs (urllib opener per call) and bare requests.post did
+    report('urllib, opener per call', timed(lambda: urllib.request.build_opener().open(urllib.request.Request(url, headers=headers)).read(), args.calls))
+    report('requests, no session', timed(lambda: requests.get(url, headers=headers).content, args.calls))
+
+    # After => shared pooled transport
+    session = pooled_session('bench-requests')
+    report('pooled requests session', timed(lambda: session.get(url, headers=headers).content, args.calls),
+           transport_stats()['bench-requests']['reuse_rate'])
+
+    with pooled_httpx_client('bench-httpx', headers=headers) as client:
+        report('pooled httpx client', timed(lambda: client.get(url).content, args.calls),
+               transport_stats()['bench-httpx']['reuse_rate'])
+
+    # musicbrainzngs itself, through the patched reader
+    if server is not None:
+        from app.services.musicbrainz import get_musicbrainz
+        musicbrainzngs = get_musicbrainz()
+        musicbrainzngs.set_hostname(f'127.0.0.1:{server.server_port}', use_https=False)
+        report('musicbrainzngs via shared pool', timed(lambda: musicbrainzngs.search_recordings(query='x'), args.calls),
+               transport_stats()['musicbrainz']['reuse_rate'])
+        server.shutdown()
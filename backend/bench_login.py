@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from sqlmodel import SQLModel, Session, select
+
+from app.auth import BCRYPT_MAX_PENDING, BCRYPT_ROUNDS, BCRYPT_WORKERS, _hash_password
+from app.database import engine
+from app.models import User
+
+# Benchmark => login throughput under concurrency, and whether other endpoints stay responsive meanwhile
+# Run from backend/: python bench_login.py [--logins 200] [--concurrency 50]
+#                    python bench_login.py --url http://localhost:8000 (against a running server using the same database)
+
+USERNAME = 'bench-login'
+PASSWORD = 'bench-login-password'
+
+
+def ensure_user():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.username == USERNAME)).first()
+        if user is None:
+            user = User(username=USERNAME, email=f'{USERNAME}@example.com', is_verified=True, hashed_password='')
+        user.hashed_password = _hash_password(PASSWORD, BCRYPT_ROUNDS)
+        session.add(user)
+        session.commit()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def login(client, results):
+    start = time.perf_counter()
+    response = await client.post('/token', data={'username': USERNAME, 'password': PASSWORD})
+    results.setdefault(response.status_code, []).append((time.perf_counter() - start) * 1000)
+
+
+# Health checks during the burst => shows whether hashing starves everything else
+async def probe(client, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get('/')
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def run(args):
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        from main import app
+        transport, base_url = httpx.ASGITransport(app=app), 'http://bench'
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=120) as client:
+        await login(client, {}) # Warm up (starts the worker processes)
+
+        results, health = {}, []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, stop, health))
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited():
+            async with semaphore:
+                await login(client, results)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[limited() for _ in range(args.logins)])
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await prober
+
+    ok = results.get(200, [])
+    print(f'bcrypt rounds={BCRYPT_ROUNDS}, workers={BCRYPT_WORKERS}, max pending={BCRYPT_MAX_PENDING}')
+    print(f'{args.logins} logins at concurrency {args.concurrency} in {elapsed:.2f}s => {len(ok) / elapsed:.1f} successful logins/s')
+    for status, latencies in sorted(results.items()):
+        print(f'  {status}: {len(latencies)} responses, p50 {statistics.median(latencies):.0f} ms, p95 {percentile(latencies, 0.95):.0f} ms')
+    print(f'Health check during burst: p50 {percentile(health, 0.5):.1f} ms, p95 {percentile(health, 0.95):.1f} ms, max {max(health or [0]):.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    ensure_user()
+    asyncio.run(run(args))
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Benchmark => cold start (import + app startup) in fresh interpreters, like a new autoscaled instance
+# Also checks that startup doesn't import the external API SDKs or need their credentials
+# Run from backend/: python bench_startup.py [--runs 5] [--max-seconds 3]
+#                    => exits non zero when an SDK is imported at startup or the median is over --max-seconds
+
+SDK_MODULES = ['google.genai', 'spotipy', 'lyricsgenius', 'musicbrainzngs']
+CREDENTIALS = ['GEMINI_API_KEY', 'GENIUS_ACCESS_TOKEN', 'SPOTIPY_CLIENT_ID', 'SPOTIPY_CLIENT_SECRET']
+
+# Runs in the child interpreter => one JSON line with the timings
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    health = client.get('/health/clients').json()
+print(json.dumps({
+    'import_s': imported - start,
+    'startup_s': started - imported,
+    'sdks': [m for m in %r if m in sys.modules],
+    'clients': {name: status['status'] for name, status in health.items()},
+}))
+''' % SDK_MODULES
+
+
+def run_once(db_path: str, without_credentials: bool):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', PREFETCH_ENABLED='false')
+    env.setdefault('JWT_SECRET_KEY', 'bench')
+    if without_credentials:
+        for var in CREDENTIALS:
+            env.pop(var, None)
+
+    result = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Startup failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    args = parser.parse_args()
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'startup.db')
+        run_once(db_path, False) # Creates the tables, warms the OS file cache
+
+        runs = [run_once(db_path, False) for _ in range(args.runs)]
+        bare = run_once(db_path, True) # Must still start with no API credentials at all
+
+    imports = [r['import_s'] for r in runs]
+    startups = [r['startup_s'] for r in runs]
+    totals = [r['import_s'] + r['startup_s'] for r in runs]
+    print(f'{args.runs} cold starts: import p50 {statistics.median(imports) * 1000:.0f} ms, '
+          f'startup p50 {statistics.median(startups) * 1000:.0f} ms, total p50 {statistics.median(totals) * 1000:.0f} ms (max {max(totals) * 1000:.0f} ms)')
+    print(f'SDKs imported at startup: {runs[0]["sdks"] or "none"}')
+    print(f'Clients after startup: {runs[0]["clients"]}')
+    print(f'Without credentials: started, clients {bare["clients"]}')
+
+    failed = False
+    if any(r['sdks'] for r in runs):
+        print('FAIL: external API SDKs are imported at startup')
+        failed = True
+    if args.max_seconds is not None and statistics.median(totals) > args.max_seconds:
+        print(f'FAIL: median cold start over {args.max_seconds}s')
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,110 @@
+import argparse
+import random
+from collections import Counter, namedtuple
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Scrobble
+from app.services.collab import track_key
+from app.services.next_track import (
+    NEXT_MAX_SUCCESSORS, count_transitions, prune_transitions, split_sessions,
+)
+
+# Offline evaluation => train the next track model on older sessions, check how often it predicts the next play in newer ones
+# Run from backend/: python eval_next_track.py            (scrobbles from DATABASE_URL)
+#                    python eval_next_track.py --synthetic (generated listening sessions)
+
+Play = namedtuple('Play', 'user_id timestamp title artist')
+
+
+def load_plays():
+    with Session(engine) as session:
+        return session.exec(
+            select(Scrobble.user_id, Scrobble.timestamp, Scrobble.title, Scrobble.artist)
+            .order_by(Scrobble.user_id, Scrobble.timestamp)
+        ).all()
+
+
+# Users walk through "albums" in order with some random jumps => there is sequential signal to learn
+def synthetic_plays(users=300, sessions=40, albums=400, album_size=10, jump=0.2):
+    random.seed(7)
+    plays = []
+    for user_id in range(users):
+        favourites = random.sample(range(albums), 8)
+        ts = 0
+        for _ in range(sessions):
+            ts += 24 * 60 * 60 * 1000
+            album, track = random.choice(favourites), random.randrange(album_size)
+            for _ in range(random.randint(3, 12)):
+                plays.append(Play(user_id, ts, f'Track {album}-{track}', f'Artist {album}'))
+                ts += 3 * 60 * 1000
+                if random.random() < jump:
+                    album, track = random.randrange(albums), random.randrange(album_size)
+                else:
+                    track = (track + 1) % album_size
+    return plays
+
+
+# Sessions starting before the cutoff train the model, the rest are held out
+def time_split(plays, train_fraction):
+    sessions = list(split_sessions(plays))
+    starts = sorted(s[0].timestamp for s in sessions)
+    cutoff = starts[int(len(starts) * train_fraction)] if starts else 0
+    return [s for s in sessions if s[0].timestamp < cutoff], [s for s in sessions if s[0].timestamp >= cutoff]
+
+
+def evaluate(successors, popular, test_sessions, k_values):
+    hits = Counter()
+    popular_hits = Counter()
+    reciprocal_rank = 0.0
+    covered = total = 0
+
+    for plays in test_sessions:
+        keys = [track_key(p.title, p.artist) for p in plays]
+        for prev, key in zip(keys, keys[1:]):
+            if prev == key:
+                continue
+            total += 1
+
+            ranked = [k for k, _ in successors.get(prev, [])]
+            covered += bool(ranked)
+            if key in ranked:
+                reciprocal_rank += 1 / (ranked.index(key) + 1)
+
+            for k in k_values:
+                hits[k] += key in ranked[:k]
+                popular_hits[k] += key in popular[:k]
+
+    return total, covered, hits, popular_hits, reciprocal_rank
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic', action='store_true')
+    parser.add_argument('--train-fraction', type=float, default=0.8)
+    parser.add_argument('--min-count', type=int, default=1)
+    parser.add_argument('--max-successors', type=int, default=NEXT_MAX_SUCCESSORS)
+    args = parser.parse_args()
+
+    plays = synthetic_plays() if args.synthetic else load_plays()
+    train, test = time_split(plays, args.train_fraction)
+    print(f'{len(plays)} plays => {len(train)} train sessions, {len(test)} test sessions')
+
+    counts, _ = count_transitions(train)
+    successors = prune_transitions(counts, max_successors=args.max_successors, min_count=args.min_count)
+
+    # Baseline => always suggest the most played tracks
+    play_counts = Counter(track_key(p.title, p.artist) for s in train for p in s)
+    popular = [key for key, _ in play_counts.most_common(max(10, args.max_successors))]
+
+    k_values = [1, 5, 10]
+    total, covered, hits, popular_hits, reciprocal_rank = evaluate(successors, popular, test, k_values)
+    if not total:
+        print('No held out transitions to evaluate')
+        raise SystemExit
+
+    print(f'Model: {sum(len(n) for n in successors.values())} transitions kept for {len(successors)} tracks')
+    print(f'Coverage: {covered / total:.1%} of {total} held out transitions have successors')
+    for k in k_values:
+        print(f'Hit@{k}: {hits[k] / total:.1%} (popularity baseline {popular_hits[k] / total:.1%})')
+    print(f'MRR: {reciprocal_rank / total:.3f}')
@@ -1,29 +1,136 @@
-from fastapi import FastAPI
-from sqlmodel import SQLModel
-
-from app.database import engine
-from app.routers import auth, recommendations, scrobble, stats, users
-
-# Initialise a server
-app = FastAPI(title="Cue API")
-
-# Runs when server 'starts', creates all tables in SQLModel metadata
-@app.on_event("startup")
-def on_startup():
-    SQLModel.metadata.create_all(engine)
-
-# Connect to the routers
-app.include_router(auth.router)
-app.include_router(recommendations.router)
-app.include_router(scrobble.router)
-app.include_router(stats.router)
-app.include_router(users.router)
-
-
-# Health check
-@app.get("/") # "/" sending request to root path
-def home():
-    return {
-        "status" : "online",
-        "system" : "Cue Backend"
-    }
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlmodel import SQLModel
+
+from app.auth import shutdown_password_pool
+from app.logging_config import NonBlockingQueueHandler, RequestIdMiddleware, setup_logging, stop_logging
+from app.database import engine, async_engine
+from app.routers import auth, recommendations, scrobble, stats, users
+from app.services.spotify import spotify_limiter
+from app.services.musicbrainz import mb_limiter
+from app.services.prefetch import start_prefetch_scheduler, stop_prefetch_scheduler
+from app.services.email_outbox import start_email_sender, stop_email_sender
+from app.services.write_queue import stop_write_queue, write_queue_stats
+from app.services.clients import registry, ClientUnavailable
+from app.services.http_pool import transport_stats
+from app.services.metrics import MetricsMiddleware, register_collector, render as render_metrics
+
+setup_logging()
+
+# Startup creates all tables in SQLModel metadata, external API clients are only built when first used
+# Shutdown stops the background workers, then closes the clients' HTTP sessions and the database pools
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    SQLModel.metadata.create_all(engine)
+    start_prefetch_scheduler()
+    start_email_sender()
+
+    yield
+
+    stop_prefetch_scheduler()
+    shutdown_password_pool()
+    await stop_email_sender()
+    stop_write_queue()
+    registry.close_all()
+    await async_engine.dispose()
+    engine.dispose()
+    stop_logging()
+
+# Initialise a server
+app = FastAPI(title="Cue API", lifespan=lifespan)
+
+# Request latency per route (and per dependency) for /metrics
+app.add_middleware(MetricsMiddleware)
+# Outermost => the request id is set before anything else logs
+app.add_middleware(RequestIdMiddleware)
+
+# Missing credentials / SDK failing to start => only the features using that client are unavailable
+@app.exception_handler(ClientUnavailable)
+async def client_unavailable_handler(request: Request, exc: ClientUnavailable):
+    return JSONResponse(status_code=503, content={'detail': str(exc)})
+
+# Connect to the routers
+app.include_router(auth.router)
+app.include_router(recommendations.router)
+app.include_router(scrobble.router)
+app.include_router(stats.router)
+app.include_router(users.router)
+
+
+# Health check
+@app.get("/") # "/" sending request to root path
+def home():
+    return {
+        "status" : "online",
+        "system" : "Cue Backend"
+    }
+
+# External API clients => not_started / ready / unconfigured / error, without creating any
+@app.get("/health/clients")
+def client_health():
+    return registry.status()
+
+# External API rate limiter metrics (queue wait time, throttles, retries)
+@app.get("/metrics/rate-limits")
+def rate_limit_metrics():
+    return {
+        "spotify": spotify_limiter.snapshot(),
+        "musicbrainz": mb_limiter.snapshot(),
+    }
+
+# External HTTP metrics per service (connection reuse rate, call latency)
+@app.get("/metrics/http")
+def http_metrics():
+    return transport_stats()
+
+# Single writer queue metrics (group commit batch sizes, pending writes)
+@app.get("/metrics/write-queue")
+def write_queue_metrics():
+    return write_queue_stats()
+
+
+# The stats above as Prometheus families, read on every scrape
+def collect_service_metrics():
+    limiters = [spotify_limiter.snapshot(), mb_limiter.snapshot()]
+    http = transport_stats()
+    queue = write_queue_stats()
+    clients = registry.status()
+
+    def per_limiter(key):
+        return [({'limiter': limiter['name']}, limiter[key]) for limiter in limiters]
+
+    def per_priority(key):
+        return [
+            ({'limiter': limiter['name'], 'priority': priority}, stats[key])
+            for limiter in limiters for priority, stats in limiter['priorities'].items()
+        ]
+
+    return [
+        ('rate_limiter_calls_total', 'counter', 'Calls admitted by each rate limiter, by priority', per_priority('calls')),
+        ('rate_limiter_wait_seconds_total', 'counter', 'Time callers waited for a token, by priority', per_priority('wait_seconds')),
+        ('rate_limiter_queued', 'gauge', 'Callers currently waiting for a token', per_limiter('queued')),
+        ('rate_limiter_throttles_total', 'counter', 'Back offs after the API rate limited us', per_limiter('throttles')),
+        ('rate_limiter_retries_total', 'counter', 'Calls retried after a rate limit', per_limiter('retries')),
+        ('rate_limiter_failures_total', 'counter', 'Calls that failed after their retries', per_limiter('failures')),
+        ('external_requests_total', 'counter', 'HTTP requests sent per external service',
+         [({'service': name}, stats['requests']) for name, stats in http.items()]),
+        ('external_connections_opened_total', 'counter', 'New connections opened per external service (the rest reused a pooled one)',
+         [({'service': name}, stats['connections_opened']) for name, stats in http.items()]),
+        ('external_client_ready', 'gauge', 'External API client built and usable (1) or not (0)',
+         [({'client': name, 'status': status['status']}, int(status['status'] == 'ready')) for name, status in clients.items()]),
+        ('db_write_queue_pending', 'gauge', 'Writes waiting for the single writer', [({}, queue['pending'])]),
+        ('db_write_queue_batches_total', 'counter', 'Group commits made by the single writer', [({}, queue['batches'])]),
+        ('db_write_queue_writes_total', 'counter', 'Writes committed by the single writer', [({}, queue['writes'])]),
+        ('log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full', [({}, NonBlockingQueueHandler.dropped)]),
+    ]
+
+
+register_collector(collect_service_metrics)
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for Brevo's send endpoint, to exercise the email outbox without sending real emails
+# Run from backend/: python stub_email_server.py --port 8025 [--fail-rate 0.3]
+#                    => then start the API with BREVO_URL=http://localhost:8025/v3/smtp/email
+#                    python stub_email_server.py --selftest (queues emails and drains the outbox against the stub)
+
+received = []
+
+
+def make_handler(fail_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            if random.random() < fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                self.wfile.write(b'{"message": "stub failure"}')
+                return
+
+            payload = json.loads(body or b'{}')
+            received.append(payload)
+            print(f"Stub received: {payload.get('subject')} -> {[to['email'] for to in payload.get('to', [])]}")
+
+            self.send_response(201)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'messageId': f'<stub-{len(received)}>'}).encode())
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(port: int, fail_rate: float):
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fail_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def selftest(fail_rate: float, emails: int):
+    import os
+    import tempfile
+
+    server = start_stub(0, fail_rate)
+    os.environ['BREVO_URL'] = f'http://127.0.0.1:{server.server_port}/v3/smtp/email'
+    os.environ['EMAIL_BACKOFF_SECONDS'] = '0'
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'outbox.db')}")
+
+    from sqlmodel import SQLModel, Session, select
+    from app.database import engine
+    from app.models import EmailOutbox
+    from app.services.email_outbox import drain_outbox, make_email_client, queue_otp_email
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(emails):
+            queue_otp_email(session, f'user{i}@example.com', f'{100000 + i}')
+        session.commit()
+
+    async def drain():
+        async with make_email_client() as client:
+            # Failed sends are due again right away (no backoff), keep draining until nothing is left
+            while await drain_outbox(client):
+                pass
+
+    asyncio.run(drain())
+
+    with Session(engine) as session:
+        rows = session.exec(select(EmailOutbox)).all()
+    statuses = {status: sum(row.status == status for row in rows) for status in ('sent', 'pending', 'failed')}
+    print(f'Outbox: {statuses}, stub received {len(received)}, attempts {sum(row.attempts for row in rows)}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--selftest', action='store_true')
+    parser.add_argument('--emails', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.selftest:
+        selftest(args.fail_rate, args.emails)
+    else:
+        server = start_stub(args.port, args.fail_rate)
+        print(f'Stub email server on http://127.0.0.1:{args.port}/v3/smtp/email')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
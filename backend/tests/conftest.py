@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests run from backend/ (python -m pytest) or the repo root => app/ must be importable either way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.services import artist_pool
+
+
+@pytest.fixture
+def session(monkeypatch):
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(artist_pool, '_pool_index', {})
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_empty_pool_is_cached_for_a_while(session, monkeypatch):
+    searches = []
+    monkeypatch.setattr(artist_pool, 'refresh_genre_pool', lambda session, genre: searches.append(genre) or [])
+
+    for _ in range(3):
+        candidates, matrix = artist_pool.get_genre_pool(session, 'niche')
+        assert candidates == [] and matrix.shape[0] == 0
+    assert searches == ['niche']
+
+    # Expired => Spotify is asked again
+    monkeypatch.setattr(artist_pool, 'EMPTY_POOL_TTL_SECONDS', 0)
+    artist_pool.get_genre_pool(session, 'niche')
+    assert searches == ['niche', 'niche']
+
+
+def test_failed_refresh_is_cached_as_empty(session, monkeypatch):
+    searches = []
+
+    def refresh(session, genre):
+        searches.append(genre)
+        raise RuntimeError('spotify down')
+
+    monkeypatch.setattr(artist_pool, 'refresh_genre_pool', refresh)
+    artist_pool.get_genre_pool(session, 'niche')
+    artist_pool.get_genre_pool(session, 'niche')
+    assert searches == ['niche']
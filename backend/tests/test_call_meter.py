@@ -0,0 +1,100 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from urllib3.util.retry import Retry
+
+from app.services import prefetch
+from app.services.http_pool import CallLimitReached, CallMeter, metered_calls, pooled_session
+
+
+# Answers the queued statuses in order, 200 once they run out
+class StubServer(BaseHTTPRequestHandler):
+    statuses = []
+    hits = 0
+
+    def do_GET(self):
+        StubServer.hits += 1
+        self.send_response(StubServer.statuses.pop(0) if StubServer.statuses else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = HTTPServer(('127.0.0.1', 0), StubServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubServer.statuses, StubServer.hits = [], 0
+
+    session = pooled_session('stub', max_retries=Retry(total=2, status_forcelist=[503], backoff_factor=0))
+    yield session, f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+    session.close()
+
+
+def test_requests_over_the_cap_are_refused(stub):
+    session, url = stub
+    meter = CallMeter({'stub': 2})
+
+    with metered_calls(meter):
+        session.get(url)
+        session.get(url)
+        with pytest.raises(CallLimitReached):
+            session.get(url)
+
+    assert StubServer.hits == 2
+    assert meter.refused == {'stub'}
+    assert not meter.has_calls(['stub'])
+
+
+def test_transport_retries_are_charged(stub):
+    session, url = stub
+    StubServer.statuses = [503, 503]
+    meter = CallMeter({'stub': 10})
+
+    with metered_calls(meter):
+        assert session.get(url).status_code == 200
+
+    assert StubServer.hits == 3
+    assert meter.remaining['stub'] == 7
+
+
+def test_only_metered_calls_are_charged(stub):
+    session, url = stub
+    meter = CallMeter({'stub': 1, 'other': 5})
+
+    session.get(url) # Outside the meter
+    with metered_calls(meter):
+        session.get(url)
+
+    assert meter.remaining == {'stub': 0, 'other': 5}
+
+
+# Warmers verify candidates on executors that copy the context => those calls count too
+def test_copied_context_shares_the_meter(stub):
+    session, url = stub
+    meter = CallMeter({'stub': 4})
+
+    with metered_calls(meter), ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, session.get, url) for _ in range(4)]
+        for future in futures:
+            future.result()
+
+    assert meter.remaining['stub'] == 0
+
+
+def test_window_is_named_by_the_day_it_opened(monkeypatch):
+    monkeypatch.setattr(prefetch, 'PREFETCH_HOURS', '22-4')
+    opened = datetime(2024, 5, 1, 23, tzinfo=timezone.utc)
+    assert prefetch.prefetch_window_key(opened) == opened.date()
+    assert prefetch.prefetch_window_key(datetime(2024, 5, 2, 3, tzinfo=timezone.utc)) == opened.date()
+
+    monkeypatch.setattr(prefetch, 'PREFETCH_HOURS', '1-6')
+    assert prefetch.prefetch_window_key(datetime(2024, 5, 2, 3, tzinfo=timezone.utc)) == datetime(2024, 5, 2).date()
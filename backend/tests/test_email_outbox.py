@@ -0,0 +1,85 @@
+import asyncio
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import stub_email_server
+from app.models import EmailOutbox
+from app.services import email_outbox
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(email_outbox, 'engine', engine)
+    monkeypatch.setattr(email_outbox, 'EMAIL_BACKOFF_SECONDS', 0) # Failed sends are due again right away
+    stub_email_server.received.clear()
+    yield engine
+    engine.dispose()
+
+
+def _drain(engine, fail_rate: float, emails: int):
+    server = stub_email_server.start_stub(0, fail_rate)
+    email_outbox_url = f'http://127.0.0.1:{server.server_port}/v3/smtp/email'
+
+    with Session(engine) as session:
+        for i in range(emails):
+            email_outbox.queue_otp_email(session, f'user{i}@example.com', f'{100000 + i}')
+        session.commit()
+
+    async def drain():
+        async with email_outbox.make_email_client() as client:
+            while await email_outbox.drain_outbox(client):
+                pass
+
+    try:
+        email_outbox.BREVO_URL, brevo_url = email_outbox_url, email_outbox.BREVO_URL
+        asyncio.run(drain())
+    finally:
+        email_outbox.BREVO_URL = brevo_url
+        server.shutdown()
+        server.server_close()
+
+    with Session(engine) as session:
+        return session.exec(select(EmailOutbox)).all()
+
+
+def test_flaky_provider_delivers_each_email_once(outbox):
+    random.seed(7)
+    rows = _drain(outbox, fail_rate=0.4, emails=20)
+
+    sent = [row for row in rows if row.status == 'sent']
+    assert all(row.status in ('sent', 'failed') for row in rows)
+    assert len(stub_email_server.received) == len(sent)
+    assert sorted(p['to'][0]['email'] for p in stub_email_server.received) == sorted(row.to_email for row in sent)
+    assert sum(row.attempts for row in rows) > len(rows) # Some sends were retried
+
+    # Terminal rows don't keep the OTP around
+    assert all(row.html == '' for row in rows)
+
+
+def test_failures_stop_after_max_attempts(outbox):
+    rows = _drain(outbox, fail_rate=1.0, emails=3)
+
+    assert stub_email_server.received == []
+    assert [row.status for row in rows] == ['failed'] * 3
+    assert [row.attempts for row in rows] == [email_outbox.EMAIL_MAX_ATTEMPTS] * 3
+    assert all(row.html == '' and row.last_error.startswith('503') for row in rows)
+
+
+def test_purge_keeps_pending_and_recent_emails(outbox):
+    old = datetime.now(timezone.utc) - timedelta(days=email_outbox.EMAIL_RETENTION_DAYS + 1)
+    with Session(outbox) as session:
+        session.add(EmailOutbox(to_email='old@example.com', subject='s', html='', status='sent', created_at=old))
+        session.add(EmailOutbox(to_email='failed@example.com', subject='s', html='', status='failed', created_at=old))
+        session.add(EmailOutbox(to_email='stuck@example.com', subject='s', html='<p>1</p>', created_at=old))
+        session.add(EmailOutbox(to_email='new@example.com', subject='s', html='', status='sent'))
+        session.commit()
+
+    assert email_outbox.purge_outbox() == 2
+    with Session(outbox) as session:
+        left = sorted(session.exec(select(EmailOutbox.to_email)).all())
+    assert left == ['new@example.com', 'stuck@example.com']
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.services.embeddings import EmbeddingStore, IVFIndex, _normalize, _top_k
+
+
+# Unit vectors around a few directions => realistic neighbourhoods for the index
+def clustered_vectors(n=4000, dim=16, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return _normalize(centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def tracks_for(n):
+    return [{'title': f'Song {i}', 'artist': f'Artist {i % 7}'} for i in range(n)]
+
+
+def test_top_k_is_sorted_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3])
+    assert list(_top_k(scores, 3)) == [1, 3, 2]
+    assert list(_top_k(scores, 10)) == [1, 3, 2, 4, 0]
+    assert len(_top_k(scores, 0)) == 0
+
+
+def test_ivf_lists_cover_every_vector_once():
+    vectors = clustered_vectors()
+    index = IVFIndex.train(vectors, n_lists=32)
+
+    assert sorted(index.order) == list(range(len(vectors)))
+    assert index.offsets[0] == 0 and index.offsets[-1] == len(vectors)
+    assert np.all(np.diff(index.offsets) >= 0)
+
+
+# Probing every list scans every vector => same answer as brute force
+def test_ivf_with_all_lists_probed_is_exact():
+    vectors = clustered_vectors()
+    store = EmbeddingStore(vectors, tracks_for(len(vectors)))
+    index = IVFIndex.train(vectors, n_lists=32)
+
+    for row in range(0, len(vectors), 400):
+        exact_rows, exact_scores = store.search_exact(vectors[row], 10)
+        rows, scores = index.search(vectors, vectors[row], 10, n_probe=32)
+        assert list(rows) == list(exact_rows)
+        assert np.allclose(scores, exact_scores)
+
+
+def test_ivf_recall_with_default_probes():
+    vectors = clustered_vectors()
+    store = EmbeddingStore(vectors, tracks_for(len(vectors)), IVFIndex.train(vectors))
+
+    found = total = 0
+    for row in range(0, len(vectors), 50):
+        exact, _ = store.search(vectors[row], 10, exact=True)
+        approx, _ = store.search(vectors[row], 10)
+        found += len(set(exact) & set(approx))
+        total += len(exact)
+    assert found / total >= 0.9
+
+
+def test_store_round_trip(tmp_path):
+    vectors = clustered_vectors(n=500)
+    path = str(tmp_path / 'tracks')
+    EmbeddingStore.save(path, vectors, tracks_for(500), IVFIndex.train(vectors, n_lists=8))
+
+    store = EmbeddingStore.load(path)
+    assert len(store) == 500
+    assert store.index is not None
+    assert np.allclose(store.vector('song 3', 'ARTIST 3'), vectors[3])
+    assert store.vector('Missing', 'Nobody') is None
+    assert store.search(vectors[7], 1)[0][0] == 7
+    assert not list(tmp_path.glob('*.tmp*')) # Temp files were all swapped in
+
+
+# Rebuilt without an index => the old index files are dropped, never paired with the new vectors
+def test_store_saved_without_index_ignores_old_index(tmp_path):
+    path = str(tmp_path / 'tracks')
+    vectors = clustered_vectors(n=500)
+    EmbeddingStore.save(path, vectors, tracks_for(500), IVFIndex.train(vectors, n_lists=8))
+    EmbeddingStore.save(path, vectors[:50], tracks_for(50))
+
+    store = EmbeddingStore.load(path)
+    assert len(store) == 50 and store.index is None
+    assert not list(tmp_path.glob('*.npy'))
+
+    # Leftover index files from an interrupted swap are not loaded either
+    IVFIndex.train(vectors, n_lists=8).save(path)
+    assert EmbeddingStore.load(path).index is None
+    with open(f'{path}.json', encoding='utf-8') as f:
+        assert json.load(f)['ivf'] is False
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / 'tracks')
+    EmbeddingStore.save(path, np.zeros((0, 8), dtype=np.float32), [])
+    store = EmbeddingStore.load(path)
+    assert len(store) == 0
+    rows, _ = store.search(np.ones(8, dtype=np.float32), 5)
+    assert len(rows) == 0
+
+
+@pytest.mark.parametrize('n_probe', [1, 4])
+def test_ivf_returns_at_most_k(n_probe):
+    vectors = clustered_vectors(n=300)
+    index = IVFIndex.train(vectors, n_lists=16)
+    rows, scores = index.search(vectors, vectors[0], 5, n_probe=n_probe)
+    assert len(rows) <= 5 and list(scores) == sorted(scores, reverse=True)
@@ -0,0 +1,94 @@
+import pytest
+
+from app.services.genre_scoring import encode_genres, genre_features, rank_candidates, shared_genres, stack
+
+
+def artist(name, *genres):
+    return {'name': name, 'genres': list(genres)}
+
+
+CANDIDATES = [
+    artist('Exact', 'indie rock'),
+    artist('Partial', 'indie pop'),
+    artist('Unrelated', 'k-pop'),
+    artist('Nothing'),
+    artist('Both', 'indie rock', 'shoegaze'),
+]
+
+
+def names(ranked):
+    return [r['artist']['name'] for r in ranked]
+
+
+def test_genre_features_include_words():
+    features = dict(genre_features('indie rock'))
+    assert len(features) == 3 # "indie rock", "#indie", "#rock"
+    assert sorted(features.values()) == [0.5, 0.5, 1.0]
+    assert genre_features('indie rock') is genre_features('indie rock') # Cached
+
+
+def test_same_genres_as_the_profile_scores_one():
+    ranked = rank_candidates([artist('Same', 'indie rock')], {'indie rock': 3.0})
+    assert ranked[0]['score'] == pytest.approx(1.0)
+
+
+def test_exact_match_beats_partial_and_unrelated_are_dropped():
+    ranked = rank_candidates(CANDIDATES, {'indie rock': 1.0})
+
+    # Extra genres dilute the match, unrelated / genre-less artists score 0 and are left out
+    assert names(ranked) == ['Exact', 'Both', 'Partial']
+    assert [r['score'] for r in ranked] == sorted((r['score'] for r in ranked), reverse=True)
+    assert all(0 < r['score'] <= 1.0 + 1e-6 for r in ranked)
+
+
+def test_profile_weights_decide_the_order():
+    candidates = [artist('Rock', 'rock'), artist('Jazz', 'jazz')]
+    assert names(rank_candidates(candidates, {'rock': 5.0, 'jazz': 1.0})) == ['Rock', 'Jazz']
+    assert names(rank_candidates(candidates, {'rock': 1.0, 'jazz': 5.0})) == ['Jazz', 'Rock']
+
+
+def test_limit_and_empty_inputs():
+    assert len(rank_candidates(CANDIDATES, {'indie rock': 1.0, 'k-pop': 1.0}, limit=2)) == 2
+    assert rank_candidates([], {'rock': 1.0}) == []
+    assert rank_candidates(CANDIDATES, {}) == []
+
+
+# Pools encoded earlier (smaller vocabulary) and stacked => same ranking as encoding on the spot
+def test_precomputed_stacked_matrices_match():
+    first, second = CANDIDATES[:2], CANDIDATES[2:]
+    first_matrix = encode_genres([c['genres'] for c in first])
+    second_matrix = encode_genres([c['genres'] for c in second] + [['brand new genre']])[:len(second)]
+
+    profile = {'indie rock': 2.0, 'shoegaze': 1.0}
+    stacked = rank_candidates(CANDIDATES, profile, matrix=stack([first_matrix, second_matrix]))
+    fresh = rank_candidates(CANDIDATES, profile)
+
+    assert names(stacked) == names(fresh)
+    assert [r['score'] for r in stacked] == pytest.approx([r['score'] for r in fresh])
+
+
+def test_shared_genres_prefers_exact_overlap():
+    assert shared_genres(['indie rock', 'jazz'], ['indie rock', 'shoegaze']) == ['indie rock']
+    assert shared_genres(['indie rock', 'jazz'], ['indie pop']) == ['indie rock']
+    assert shared_genres(['jazz'], ['k-pop']) == []
+    assert shared_genres(['jazz'], []) == []
+
+
+# Past the cap new features share the overflow columns => the vocabulary and matrix width stop growing
+def test_vocabulary_is_capped(monkeypatch):
+    from app.services import genre_scoring
+
+    monkeypatch.setattr(genre_scoring, '_vocab', {})
+    monkeypatch.setattr(genre_scoring, 'GENRE_VOCAB_MAX', 3)
+    genre_features.cache_clear()
+    try:
+        candidates = [artist('Rock', 'indie rock'), artist('Late', 'dream pop'), artist('Later', 'math rock')]
+        matrix = encode_genres([c['genres'] for c in candidates])
+
+        assert len(genre_scoring._vocab) == 3
+        assert matrix.shape[1] == 3 + genre_scoring.OVERFLOW_COLUMNS
+        assert matrix.indices.max() < matrix.shape[1]
+        assert names(rank_candidates(candidates, {'indie rock': 1.0}, matrix=matrix))[0] == 'Rock'
+        assert names(rank_candidates(candidates, {'dream pop': 1.0}, matrix=stack([matrix])))[0] == 'Late'
+    finally:
+        genre_features.cache_clear()
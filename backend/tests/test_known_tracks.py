@@ -0,0 +1,58 @@
+import pytest
+
+from app.services import known_tracks
+from app.services.known_tracks import BloomFilter, KnownTracks, filter_known, normalize_track
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(10_000)
+    keys = [f'song {i}\tartist {i % 97}' for i in range(10_000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+
+
+@pytest.mark.parametrize('error_rate', [0.01, 0.001])
+def test_bloom_filter_false_positive_rate_is_bounded(error_rate):
+    bloom = BloomFilter(20_000, error_rate)
+    for i in range(20_000):
+        bloom.add(f'known {i}')
+
+    probes = 200_000
+    false_positives = sum(f'unknown {i}' in bloom for i in range(probes))
+    # Filled to capacity => at most the configured rate (with room for sampling noise)
+    assert false_positives / probes <= error_rate * 1.5
+
+
+def test_bloom_filter_size_follows_capacity():
+    small, large = BloomFilter(1_000), BloomFilter(100_000)
+    assert len(large.bits) > 50 * len(small.bits)
+    assert BloomFilter(0).size >= 8
+
+
+def test_normalize_track():
+    assert normalize_track(' Starboy ', 'The WEEKND') == ('starboy', 'the weeknd')
+    assert normalize_track(None, None) == ('', '')
+
+
+@pytest.mark.parametrize('threshold', [20_000, 1])
+def test_known_tracks_matches_any_casing(monkeypatch, threshold):
+    monkeypatch.setattr(known_tracks, 'BLOOM_THRESHOLD', threshold) # 1 => Bloom filter backed
+    known = KnownTracks([('Starboy', 'The Weeknd'), ('Creep', 'Radiohead')])
+
+    assert isinstance(known._keys, BloomFilter) == (threshold == 1)
+    assert ('starboy ', 'the weeknd') in known
+    assert ('CREEP', 'radiohead') in known
+    assert ('Starboy', 'Radiohead') not in known
+
+    known.add('Karma Police', 'Radiohead')
+    assert ('karma police', 'RADIOHEAD') in known
+
+
+def test_filter_known_removes_known_songs_and_cuts_to_limit():
+    known = KnownTracks([('A', 'X'), ('C', 'X')])
+    recs = [{'title': t, 'artist': 'x'} for t in ['a', 'B', 'c', 'D', 'E', 'F']]
+
+    assert [r['title'] for r in filter_known(recs, known, limit=3)] == ['B', 'D', 'E']
+    assert filter_known([], known) == []
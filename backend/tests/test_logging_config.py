@@ -0,0 +1,52 @@
+import logging
+import queue
+
+import pytest
+
+from app.logging_config import JsonFormatter, NonBlockingQueueHandler
+
+
+@pytest.fixture
+def logged():
+    records = queue.Queue()
+    logger = logging.getLogger('test.logging_config')
+    handler = NonBlockingQueueHandler(records)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield logger, records
+    logger.removeHandler(handler)
+
+
+class Row:
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+# The listener formats later => later changes to the args must not show up in the line
+def test_message_is_resolved_in_the_calling_thread(logged):
+    logger, records = logged
+    tracks, row = ['a'], Row('before')
+
+    logger.info('Tracks %s', tracks, extra={'row': row})
+    tracks.append('b')
+    row.name = 'after'
+
+    record = records.get_nowait()
+    assert record.msg == "Tracks ['a']" and record.args is None
+    assert record.row == 'before'
+    assert '"msg": "Tracks [\'a\']"' in JsonFormatter().format(record)
+
+
+def test_traceback_is_still_formatted_by_the_listener(logged):
+    logger, records = logged
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('Failed %s', 1)
+
+    record = records.get_nowait()
+    assert record.getMessage() == 'Failed 1'
+    assert 'ValueError: boom' in JsonFormatter().format(record)
@@ -0,0 +1,73 @@
+from collections import Counter, namedtuple
+
+from app.services.next_track import count_transitions, prune_transitions, split_sessions
+
+Play = namedtuple('Play', 'user_id timestamp title artist image_url spotify_id', defaults=(None, None))
+MINUTE = 60 * 1000
+
+
+def plays(user_id, *items):
+    return [Play(user_id, minute * MINUTE, title, 'X') for minute, title in items]
+
+
+def titles(sessions):
+    return [[p.title for p in session] for session in sessions]
+
+
+def test_split_sessions_on_gap_and_user_change():
+    history = plays(1, (0, 'a'), (3, 'b'), (40, 'c'), (45, 'd')) + plays(2, (46, 'e'), (47, 'f'))
+    assert titles(split_sessions(history, gap_ms=30 * MINUTE)) == [['a', 'b'], ['c', 'd'], ['e', 'f']]
+
+
+def test_split_sessions_gap_is_inclusive():
+    history = plays(1, (0, 'a'), (30, 'b'), (61, 'c'))
+    assert titles(split_sessions(history, gap_ms=30 * MINUTE)) == [['a', 'b'], ['c']]
+
+
+def test_split_sessions_empty():
+    assert list(split_sessions([])) == []
+
+
+def test_count_transitions_skips_repeats_and_normalizes():
+    sessions = [
+        plays(1, (0, 'A'), (1, 'a '), (2, 'B'), (3, 'c')),
+        plays(2, (0, 'a'), (1, 'b')),
+    ]
+    counts, info = count_transitions(sessions)
+
+    assert counts == Counter({('a\tx', 'b\tx'): 2, ('b\tx', 'c\tx'): 1})
+    assert info['a\tx'].title == 'A' # First play seen gives the display info
+
+
+def test_count_transitions_does_not_cross_sessions():
+    counts, _ = count_transitions([plays(1, (0, 'a')), plays(1, (90, 'b'))])
+    assert counts == Counter()
+
+
+def test_prune_transitions_keeps_top_successors():
+    counts = Counter({('a', 'b'): 5, ('a', 'c'): 9, ('a', 'd'): 1, ('a', 'e'): 3, ('x', 'y'): 1})
+
+    assert prune_transitions(counts, max_successors=2) == {'a': [('c', 9), ('b', 5)], 'x': [('y', 1)]}
+    assert prune_transitions(counts, max_successors=10, min_count=3) == {'a': [('c', 9), ('b', 5), ('e', 3)]}
+
+
+def test_record_transition_increments_in_place(tmp_path):
+    from sqlmodel import Session, SQLModel, create_engine, select
+
+    from app.models import Scrobble, TrackTransition
+    from app.services.next_track import record_transition
+
+    engine = create_engine(f'sqlite:///{tmp_path / "next.db"}')
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for user_id in range(3):
+            for minute, title in [(0, 'A'), (1, 'B')]:
+                scrobble = Scrobble(user_id=user_id, title=title, artist='X', package='p', timestamp=minute * MINUTE)
+                session.add(scrobble)
+                session.commit()
+                session.refresh(scrobble)
+                record_transition(session, scrobble)
+
+        rows = session.exec(select(TrackTransition)).all()
+        assert [(row.from_key, row.to_key, row.count) for row in rows] == [('a\tx', 'b\tx', 3)]
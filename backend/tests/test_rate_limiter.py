@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from app.services.rate_limiter import (
+    PRIORITY_INGEST, PRIORITY_INTERACTIVE, PRIORITY_RECOMMEND, TokenBucket, parse_retry_after,
+)
+
+
+def timed(fn, *args):
+    start = time.monotonic()
+    fn(*args)
+    return time.monotonic() - start
+
+
+def test_burst_up_to_capacity_then_rate_limited():
+    bucket = TokenBucket('test', rate=20, capacity=5)
+    assert timed(lambda: [bucket.acquire() for _ in range(5)]) < 0.05
+    assert 0.2 <= timed(lambda: [bucket.acquire() for _ in range(5)]) < 0.5 # 5 more tokens at 20/s
+
+
+def test_higher_priority_is_served_first():
+    bucket = TokenBucket('test', rate=10, capacity=1)
+    bucket.acquire() # Empty => everyone below queues for the next tokens
+    served = []
+
+    def take(name, priority):
+        bucket.acquire(priority)
+        served.append(name)
+
+    threads = []
+    for name, priority in [('recommend-1', PRIORITY_RECOMMEND), ('ingest', PRIORITY_INGEST),
+                           ('recommend-2', PRIORITY_RECOMMEND), ('interactive', PRIORITY_INTERACTIVE)]:
+        threads.append(threading.Thread(target=take, args=(name, priority)))
+        threads[-1].start()
+        time.sleep(0.01) # Queued in this order, well before the next token (100 ms)
+
+    for thread in threads:
+        thread.join(5)
+    assert served == ['ingest', 'interactive', 'recommend-1', 'recommend-2']
+
+
+def test_throttle_blocks_every_caller_and_empties_the_bucket():
+    bucket = TokenBucket('test', rate=1000, capacity=10)
+    bucket.throttle(0.2)
+
+    assert timed(bucket.acquire) >= 0.19
+    # No tokens piled up during the back off => the end of a Retry-After is not a burst
+    assert timed(lambda: [bucket.acquire() for _ in range(5)]) >= 0.003
+
+
+def test_snapshot_counts():
+    bucket = TokenBucket('test', rate=100, capacity=10)
+    bucket.acquire(PRIORITY_INGEST)
+    bucket.acquire(PRIORITY_RECOMMEND)
+    bucket.throttle(0)
+    bucket.record_retry()
+    bucket.record_failure()
+
+    snapshot = bucket.snapshot()
+    assert snapshot['priorities']['ingest']['calls'] == 1
+    assert snapshot['priorities']['recommend']['calls'] == 1
+    assert (snapshot['throttles'], snapshot['retries'], snapshot['failures']) == (1, 1, 1)
+    assert snapshot['queued'] == 0
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '7'}, 7.0),
+    ({'retry-after': '2.5'}, 2.5),
+    ({'Retry-After': '-3'}, 0.0),
+    ({'Retry-After': 'Wed, 21 Oct 2026 07:28:00 GMT'}, 4.0),
+    ({}, 4.0),
+    (None, 4.0),
+])
+def test_parse_retry_after(headers, expected):
+    assert parse_retry_after(headers, default=4.0) == expected
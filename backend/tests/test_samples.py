@@ -0,0 +1,46 @@
+from collections import namedtuple
+
+import pytest
+
+from app.services import samples
+from app.services.known_tracks import KnownTracks
+
+Track = namedtuple('Track', 'title artist')
+
+
+@pytest.fixture(autouse=True)
+def clear_results():
+    samples._results.clear()
+    yield
+    samples._results.clear()
+
+
+def test_candidates_without_an_artist_are_kept(monkeypatch):
+    monkeypatch.setattr(samples, 'find_genius_id', lambda session, title, artist: 1)
+    monkeypatch.setattr(samples, 'get_sample_relations', lambda session, genius_id: [
+        {'title': 'Unknown Artist Song', 'artist': '', 'type': 'samples'},
+        {'title': 'Own Remix', 'artist': 'Seed Artist', 'type': 'sampled_by'},
+        {'title': 'Other Song', 'artist': 'Someone Else', 'type': 'sampled_by'},
+    ])
+    monkeypatch.setattr(samples, 'verify_song', lambda item, reason, priority: dict(item, reason=reason))
+
+    pool = samples.build_samples_pool(None, 'Seed', 'Seed Artist')
+    assert [rec['title'] for rec in pool] == ['Unknown Artist Song', 'Other Song']
+
+
+def test_final_result_is_cached_once_every_seed_resolved(monkeypatch):
+    pools = {('A', 'x'): [{'title': 'Sampled', 'artist': 'y'}], ('B', 'x'): None}
+    monkeypatch.setattr(samples, 'read_cache', lambda session, title, artist, rec_type: pools[(title, artist)])
+    monkeypatch.setattr(samples, '_resolve_seed', lambda title, artist: pools[(title, artist)])
+    top_tracks = [Track('A', 'x'), Track('B', 'x')]
+
+    # B failed to resolve (Genius error) => not final, asked again next time
+    assert samples.get_samples_recommendations(None, 1, top_tracks, KnownTracks([]), limit=5) == [{'title': 'Sampled', 'artist': 'y'}]
+    assert samples.get_cached_samples(1) is None
+
+    pools[('B', 'x')] = []
+    result = samples.get_samples_recommendations(None, 1, top_tracks, KnownTracks([]), limit=5)
+    assert samples.get_cached_samples(1) == result
+
+    samples.invalidate_samples(1)
+    assert samples.get_cached_samples(1) is None
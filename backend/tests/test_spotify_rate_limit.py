@@ -0,0 +1,106 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app.services import spotify
+
+
+# Local stand in for api.spotify.com => answers the queued statuses in order, 200 once they run out
+class StubSpotify(BaseHTTPRequestHandler):
+    responses = []
+    hits = 0
+
+    def do_GET(self):
+        StubSpotify.hits += 1
+        status, headers = StubSpotify.responses.pop(0) if StubSpotify.responses else (200, {})
+        body = json.dumps({'id': 'artist'} if status == 200 else {'error': {'status': status, 'message': 'stub'}}).encode()
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), StubSpotify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubSpotify.responses, StubSpotify.hits = [], 0
+
+    monkeypatch.setenv('SPOTIPY_CLIENT_ID', 'id')
+    monkeypatch.setenv('SPOTIPY_CLIENT_SECRET', 'secret')
+    sp = spotify._create_client()
+    sp.prefix = f'http://127.0.0.1:{server.server_port}/v1/'
+    sp._auth = 'token' # Skips the client credentials request
+
+    # Record the back offs instead of sleeping through them
+    throttles = []
+    monkeypatch.setattr(spotify.spotify_limiter, 'throttle', throttles.append)
+
+    yield sp, throttles
+    server.shutdown()
+    server.server_close()
+    sp._session.close()
+
+
+# One HTTP request per spotify_call attempt => urllib3 never retried it, the limiter saw the real Retry-After
+def test_429_is_retried_only_by_spotify_call(stub_client):
+    sp, throttles = stub_client
+    StubSpotify.responses = [(429, {'Retry-After': '7'}), (429, {'Retry-After': '3'})]
+
+    assert spotify.spotify_call(sp.artist, 'artist') == {'id': 'artist'}
+    assert StubSpotify.hits == 3
+    assert throttles == [7.0, 3.0]
+
+
+def test_429_gives_up_after_max_retries(stub_client, monkeypatch):
+    sp, throttles = stub_client
+    monkeypatch.setattr(spotify, 'SPOTIFY_MAX_RETRIES', 1)
+    StubSpotify.responses = [(429, {'Retry-After': '5'})] * 3
+
+    with pytest.raises(Exception) as error:
+        spotify.spotify_call(sp.artist, 'artist')
+    assert error.value.http_status == 429
+    assert StubSpotify.hits == 2
+    assert throttles == [5.0, 5.0]
+
+
+# 5xx stay with the session's Retry => spotify_call makes a single call
+def test_5xx_is_retried_by_the_session(stub_client):
+    sp, throttles = stub_client
+    StubSpotify.responses = [(503, {})]
+
+    assert spotify.spotify_call(sp.artist, 'artist') == {'id': 'artist'}
+    assert StubSpotify.hits == 2
+    assert throttles == []
+
+
+# 5xx retries exhausted => spotipy says 429 "Max Retries", which must not throttle every caller or be retried again
+def test_sustained_5xx_is_an_upstream_error(stub_client):
+    sp, throttles = stub_client
+    StubSpotify.responses = [(503, {})] * 10
+    failures = spotify.spotify_limiter.snapshot()['failures']
+
+    with pytest.raises(Exception) as error:
+        spotify.spotify_call(sp.artist, 'artist')
+    assert 'Max Retries' in error.value.msg
+    assert StubSpotify.hits == 4 # The first call + the session's 3 retries, spotify_call doesn't add any
+    assert throttles == []
+    assert spotify.spotify_limiter.snapshot()['failures'] == failures + 1
+
+
+# A 429 without Retry-After is still a rate limit => default back off
+def test_429_without_retry_after_uses_default_backoff(stub_client):
+    sp, throttles = stub_client
+    StubSpotify.responses = [(429, {})]
+
+    assert spotify.spotify_call(sp.artist, 'artist') == {'id': 'artist'}
+    assert throttles == [1]
@@ -0,0 +1,62 @@
+from app.services.ai_recs import iter_streamed_songs
+
+ANSWER = (
+    '```json\n[\n'
+    '  {"title": "Midnight City", "artist": "M83", "year": 2011, "live": false},\n'
+    '  {"title": "Let\'s Go {Remix}", "artist": "Kid \\"K\\"", "tags": {"mood": "up"}},\n'
+    '  {"title": "Teardrop", "artist": "Massive Attack", "rating": -1, "note": null}\n'
+    ']\n```'
+)
+SONGS = [
+    ('Midnight City', 'M83'),
+    ("Let's Go {Remix}", 'Kid "K"'),
+    ('Teardrop', 'Massive Attack'),
+]
+
+
+def titles(songs):
+    return [(song['title'], song['artist']) for song in songs]
+
+
+def test_whole_answer_in_one_chunk():
+    assert titles(iter_streamed_songs([ANSWER])) == SONGS
+
+
+# Every possible cut => same songs, no duplicates, nothing lost inside strings / literals / numbers
+def test_answer_split_at_every_position():
+    for cut in range(1, len(ANSWER)):
+        assert titles(iter_streamed_songs([ANSWER[:cut], ANSWER[cut:]])) == SONGS, cut
+
+
+def test_one_character_per_chunk():
+    assert titles(iter_streamed_songs(list(ANSWER))) == SONGS
+
+
+def test_song_is_yielded_as_soon_as_it_is_complete():
+    songs = iter_streamed_songs(iter(['[{"title": "A", "artist": "B"}', ', {"title": "C"']))
+    assert next(songs) == {'title': 'A', 'artist': 'B'}
+
+
+def test_empty_chunks_are_ignored():
+    assert titles(iter_streamed_songs([None, '', ANSWER, ''])) == SONGS
+
+
+def test_objects_without_title_or_artist_are_skipped():
+    chunks = ['[{"title": "A"}, {"artist": "B"}, {"title": "", "artist": "C"}, ["x"], {"title": "D", "artist": "E"}]']
+    assert titles(iter_streamed_songs(chunks)) == [('D', 'E')]
+
+
+# A malformed object must not block the songs after it
+def test_bad_json_is_skipped():
+    chunks = ['[{"title": Oops, "artist": "X"}, ', '{"title": "A", "artist": "B"}, {"title": "C" "artist": "D"}, ', '{"title": "E", "artist": "F"}]']
+    assert titles(iter_streamed_songs(chunks)) == [('A', 'B'), ('E', 'F')]
+
+
+def test_bad_json_split_across_chunks_is_skipped():
+    text = '[{"title": "A", "artist": "B"}, {"title": "C", "artist": nope}, {"title": "E", "artist": "F"}]'
+    for cut in range(1, len(text)):
+        assert titles(iter_streamed_songs([text[:cut], text[cut:]])) == [('A', 'B'), ('E', 'F')], cut
+
+
+def test_truncated_answer_keeps_complete_songs():
+    assert titles(iter_streamed_songs(['[{"title": "A", "artist": "B"}, {"title": "C", "art'])) == [('A', 'B')]
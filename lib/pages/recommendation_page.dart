@@ -56,10 +56,11 @@ class _RecommendationPageState extends State<RecommendationPage> {
     Function(List<Scrobble>) updateState,
   ) async {
     try {
-      final response = await http.get(
+      var response = await http.get(
         Uri.parse("$baseUrl/recommend/$endpoint"),
         headers: headers,
       );
+      response = await _waitForJob(endpoint, response, headers);
       final data = _parseRecs(response);
 
       if (mounted) {
@@ -77,6 +78,36 @@ class _RecommendationPageState extends State<RecommendationPage> {
     }
   }
 
+  // Slow engines (credits) return a background job instead of a list => poll until it finishes
+  Future<http.Response> _waitForJob(
+    String endpoint,
+    http.Response response,
+    Map<String, String> headers,
+  ) async {
+    for (var attempt = 0; attempt < 60; attempt++) {
+      if (response.statusCode != 200) return response;
+
+      final dynamic decoded = jsonDecode(response.body);
+      if (decoded is! Map || !decoded.containsKey('job_id')) return response;
+
+      if (decoded['status'] == 'done') {
+        return http.Response(jsonEncode(decoded['result'] ?? []), 200);
+      }
+      if (decoded['status'] == 'failed') {
+        return http.Response('[]', 200);
+      }
+
+      await Future.delayed(const Duration(seconds: 3));
+      if (!mounted) return http.Response('[]', 200);
+
+      response = await http.get(
+        Uri.parse("$baseUrl/recommend/$endpoint/jobs/${decoded['job_id']}"),
+        headers: headers,
+      );
+    }
+    return http.Response('[]', 200);
+  }
+
   List<Scrobble> _parseRecs(http.Response response) {
     if (response.statusCode != 200) return [];
 